@@ -57,6 +57,7 @@ def experiment(variant):
     replay_buffer = EnvReplayBuffer(
         variant['replay_buffer_size'],
         expl_env,
+        store_action_indices=True,
     )
     algorithm = TorchBatchRLAlgorithm(
         trainer=trainer,
@@ -0,0 +1,162 @@
+import multiprocessing as mp
+import pickle
+import traceback
+
+import torch
+from torch import nn
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.core import eval_util
+
+
+def get_evaluation_diagnostics(eval_data_collector, eval_env):
+    """
+    :return: List of the diagnostics dicts that are logged under
+    'evaluation/' for the paths of the current epoch.
+    """
+    eval_paths = eval_data_collector.get_epoch_paths()
+    diagnostics = [eval_data_collector.get_diagnostics()]
+    if hasattr(eval_env, 'get_diagnostics'):
+        diagnostics.append(eval_env.get_diagnostics(eval_paths))
+    diagnostics.append(eval_util.get_generic_path_information(eval_paths))
+    return diagnostics
+
+
+def get_policy_modules(policy):
+    """
+    :return: dict from attribute name to the torch modules that hold the
+    parameters of `policy`. The name is '' if the policy is a module itself,
+    otherwise the modules are found among its attributes, e.g.
+    MakeDeterministic.stochastic_policy.
+    """
+    if isinstance(policy, nn.Module):
+        return {'': policy}
+    modules = {
+        name: value for name, value in vars(policy).items()
+        if isinstance(value, nn.Module)
+    }
+    assert modules, "Could not find the torch modules of {}".format(policy)
+    return modules
+
+
+class AsyncEvaluator(object):
+    """
+    Runs the evaluation path collector in another process, so that
+    evaluation overlaps with training.
+
+    The process gets a copy of the collector and the evaluation environment
+    when it starts. Every `submit` sends the current parameters of the
+    evaluation policy, as numpy arrays, to the process, which collects paths
+    with them and sends back the evaluation diagnostics of that epoch. The
+    environment copy does not see any other changes made during training.
+
+    Call `close` when done.
+    """
+
+    def __init__(self, eval_data_collector, eval_env, context='spawn'):
+        """
+        :param context: multiprocessing start method. 'spawn' works when
+        CUDA was already initialized, 'fork' does not.
+        """
+        self._policy_modules = get_policy_modules(
+            eval_data_collector.get_snapshot()['policy']
+        )
+        ctx = mp.get_context(context)
+        # Pickle the collector here, because multiprocessing's pickler would
+        # move the policy's tensors to shared memory, and the process's
+        # updates of its copy would then overwrite the trained parameters.
+        eval_data = pickle.dumps((eval_data_collector, eval_env))
+        self._remote, worker_remote = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_evaluate,
+            args=(
+                worker_remote,
+                self._remote,
+                eval_data,
+                dict(use_gpu=ptu._use_gpu, gpu_id=ptu._gpu_id),
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        worker_remote.close()
+        # epoch -> evaluation diagnostics
+        self._results = {}
+
+    def submit(self, epoch, max_path_length, num_steps):
+        """
+        Start evaluating the current parameters of the policy for `epoch`.
+        Returns immediately.
+        """
+        policy_state = {
+            name: {
+                key: ptu.get_numpy(value)
+                for key, value in module.state_dict().items()
+            }
+            for name, module in self._policy_modules.items()
+        }
+        self._remote.send((epoch, policy_state, max_path_length, num_steps))
+
+    def get(self, epoch, block=True):
+        """
+        :return: The list of evaluation diagnostics of `epoch`, like
+        `get_evaluation_diagnostics`, or None if it isn't ready and `block`
+        is False.
+        """
+        while epoch not in self._results:
+            if not block and not self._remote.poll():
+                return None
+            success, result = self._remote.recv()
+            if not success:
+                raise RuntimeError("Evaluation failed:\n{}".format(result))
+            result_epoch, diagnostics = result
+            self._results[result_epoch] = diagnostics
+        return self._results.pop(epoch)
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._remote.send(None)
+        except (BrokenPipeError, EOFError):
+            pass
+        self._process.join()
+        self._remote.close()
+        self._process = None
+
+
+def _evaluate(remote, parent_remote, eval_data, gpu_info):
+    parent_remote.close()
+    ptu.set_gpu_mode(gpu_info['use_gpu'], gpu_info['gpu_id'])
+    eval_data_collector, eval_env = pickle.loads(eval_data)
+    policy_modules = get_policy_modules(
+        eval_data_collector.get_snapshot()['policy']
+    )
+    try:
+        while True:
+            message = remote.recv()
+            if message is None:
+                break
+            epoch, policy_state, max_path_length, num_steps = message
+            try:
+                for name, module in policy_modules.items():
+                    module.load_state_dict({
+                        key: torch.from_numpy(value)
+                        for key, value in policy_state[name].items()
+                    })
+                eval_data_collector.collect_new_paths(
+                    max_path_length,
+                    num_steps,
+                    discard_incomplete_paths=True,
+                )
+                diagnostics = get_evaluation_diagnostics(
+                    eval_data_collector, eval_env,
+                )
+                eval_data_collector.end_epoch(epoch)
+            except Exception:
+                remote.send((False, traceback.format_exc()))
+                break
+            remote.send((True, (epoch, diagnostics)))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        remote.close()
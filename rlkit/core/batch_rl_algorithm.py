@@ -23,7 +23,19 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
             num_trains_per_train_loop,
             num_train_loops_per_epoch=1,
             min_num_steps_before_training=0,
+            num_batches_per_sample=1,
+            prefetch_queue_size=None,
+            replay_buffer_snapshot_gap=None,
+            async_eval_max_staleness=None,
     ):
+        """
+        :param num_batches_per_sample: How many training batches are sampled
+        from the replay buffer at once. Larger values save per-step
+        overhead, but the batches don't see priorities updated in between.
+        :param prefetch_queue_size: If set, sample the training batches in a
+        background thread, up to this many samples ahead. Ignored for replay
+        buffers with priorities.
+        """
         super().__init__(
             trainer,
             exploration_env,
@@ -31,6 +43,8 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
             exploration_data_collector,
             evaluation_data_collector,
             replay_buffer,
+            replay_buffer_snapshot_gap=replay_buffer_snapshot_gap,
+            async_eval_max_staleness=async_eval_max_staleness,
         )
         self.batch_size = batch_size
         self.max_path_length = max_path_length
@@ -40,6 +54,10 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
         self.num_train_loops_per_epoch = num_train_loops_per_epoch
         self.num_expl_steps_per_train_loop = num_expl_steps_per_train_loop
         self.min_num_steps_before_training = min_num_steps_before_training
+        self.num_batches_per_sample = num_batches_per_sample
+        self.batch_prefetcher = self._create_batch_prefetcher(
+            prefetch_queue_size
+        )
 
     def _train(self):
         if self.min_num_steps_before_training > 0:
@@ -55,11 +73,7 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
                 range(self._start_epoch, self.num_epochs),
                 save_itrs=True,
         ):
-            self.eval_data_collector.collect_new_paths(
-                self.max_path_length,
-                self.num_eval_steps_per_epoch,
-                discard_incomplete_paths=True,
-            )
+            self._evaluate(epoch)
             gt.stamp('evaluation sampling')
 
             for _ in range(self.num_train_loops_per_epoch):
@@ -74,11 +88,28 @@ class BatchRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
                 gt.stamp('data storing', unique=False)
 
                 self.training_mode(True)
-                for _ in range(self.num_trains_per_train_loop):
-                    train_data = self.replay_buffer.random_batch(
-                        self.batch_size)
-                    self.trainer.train(train_data)
+                batch_counts = self._get_batch_counts()
+                if self.batch_prefetcher is not None:
+                    self.batch_prefetcher.start(batch_counts)
+                for num_batches in batch_counts:
+                    self._train_step(num_batches)
+                if self.batch_prefetcher is not None:
+                    # Stop before the next paths are added to the buffer.
+                    self.batch_prefetcher.stop()
                 gt.stamp('training', unique=False)
                 self.training_mode(False)
 
             self._end_epoch(epoch)
+
+    def _get_batch_counts(self):
+        """
+        :return: How many batches to sample at a time, so that there are
+        num_trains_per_train_loop in total.
+        """
+        num_full, remainder = divmod(
+            self.num_trains_per_train_loop, self.num_batches_per_sample
+        )
+        batch_counts = [self.num_batches_per_sample] * num_full
+        if remainder > 0:
+            batch_counts.append(remainder)
+        return batch_counts
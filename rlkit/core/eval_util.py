@@ -35,8 +35,10 @@ def get_generic_path_information(paths, stat_prefix=''):
 
     for info_key in ['env_infos', 'agent_infos']:
         if info_key in paths[0]:
+            # PathBuilder returns infos as a dict of arrays.
             all_env_infos = [
-                ppp.list_of_dicts__to__dict_of_lists(p[info_key])
+                p[info_key] if isinstance(p[info_key], dict)
+                else ppp.list_of_dicts__to__dict_of_lists(p[info_key])
                 for p in paths
             ]
             for k in all_env_infos[0].keys():
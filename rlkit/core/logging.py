@@ -212,6 +212,18 @@ class Logger(object):
     def get_table_key_set(self, ):
         return set(key for key, value in self._tabular)
 
+    def pop_tabular(self):
+        """
+        Remove the entries recorded since the last dump, e.g. to dump them
+        later with `extend_tabular`.
+        """
+        tabular = self._tabular
+        self._tabular = []
+        return tabular
+
+    def extend_tabular(self, tabular):
+        self._tabular.extend(tabular)
+
     @contextmanager
     def prefix(self, key):
         self.push_prefix(key)
@@ -26,7 +26,15 @@ class OnlineRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
             num_trains_per_train_loop,
             num_train_loops_per_epoch=1,
             min_num_steps_before_training=0,
+            prefetch_queue_size=None,
+            replay_buffer_snapshot_gap=None,
+            async_eval_max_staleness=None,
     ):
+        """
+        :param prefetch_queue_size: If set, sample the training batches in a
+        background thread, up to this many batches ahead. Ignored for replay
+        buffers with priorities.
+        """
         super().__init__(
             trainer,
             exploration_env,
@@ -34,6 +42,8 @@ class OnlineRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
             exploration_data_collector,
             evaluation_data_collector,
             replay_buffer,
+            replay_buffer_snapshot_gap=replay_buffer_snapshot_gap,
+            async_eval_max_staleness=async_eval_max_staleness,
         )
         self.batch_size = batch_size
         self.max_path_length = max_path_length
@@ -43,6 +53,9 @@ class OnlineRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
         self.num_train_loops_per_epoch = num_train_loops_per_epoch
         self.num_expl_steps_per_train_loop = num_expl_steps_per_train_loop
         self.min_num_steps_before_training = min_num_steps_before_training
+        self.batch_prefetcher = self._create_batch_prefetcher(
+            prefetch_queue_size
+        )
 
         assert self.num_trains_per_train_loop >= self.num_expl_steps_per_train_loop, \
             'Online training presumes num_trains_per_train_loop >= num_expl_steps_per_train_loop'
@@ -66,13 +79,17 @@ class OnlineRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
                 range(self._start_epoch, self.num_epochs),
                 save_itrs=True,
         ):
-            self.eval_data_collector.collect_new_paths(
-                self.max_path_length,
-                self.num_eval_steps_per_epoch,
-                discard_incomplete_paths=True,
-            )
+            self._evaluate(epoch)
             gt.stamp('evaluation sampling')
 
+            if self.batch_prefetcher is not None:
+                # New paths are only added to the buffer at the end of the
+                # epoch, so all of this epoch's batches can be prefetched.
+                self.batch_prefetcher.start([1] * (
+                    self.num_train_loops_per_epoch
+                    * self.num_expl_steps_per_train_loop
+                    * num_trains_per_expl_step
+                ))
             for _ in range(self.num_train_loops_per_epoch):
                 for _ in range(self.num_expl_steps_per_train_loop):
                     self.expl_data_collector.collect_new_steps(
@@ -84,12 +101,13 @@ class OnlineRLAlgorithm(BaseRLAlgorithm, metaclass=abc.ABCMeta):
 
                     self.training_mode(True)
                     for _ in range(num_trains_per_expl_step):
-                        train_data = self.replay_buffer.random_batch(
-                            self.batch_size)
-                        self.trainer.train(train_data)
+                        self._train_step()
                     gt.stamp('training', unique=False)
                     self.training_mode(False)
 
+            if self.batch_prefetcher is not None:
+                self.batch_prefetcher.stop()
+
             new_expl_paths = self.expl_data_collector.get_epoch_paths()
             self.replay_buffer.add_paths(new_expl_paths)
             gt.stamp('data storing', unique=False)
@@ -1,10 +1,19 @@
 import abc
-from collections import OrderedDict
+import os.path as osp
+from collections import OrderedDict, deque
 
 import gtimer as gt
 
 from rlkit.core import logger, eval_util
-from rlkit.data_management.replay_buffer import ReplayBuffer
+from rlkit.core.async_evaluator import (
+    AsyncEvaluator,
+    get_evaluation_diagnostics,
+)
+from rlkit.data_management.batch_prefetcher import BatchPrefetcher
+from rlkit.data_management.replay_buffer import (
+    ReplayBuffer,
+    load_snapshot_metadata,
+)
 from rlkit.samplers.data_collector import DataCollector
 
 
@@ -30,7 +39,24 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
             exploration_data_collector: DataCollector,
             evaluation_data_collector: DataCollector,
             replay_buffer: ReplayBuffer,
+            replay_buffer_snapshot_gap=None,
+            async_eval_max_staleness=None,
     ):
+        """
+        :param replay_buffer_snapshot_gap: If set, save the replay buffer
+        contents to `replay_buffer_snapshot` in the snapshot directory every
+        this many epochs. Like the logger's 'gap' snapshot mode, it is saved
+        after the epochs that are a multiple of the gap, so that training
+        resumed from `itr_<epoch>.pkl` with `train(start_epoch=epoch + 1)`
+        loads the buffer of the same epoch. The buffer is never pickled with
+        the other params.
+        :param async_eval_max_staleness: If set, evaluate in another process
+        while training (see AsyncEvaluator). The stats of an epoch, including
+        the evaluation of the policy from the start of that epoch, are
+        logged once its evaluation is done, which may be up to this many
+        epochs later. Training waits for evaluations that would be later.
+        0 still overlaps the evaluation with the epoch's training.
+        """
         self.trainer = trainer
         self.expl_env = exploration_env
         self.eval_env = evaluation_env
@@ -38,12 +64,41 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
         self.eval_data_collector = evaluation_data_collector
         self.replay_buffer = replay_buffer
         self._start_epoch = 0
+        self.replay_buffer_snapshot_gap = replay_buffer_snapshot_gap
+        self.async_eval_max_staleness = async_eval_max_staleness
+        # Started by the first evaluation, if evaluating asynchronously.
+        self.async_evaluator = None
+        # (epoch, stats before evaluation, stats after evaluation) of the
+        # epochs that are waiting for their asynchronous evaluation.
+        self._pending_log_rows = deque()
+        # Set by subclasses that sample training batches in the background.
+        self.batch_prefetcher = None
 
         self.post_epoch_funcs = []
 
+        if (
+                hasattr(self.replay_buffer, 'update_priorities')
+                and hasattr(self.trainer, 'set_td_error_callback')
+        ):
+            self.trainer.set_td_error_callback(
+                self.replay_buffer.update_priorities
+            )
+
     def train(self, start_epoch=0):
+        """
+        :param start_epoch: If resuming, the epoch after the last finished
+        one. The replay buffer is then loaded from its snapshot, if any.
+        """
         self._start_epoch = start_epoch
-        self._train()
+        if start_epoch > 0:
+            self._load_replay_buffer(start_epoch)
+        try:
+            self._train()
+            self._dump_evaluated_log_rows(block=True)
+        finally:
+            if self.async_evaluator is not None:
+                self.async_evaluator.close()
+                self.async_evaluator = None
 
     def _train(self):
         """
@@ -54,6 +109,7 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
     def _end_epoch(self, epoch):
         snapshot = self._get_snapshot()
         logger.save_itr_params(epoch, snapshot)
+        self._save_replay_buffer(epoch)
         gt.stamp('saving')
         self._log_stats(epoch)
 
@@ -65,6 +121,139 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
         for post_epoch_func in self.post_epoch_funcs:
             post_epoch_func(self, epoch)
 
+    def _evaluate(self, epoch):
+        """
+        Collect the evaluation paths of `epoch`, or start collecting them in
+        the background if evaluating asynchronously.
+        """
+        if self.async_eval_max_staleness is None:
+            self.eval_data_collector.collect_new_paths(
+                self.max_path_length,
+                self.num_eval_steps_per_epoch,
+                discard_incomplete_paths=True,
+            )
+            return
+        if self.async_evaluator is None:
+            self.async_evaluator = AsyncEvaluator(
+                self.eval_data_collector, self.eval_env,
+            )
+        self.async_evaluator.submit(
+            epoch, self.max_path_length, self.num_eval_steps_per_epoch,
+        )
+
+    def _dump_evaluated_log_rows(self, block=False, max_block_epoch=None):
+        """
+        Log the pending epochs, in order, whose asynchronous evaluation is
+        done.
+
+        :param block: Wait for all evaluations.
+        :param max_block_epoch: Wait for the evaluations up to this epoch.
+        """
+        while self._pending_log_rows:
+            epoch, tabular_before_eval, tabular_after_eval = (
+                self._pending_log_rows[0]
+            )
+            eval_diagnostics = self.async_evaluator.get(
+                epoch,
+                block=(
+                    block
+                    or (max_block_epoch is not None
+                        and epoch <= max_block_epoch)
+                ),
+            )
+            if eval_diagnostics is None:
+                return
+            self._pending_log_rows.popleft()
+            logger.extend_tabular(tabular_before_eval)
+            for diagnostics in eval_diagnostics:
+                logger.record_dict(diagnostics, prefix='evaluation/')
+            logger.extend_tabular(tabular_after_eval)
+            logger.dump_tabular(with_prefix=False, with_timestamp=False)
+
+    def _sample_train_data(self, num_batches):
+        if num_batches == 1:
+            return self.replay_buffer.random_batch(self.batch_size)
+        return self.replay_buffer.random_batches(self.batch_size, num_batches)
+
+    def _create_batch_prefetcher(self, queue_size):
+        """
+        :return: BatchPrefetcher of the training batches, or None if
+        `queue_size` is None or the replay buffer updates its priorities
+        during training. The trainer updates them between the gradient
+        steps, while the prefetcher would sample from the buffer.
+        """
+        if queue_size is None:
+            return None
+        if hasattr(self.replay_buffer, 'update_priorities'):
+            logger.log(
+                "Not prefetching batches, because the priorities of the "
+                "replay buffer change during training."
+            )
+            return None
+        return BatchPrefetcher(
+            self._sample_train_data,
+            queue_size=queue_size,
+            transform=self._get_train_data_transform(),
+        )
+
+    def _get_train_data_transform(self):
+        """
+        :return: Function applied to the training data by the batch
+        prefetcher, or None.
+        """
+        return None
+
+    def _train_step(self, num_batches=1):
+        """
+        Take `num_batches` training steps, with data from the batch
+        prefetcher if it's running.
+        """
+        if self.batch_prefetcher is not None:
+            train_data = self.batch_prefetcher.get()
+        else:
+            train_data = self._sample_train_data(num_batches)
+        if num_batches == 1:
+            self.trainer.train(train_data)
+        else:
+            self.trainer.train_batches(train_data, num_batches)
+
+    def _save_replay_buffer(self, epoch):
+        if (
+                self.replay_buffer_snapshot_gap is None
+                or epoch % self.replay_buffer_snapshot_gap != 0
+        ):
+            return
+        snapshot_dir = logger.get_snapshot_dir()
+        if snapshot_dir is None:
+            return
+        self.replay_buffer.save(
+            osp.join(snapshot_dir, 'replay_buffer_snapshot'),
+            extra_metadata=dict(epoch=epoch),
+        )
+
+    def _load_replay_buffer(self, start_epoch):
+        snapshot_dir = logger.get_snapshot_dir()
+        if snapshot_dir is None:
+            return
+        directory = osp.join(snapshot_dir, 'replay_buffer_snapshot')
+        if not osp.exists(directory):
+            logger.log("No replay buffer snapshot to resume from.")
+            return
+        epoch = load_snapshot_metadata(directory)['epoch']
+        if epoch >= start_epoch:
+            raise ValueError(
+                "The replay buffer snapshot is from epoch {}, but training "
+                "resumes after epoch {}.".format(epoch, start_epoch - 1)
+            )
+        if epoch < start_epoch - 1:
+            logger.log(
+                "The replay buffer snapshot is from epoch {}, so it doesn't "
+                "have the paths of epochs {} to {}.".format(
+                    epoch, epoch + 1, start_epoch - 1,
+                )
+            )
+        self.replay_buffer.load(directory)
+
     def _get_snapshot(self):
         snapshot = {}
         for k, v in self.trainer.get_snapshot().items():
@@ -87,6 +276,11 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
             self.replay_buffer.get_diagnostics(),
             prefix='replay_buffer/'
         )
+        if self.batch_prefetcher is not None:
+            logger.record_dict(
+                self.batch_prefetcher.get_diagnostics(),
+                prefix='replay_buffer/'
+            )
 
         """
         Trainer
@@ -113,20 +307,14 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
         """
         Evaluation
         """
-        logger.record_dict(
-            self.eval_data_collector.get_diagnostics(),
-            prefix='evaluation/',
-        )
-        eval_paths = self.eval_data_collector.get_epoch_paths()
-        if hasattr(self.eval_env, 'get_diagnostics'):
-            logger.record_dict(
-                self.eval_env.get_diagnostics(eval_paths),
-                prefix='evaluation/',
-            )
-        logger.record_dict(
-            eval_util.get_generic_path_information(eval_paths),
-            prefix="evaluation/",
-        )
+        if self.async_evaluator is None:
+            for diagnostics in get_evaluation_diagnostics(
+                    self.eval_data_collector, self.eval_env,
+            ):
+                logger.record_dict(diagnostics, prefix='evaluation/')
+        else:
+            # The evaluation stats are inserted here once they are ready.
+            tabular_before_eval = logger.pop_tabular()
 
         """
         Misc
@@ -134,7 +322,15 @@ class BaseRLAlgorithm(object, metaclass=abc.ABCMeta):
         gt.stamp('logging')
         logger.record_dict(_get_epoch_timings())
         logger.record_tabular('Epoch', epoch)
-        logger.dump_tabular(with_prefix=False, with_timestamp=False)
+        if self.async_evaluator is None:
+            logger.dump_tabular(with_prefix=False, with_timestamp=False)
+        else:
+            self._pending_log_rows.append(
+                (epoch, tabular_before_eval, logger.pop_tabular())
+            )
+            self._dump_evaluated_log_rows(
+                max_block_epoch=epoch - self.async_eval_max_staleness,
+            )
 
     @abc.abstractmethod
     def training_mode(self, mode):
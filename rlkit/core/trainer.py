@@ -6,6 +6,14 @@ class Trainer(object, metaclass=abc.ABCMeta):
     def train(self, data):
         pass
 
+    def train_batches(self, data, num_batches):
+        """
+        Take one training step for every batch in `data`, as returned by
+        ReplayBuffer.random_batches.
+        """
+        for i in range(num_batches):
+            self.train({key: value[i] for key, value in data.items()})
+
     def end_epoch(self, epoch):
         pass
 
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class BatchPrefetcher(object):
+    """
+    Samples training batches in a background thread so that sampling (and
+    converting the batches, e.g. to torch) overlaps with the gradient steps.
+
+    The prefetcher only runs between `start` and `stop`, and samples exactly
+    the batches requested in `start`. The replay buffer must not be modified
+    in between, which the RL algorithms guarantee by stopping the prefetcher
+    before they add new paths. That way, every batch is sampled from the
+    same buffer contents as it would be without prefetching. Replay buffers
+    whose priorities are updated between gradient steps, like
+    PrioritizedReplayBuffer, are modified all the time, so the algorithms
+    don't prefetch from them.
+    """
+
+    def __init__(self, sample_fn, queue_size=4, transform=None):
+        """
+        :param sample_fn: Function that takes the number of batches and
+        returns the training data, e.g. a batch from the replay buffer.
+        :param queue_size: Maximum number of batches that are sampled ahead.
+        :param transform: Optional function applied to every sample in the
+        background thread.
+        """
+        self._sample_fn = sample_fn
+        self._transform = transform
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._error = None
+
+        self._num_gets = 0
+        self._num_starved_gets = 0
+        self._starved_time = 0.
+
+    def start(self, batch_counts):
+        """
+        :param batch_counts: List with the number of batches that is passed
+        to `sample_fn` for each sample.
+        """
+        assert self._thread is None, "The prefetcher is already running."
+        self._stop_event.clear()
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._prefetch, args=(list(batch_counts),), daemon=True,
+        )
+        self._thread.start()
+
+    def _prefetch(self, batch_counts):
+        try:
+            for num_batches in batch_counts:
+                data = self._sample_fn(num_batches)
+                if self._transform is not None:
+                    data = self._transform(data)
+                if not self._put(data):
+                    return
+        except Exception as e:
+            self._error = e
+            # Wake up the consumer so that it can raise the error.
+            self._put(None)
+
+    def _put(self, data):
+        """
+        :return: False if the prefetcher was stopped before `data` could be
+        put into the queue.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(data, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self):
+        """
+        :return: The next sample, in the order of `batch_counts`.
+        """
+        self._num_gets += 1
+        try:
+            data = self._queue.get_nowait()
+        except queue.Empty:
+            self._num_starved_gets += 1
+            start_time = time.time()
+            data = self._queue.get()
+            self._starved_time += time.time() - start_time
+        if data is None and self._error is not None:
+            raise self._error
+        return data
+
+    def stop(self):
+        """
+        Stop sampling and wait for the background thread to finish. Batches
+        that were sampled but not used are dropped.
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def get_diagnostics(self):
+        return OrderedDict([
+            ('prefetch gets', self._num_gets),
+            ('prefetch starved gets', self._num_starved_gets),
+            ('prefetch starved fraction',
+             self._num_starved_gets / max(self._num_gets, 1)),
+            ('prefetch starved time (s)', self._starved_time),
+        ])
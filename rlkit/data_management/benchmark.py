@@ -0,0 +1,361 @@
+"""
+Microbenchmarks for the replay buffer data path.
+
+Times `add_path`, `random_batch` and `np_to_pytorch_batch` for the replay
+buffers on synthetic environments, sweeping the buffer size, observation
+dimension, image size and batch size. The results are written as JSON so
+that runs on different commits can be compared, e.g.
+
+    python -m rlkit.data_management.benchmark --output before.json
+    git checkout my-branch
+    python -m rlkit.data_management.benchmark --output after.json
+
+Every measurement is the fastest of `--repeats` runs, to reduce noise from
+the rest of the machine.
+"""
+import argparse
+import itertools
+import json
+import os.path as osp
+import platform
+import subprocess
+import sys
+import time
+
+import gym
+import numpy as np
+import torch
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.obs_dict_replay_buffer import \
+    ObsDictRelabelingBuffer
+from rlkit.data_management.shared_obs_dict_replay_buffer import \
+    SharedObsDictRelabelingBuffer
+from rlkit.torch.core import np_to_pytorch_batch
+
+BUFFER_TYPES = [
+    'env',
+    'obs_dict',
+    'shared_obs_dict',
+    'shared_obs_dict_shm',
+]
+# Name -> (fraction_goals_rollout_goals, fraction_goals_env_goals). The rest
+# of the goals are future goals.
+GOAL_SAMPLING_MODES = {
+    'rollout': (1., 0.),
+    'env': (0., 1.),
+    'future': (0., 0.),
+}
+
+
+class BenchmarkEnv(gym.Env):
+    """
+    Stand-in environment that only has the spaces and the batched goal
+    methods the replay buffers use.
+    """
+
+    def __init__(self, obs_dim, action_dim, image_dim=0, goal_env=False):
+        """
+        :param image_dim: If positive and `goal_env` is True, the
+        observation and goals are images of this many pixels instead.
+        :param goal_env: Use a Dict observation space with goals.
+        """
+        self.action_space = Box(-1, 1, (action_dim,), dtype=np.float32)
+        if not goal_env:
+            self.observation_space = Box(
+                -1, 1, (obs_dim,), dtype=np.float32
+            )
+            return
+        if image_dim > 0:
+            self.observation_key = 'image_observation'
+            self.desired_goal_key = 'image_desired_goal'
+            self.achieved_goal_key = 'image_achieved_goal'
+            space = Box(0, 1, (image_dim,), dtype=np.float32)
+        else:
+            self.observation_key = 'observation'
+            self.desired_goal_key = 'desired_goal'
+            self.achieved_goal_key = 'achieved_goal'
+            space = Box(-1, 1, (obs_dim,), dtype=np.float32)
+        self.observation_space = Dict({
+            self.observation_key: space,
+            self.desired_goal_key: space,
+            self.achieved_goal_key: space,
+        })
+
+    def sample_goals(self, batch_size):
+        space = self.observation_space.spaces[self.desired_goal_key]
+        goals = np.random.uniform(
+            space.low, space.high, (batch_size,) + space.shape,
+        )
+        return {self.desired_goal_key: goals}
+
+    def compute_rewards(self, actions, obs):
+        return -np.linalg.norm(
+            obs[self.achieved_goal_key] - obs[self.desired_goal_key], axis=1,
+        )
+
+    def reset(self):
+        raise NotImplementedError()
+
+    def step(self, action):
+        raise NotImplementedError()
+
+
+def make_buffer(buffer_type, env, max_size, goal_sampling_mode=None):
+    if buffer_type == 'env':
+        return EnvReplayBuffer(max_size, env)
+    if goal_sampling_mode is None:
+        goal_sampling_mode = 'future'
+    fraction_goals_rollout_goals, fraction_goals_env_goals = (
+        GOAL_SAMPLING_MODES[goal_sampling_mode]
+    )
+    kwargs = dict(
+        fraction_goals_rollout_goals=fraction_goals_rollout_goals,
+        fraction_goals_env_goals=fraction_goals_env_goals,
+        observation_key=env.observation_key,
+        desired_goal_key=env.desired_goal_key,
+        achieved_goal_key=env.achieved_goal_key,
+    )
+    if buffer_type == 'obs_dict':
+        return ObsDictRelabelingBuffer(max_size, env, **kwargs)
+    elif buffer_type == 'shared_obs_dict':
+        return SharedObsDictRelabelingBuffer(max_size, env, **kwargs)
+    elif buffer_type == 'shared_obs_dict_shm':
+        return SharedObsDictRelabelingBuffer(
+            max_size, env, use_shared_memory=True, **kwargs
+        )
+    raise ValueError("Unknown buffer type: {}".format(buffer_type))
+
+
+def make_path(env, path_len):
+    action_dim = env.action_space.low.size
+    if isinstance(env.observation_space, Dict):
+        obs = [
+            {
+                key: space.sample()
+                for key, space in env.observation_space.spaces.items()
+            }
+            for _ in range(path_len + 1)
+        ]
+    else:
+        obs = np.random.uniform(
+            -1, 1, (path_len + 1, env.observation_space.low.size)
+        ).astype(np.float32)
+    return dict(
+        observations=obs[:-1],
+        actions=np.random.uniform(-1, 1, (path_len, action_dim)),
+        rewards=np.random.randn(path_len, 1),
+        terminals=np.zeros((path_len, 1), dtype=np.uint8),
+        next_observations=obs[1:],
+        agent_infos=[{} for _ in range(path_len)],
+        env_infos=[{} for _ in range(path_len)],
+    )
+
+
+def time_fn(fn, num_calls, repeats):
+    """
+    :return: The fastest time in seconds, out of `repeats` runs, that
+    `num_calls` calls of `fn` took.
+    """
+    best_time = np.inf
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for _ in range(num_calls):
+            fn()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def benchmark_buffer(
+        buffer_type,
+        max_size,
+        obs_dim,
+        image_dim,
+        batch_size,
+        goal_sampling_mode=None,
+        action_dim=4,
+        path_len=100,
+        num_batches=100,
+        repeats=3,
+):
+    """
+    :return: dict with the parameters and the timings of one configuration.
+    """
+    env = BenchmarkEnv(
+        obs_dim,
+        action_dim,
+        image_dim=image_dim,
+        goal_env=(buffer_type != 'env'),
+    )
+    replay_buffer = make_buffer(
+        buffer_type, env, max_size, goal_sampling_mode=goal_sampling_mode,
+    )
+    path = make_path(env, path_len)
+    # Fill the buffer once, so that every timed run writes the same rows.
+    num_paths = max(max_size // path_len, 1)
+    for _ in range(num_paths):
+        replay_buffer.add_path(path)
+
+    add_path_time = time_fn(
+        lambda: replay_buffer.add_path(path), num_paths, repeats,
+    )
+    random_batch_time = time_fn(
+        lambda: replay_buffer.random_batch(batch_size), num_batches, repeats,
+    )
+    batch = replay_buffer.random_batch(batch_size)
+    to_torch_time = time_fn(
+        lambda: np_to_pytorch_batch(batch), num_batches, repeats,
+    )
+    if hasattr(replay_buffer, 'close'):
+        replay_buffer.close()
+
+    num_transitions = num_paths * path_len
+    return dict(
+        buffer_type=buffer_type,
+        goal_sampling_mode=goal_sampling_mode,
+        max_size=max_size,
+        obs_dim=obs_dim,
+        image_dim=image_dim,
+        batch_size=batch_size,
+        action_dim=action_dim,
+        path_len=path_len,
+        add_path_transitions_per_second=num_transitions / add_path_time,
+        random_batch_batches_per_second=num_batches / random_batch_time,
+        random_batch_transitions_per_second=(
+            num_batches * batch_size / random_batch_time
+        ),
+        np_to_pytorch_batch_batches_per_second=num_batches / to_torch_time,
+    )
+
+
+def get_configs(buffer_types, max_sizes, obs_dims, image_dims, batch_sizes):
+    for buffer_type, max_size, obs_dim, image_dim, batch_size in (
+            itertools.product(
+                buffer_types, max_sizes, obs_dims, image_dims, batch_sizes,
+            )
+    ):
+        if buffer_type == 'env':
+            if image_dim > 0:
+                continue
+            yield dict(
+                buffer_type=buffer_type,
+                max_size=max_size,
+                obs_dim=obs_dim,
+                image_dim=image_dim,
+                batch_size=batch_size,
+            )
+            continue
+        # The obs_dim is unused for images, so only run it once.
+        if image_dim > 0 and obs_dim != obs_dims[0]:
+            continue
+        if buffer_type == 'obs_dict':
+            goal_sampling_modes = list(GOAL_SAMPLING_MODES)
+        else:
+            goal_sampling_modes = ['future']
+        for goal_sampling_mode in goal_sampling_modes:
+            yield dict(
+                buffer_type=buffer_type,
+                goal_sampling_mode=goal_sampling_mode,
+                max_size=max_size,
+                obs_dim=obs_dim,
+                image_dim=image_dim,
+                batch_size=batch_size,
+            )
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=osp.dirname(osp.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(configs, verbose=True, **kwargs):
+    """
+    :param configs: Iterable of keyword arguments for `benchmark_buffer`.
+    :param kwargs: Passed to every call of `benchmark_buffer`.
+    :return: JSON-serializable report.
+    """
+    results = []
+    for config in configs:
+        result = benchmark_buffer(**config, **kwargs)
+        if verbose:
+            print(format_result(result))
+        results.append(result)
+    return dict(
+        git_commit=get_git_commit(),
+        time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        python_version=platform.python_version(),
+        numpy_version=np.__version__,
+        torch_version=torch.__version__,
+        platform=platform.platform(),
+        settings=kwargs,
+        results=results,
+    )
+
+
+def format_result(result):
+    return (
+        "{buffer_type} ({goal_sampling_mode}) size={max_size} "
+        "obs_dim={obs_dim} image_dim={image_dim} batch_size={batch_size}: "
+        "add_path {add_path_transitions_per_second:.0f} steps/s, "
+        "random_batch {random_batch_batches_per_second:.0f} batches/s, "
+        "np_to_pytorch_batch {np_to_pytorch_batch_batches_per_second:.0f} "
+        "batches/s".format(**result)
+    )
+
+
+def _int_list(string):
+    return [int(x) for x in string.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the replay buffer data path.",
+    )
+    parser.add_argument('--output', type=str, default=None,
+                        help='where to save the JSON report')
+    parser.add_argument('--buffer-types', type=str,
+                        default=','.join(BUFFER_TYPES),
+                        help='comma-separated subset of {}'.format(
+                            ', '.join(BUFFER_TYPES)))
+    parser.add_argument('--max-sizes', type=_int_list, default=[10000, 100000])
+    parser.add_argument('--obs-dims', type=_int_list, default=[10, 100])
+    parser.add_argument('--image-dims', type=_int_list, default=[0, 6912],
+                        help='0 means no image keys; 6912 is 48x48x3')
+    parser.add_argument('--batch-sizes', type=_int_list, default=[256, 1024])
+    parser.add_argument('--path-len', type=int, default=100)
+    parser.add_argument('--num-batches', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    buffer_types = args.buffer_types.split(',')
+    for buffer_type in buffer_types:
+        assert buffer_type in BUFFER_TYPES, buffer_type
+    report = run_benchmarks(
+        get_configs(
+            buffer_types,
+            args.max_sizes,
+            args.obs_dims,
+            args.image_dims,
+            args.batch_sizes,
+        ),
+        path_len=args.path_len,
+        num_batches=args.num_batches,
+        repeats=args.repeats,
+    )
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from gym.spaces import Discrete
+from gym.spaces import Box, Discrete
 
 from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+from rlkit.data_management.storage import get_action_index_dtypes
 from rlkit.envs.env_utils import get_dim
 import numpy as np
 
@@ -10,15 +11,36 @@ class EnvReplayBuffer(SimpleReplayBuffer):
             self,
             max_replay_buffer_size,
             env,
-            env_info_sizes=None
+            env_info_sizes=None,
+            deduplicate_obs=False,
+            dtypes=None,
+            n_step=1,
+            discount=None,
+            store_action_indices=False,
     ):
         """
         :param max_replay_buffer_size:
         :param env:
+        :param deduplicate_obs: See SimpleReplayBuffer.
+        :param dtypes: See SimpleReplayBuffer. Observations can only be
+        quantized to uint8 if the observation space is a bounded Box.
+        :param n_step: See SimpleReplayBuffer.
+        :param discount: See SimpleReplayBuffer.
+        :param store_action_indices: If True and the action space is
+        Discrete, store the action indices, as the smallest unsigned integer
+        type that fits them, instead of one-hot rows. The batch's actions
+        then have shape [batch_size, 1].
         """
         self.env = env
         self._ob_space = env.observation_space
         self._action_space = env.action_space
+        self._store_action_indices = (
+            store_action_indices and isinstance(self._action_space, Discrete)
+        )
+        action_dim = get_dim(self._action_space)
+        if self._store_action_indices:
+            action_dim = 1
+            dtypes = get_action_index_dtypes(dtypes, self._action_space.n)
 
         if env_info_sizes is None:
             if hasattr(env, 'info_sizes'):
@@ -26,16 +48,28 @@ class EnvReplayBuffer(SimpleReplayBuffer):
             else:
                 env_info_sizes = dict()
 
+        observation_bounds = None
+        if isinstance(self._ob_space, Box):
+            observation_bounds = (self._ob_space.low, self._ob_space.high)
+
         super().__init__(
             max_replay_buffer_size=max_replay_buffer_size,
             observation_dim=get_dim(self._ob_space),
-            action_dim=get_dim(self._action_space),
-            env_info_sizes=env_info_sizes
+            action_dim=action_dim,
+            env_info_sizes=env_info_sizes,
+            deduplicate_obs=deduplicate_obs,
+            dtypes=dtypes,
+            observation_bounds=observation_bounds,
+            n_step=n_step,
+            discount=discount,
         )
 
     def add_sample(self, observation, action, reward, terminal,
                    next_observation, **kwargs):
-        if isinstance(self._action_space, Discrete):
+        if (
+                isinstance(self._action_space, Discrete)
+                and not self._store_action_indices
+        ):
             new_action = np.zeros(self._action_dim)
             new_action[action] = 1
         else:
@@ -48,3 +82,14 @@ class EnvReplayBuffer(SimpleReplayBuffer):
             terminal=terminal,
             **kwargs
         )
+
+    def add_path(self, path):
+        if (
+                isinstance(self._action_space, Discrete)
+                and not self._store_action_indices
+        ):
+            actions = np.asarray(path["actions"]).reshape(-1).astype(int)
+            one_hot_actions = np.zeros((len(actions), self._action_dim))
+            one_hot_actions[np.arange(len(actions)), actions] = 1
+            path = dict(path, actions=one_hot_actions)
+        return super().add_path(path)
@@ -0,0 +1,142 @@
+import os
+import os.path as osp
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from rlkit.core import logger
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.obs_dict_replay_buffer import \
+    ObsDictRelabelingBuffer
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+
+
+class MemmapReplayBufferMixin(object):
+    """
+    Backs every array of a replay buffer with an np.memmap'd .npy file so that
+    the buffer can be larger than RAM. The OS page cache keeps the hot data in
+    memory.
+
+    The `_top` and `_size` pointers and the episode counter are kept in a
+    small sidecar file in the same directory, so a buffer can be reopened
+    after a restart instead of being refilled. Data is flushed to disk at the
+    end of every epoch.
+
+    Mix this in front of a replay buffer class and call `_init_memmap` before
+    the buffer's __init__ and `_restore_pointers` after it.
+    """
+    _METADATA_FILE_NAME = 'metadata.npy'
+
+    def _init_memmap(self, directory, reopen):
+        """
+        :param directory: Where to store the files. Defaults to
+        `replay_buffer` in the logger's snapshot directory.
+        :param reopen: If True and `directory` already holds a buffer, reuse
+        its contents.
+        """
+        if directory is None:
+            snapshot_dir = logger.get_snapshot_dir()
+            assert snapshot_dir is not None, (
+                "Set the logger's snapshot dir or pass in a directory."
+            )
+            directory = osp.join(snapshot_dir, 'replay_buffer')
+        os.makedirs(directory, exist_ok=True)
+        self._memmap_directory = directory
+        self._memmaps = []
+
+        metadata_path = osp.join(directory, self._METADATA_FILE_NAME)
+        self._reopened = reopen and osp.exists(metadata_path)
+        # self._metadata = [top, size, episode id]
+        if self._reopened:
+            self._metadata = open_memmap(metadata_path, mode='r+')
+        else:
+            self._metadata = open_memmap(
+                metadata_path, mode='w+', dtype=np.int64, shape=(3,),
+            )
+            # Episode ids start at 1, as in SimpleReplayBuffer.
+            self._metadata[2] = 1
+        self._saved_pointers = tuple(int(x) for x in self._metadata)
+        self._memmaps.append(self._metadata)
+
+    def _restore_pointers(self):
+        """
+        The buffer's __init__ resets `_top`, `_size` and `_episode_id`, so
+        restore the values that were read from disk.
+        """
+        self._top, self._size, self._episode_id = self._saved_pointers
+
+    def _create_array(self, name, shape, dtype):
+        path = osp.join(
+            self._memmap_directory, name.replace('/', '.') + '.npy'
+        )
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        if self._reopened and osp.exists(path):
+            arr = open_memmap(path, mode='r+')
+            assert arr.shape == shape and arr.dtype == dtype, (
+                "{} has shape {} and dtype {}, but expected {} and {}".format(
+                    path, arr.shape, arr.dtype, shape, dtype,
+                )
+            )
+        else:
+            # New files are sparse, so nothing is written until it's used.
+            arr = open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+        self._memmaps.append(arr)
+        return arr
+
+    @property
+    def _top(self):
+        return int(self._metadata[0])
+
+    @_top.setter
+    def _top(self, top):
+        self._metadata[0] = top
+
+    @property
+    def _size(self):
+        return int(self._metadata[1])
+
+    @_size.setter
+    def _size(self, size):
+        self._metadata[1] = size
+
+    @property
+    def _episode_id(self):
+        # Lets n-step returns tell the episodes apart after reopening.
+        return int(self._metadata[2])
+
+    @_episode_id.setter
+    def _episode_id(self, episode_id):
+        self._metadata[2] = episode_id
+
+    def flush(self):
+        for arr in self._memmaps:
+            arr.flush()
+
+    def end_epoch(self, epoch):
+        super().end_epoch(epoch)
+        self.flush()
+
+
+class MemmapSimpleReplayBuffer(MemmapReplayBufferMixin, SimpleReplayBuffer):
+    def __init__(self, *args, directory=None, reopen=True, **kwargs):
+        self._init_memmap(directory, reopen)
+        super().__init__(*args, **kwargs)
+        self._restore_pointers()
+
+
+class MemmapEnvReplayBuffer(MemmapReplayBufferMixin, EnvReplayBuffer):
+    def __init__(self, *args, directory=None, reopen=True, **kwargs):
+        self._init_memmap(directory, reopen)
+        super().__init__(*args, **kwargs)
+        self._restore_pointers()
+
+
+class MemmapObsDictRelabelingBuffer(
+    MemmapReplayBufferMixin,
+    ObsDictRelabelingBuffer,
+):
+    def __init__(self, *args, directory=None, reopen=True, **kwargs):
+        self._init_memmap(directory, reopen)
+        super().__init__(*args, **kwargs)
+        self._restore_pointers()
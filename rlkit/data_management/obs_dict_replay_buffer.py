@@ -1,7 +1,20 @@
 import numpy as np
 from gym.spaces import Dict, Discrete
 
-from rlkit.data_management.replay_buffer import ReplayBuffer
+from rlkit.data_management.replay_buffer import (
+    ReplayBuffer,
+    get_buffer_and_path_slices,
+    sample_valid_indices,
+    split_batch,
+)
+from rlkit.data_management.storage import (
+    AffineQuantizer,
+    decode,
+    encode,
+    get_action_index_dtypes,
+    get_storage_dtype,
+    is_quantized,
+)
 
 
 class ObsDictRelabelingBuffer(ReplayBuffer):
@@ -18,6 +31,19 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
        inefficient to save the observations twice, but it makes the code
        *much* easier since you no longer have to worry about termination
        conditions.
+     - If `deduplicate_obs` is True, every observation is saved only once
+       and self._next_obs[key] is a view of self._obs[key] shifted by one
+       row. Each episode then uses one extra row for its last next
+       observation, which is not a valid transition and is never sampled.
+     - Non-image observations and actions are stored as float32 unless
+       `dtypes` says otherwise. Bounded observation keys can be stored as
+       uint8, in which case they are quantized using the bounds of the
+       observation space and dequantized when sampled.
+     - Relabeled rewards are computed with one call per batch: with
+       `reward_fn` if given, else with the env's `compute_rewards`, else
+       with the env's `compute_reward` if it accepts batches (as the gym
+       robotics environments do), else with one `compute_reward` call per
+       sample.
     """
 
     def __init__(
@@ -31,7 +57,33 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
             observation_key='observation',
             desired_goal_key='desired_goal',
             achieved_goal_key='achieved_goal',
+            deduplicate_obs=False,
+            dtypes=None,
+            reward_fn=None,
+            reward_keys=None,
+            normalize_images=True,
+            store_action_indices=False,
     ):
+        """
+        :param dtypes: Dict mapping an observation key or 'actions' to the
+        dtype it is stored as. Image keys are always saved as uint8.
+        :param reward_fn: Optional vectorized reward function with the
+        signature of GoalEnv.compute_reward, i.e.
+        `reward_fn(achieved_goals, desired_goals, info)`, where the goals
+        have one row per sample. Used to relabel rewards instead of the env.
+        :param reward_keys: Keys of the next observations that the rewards
+        are computed from. Only these, the observation key, the goal keys
+        and the resampled goals are gathered when sampling a batch. Defaults
+        to the observation, desired goal and achieved goal keys.
+        :param normalize_images: If False, image observations and goals are
+        returned as uint8, and their batch fields are listed in the batch's
+        'image_fields'. np_to_pytorch_batch then normalizes them on the
+        device.
+        :param store_action_indices: If True and the action space is
+        Discrete, store the action indices, as the smallest unsigned integer
+        type that fits them, instead of one-hot rows. The batch's actions
+        then have shape [batch_size, 1].
+        """
         if internal_keys is None:
             internal_keys = []
         self.internal_keys = internal_keys
@@ -57,35 +109,109 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
         self.observation_key = observation_key
         self.desired_goal_key = desired_goal_key
         self.achieved_goal_key = achieved_goal_key
-        if isinstance(self.env.action_space, Discrete):
+        self._deduplicate_obs = deduplicate_obs
+        self.reward_fn = reward_fn
+        if reward_keys is None:
+            reward_keys = list(self.ob_keys_to_save)
+        self.reward_keys = [
+            key for key in reward_keys if key != desired_goal_key
+        ]
+        uses_compute_reward = (
+            reward_fn is not None or not hasattr(env, 'compute_rewards')
+        )
+        if uses_compute_reward and achieved_goal_key not in self.reward_keys:
+            self.reward_keys.append(achieved_goal_key)
+        self.normalize_images = normalize_images
+        # None until it's known whether env.compute_reward takes batches.
+        self._batched_compute_reward = None
+        self._store_action_indices = (
+            store_action_indices and isinstance(env.action_space, Discrete)
+        )
+        if self._store_action_indices:
+            self._action_dim = 1
+            dtypes = get_action_index_dtypes(dtypes, env.action_space.n)
+        elif isinstance(self.env.action_space, Discrete):
             self._action_dim = env.action_space.n
         else:
             self._action_dim = env.action_space.low.size
 
-        self._actions = np.zeros((max_size, self._action_dim))
+        self._actions = self._allocate_array(
+            '_actions',
+            (max_size, self._action_dim),
+            get_storage_dtype(dtypes, 'actions'),
+        )
         # self._terminals[i] = a terminal was received at time i
-        self._terminals = np.zeros((max_size, 1), dtype='uint8')
+        self._terminals = self._allocate_array(
+            '_terminals', (max_size, 1), np.uint8
+        )
         # self._obs[key][i] is the value of observation[key] at time i
         self._obs = {}
         self._next_obs = {}
+        # With deduplicate_obs, self._obs_storage[key] has one extra row that
+        # mirrors row 0, so that self._next_obs[key] can be a view of it even
+        # across the wrap-around.
+        self._obs_storage = {}
+        self._obs_quantizers = {}
         self.ob_spaces = self.env.observation_space.spaces
         for key in self.ob_keys_to_save + internal_keys:
             assert key in self.ob_spaces, \
                 "Key not found in the observation space: %s" % key
-            type = np.float64
+            type = get_storage_dtype(dtypes, key)
             if key.startswith('image'):
                 type = np.uint8
-            self._obs[key] = np.zeros(
-                (max_size, self.ob_spaces[key].low.size), dtype=type)
-            self._next_obs[key] = np.zeros(
-                (max_size, self.ob_spaces[key].low.size), dtype=type)
+            elif is_quantized(type):
+                self._obs_quantizers[key] = AffineQuantizer(
+                    self.ob_spaces[key].low, self.ob_spaces[key].high
+                )
+            ob_size = self.ob_spaces[key].low.size
+            if deduplicate_obs:
+                self._set_obs_storage(key, self._allocate_array(
+                    '_obs_storage/' + key, (max_size + 1, ob_size), type))
+            else:
+                self._obs[key] = self._allocate_array(
+                    '_obs/' + key, (max_size, ob_size), type)
+                self._next_obs[key] = self._allocate_array(
+                    '_next_obs/' + key, (max_size, ob_size), type)
+        for key in self.reward_keys:
+            assert key in self._next_obs, \
+                "Reward key is not saved: %s" % key
+        # The desired goals are sampled separately, as the resampled goals.
+        self._relabeled_goal_keys = [
+            key for key in self.goal_keys if key != desired_goal_key
+        ]
+        for key in self._relabeled_goal_keys:
+            assert key in self._next_obs, \
+                "Goal key is not saved: %s" % key
+        self._next_obs_keys_to_sample = list(dict.fromkeys(
+            self.reward_keys + [observation_key] + self._relabeled_goal_keys
+        ))
+        if deduplicate_obs:
+            # self._valid[i] = row i is a transition and not the last next
+            # observation of an episode.
+            self._valid = self._allocate_array(
+                '_valid', (max_size,), np.uint8
+            )
+        # self._episode_ends[i] = index right after the last transition of the
+        # episode of transition i (modulo max_size). Let j be any index in
+        # [i, self._episode_ends[i]), wrapping around the end of the buffer.
+        # Then self._next_obs[j] is a valid next observation for observation i
+        self._episode_ends = self._allocate_array(
+            '_episode_ends', (max_size,), np.int64
+        )
 
         self._top = 0
         self._size = 0
 
-        # Let j be any index in self._idx_to_future_obs_idx[i]
-        # Then self._next_obs[j] is a valid next observation for observation i
-        self._idx_to_future_obs_idx = [None] * max_size
+    def _set_obs_storage(self, key, storage):
+        self._obs_storage[key] = storage
+        self._obs[key] = storage[:-1]
+        self._next_obs[key] = storage[1:]
+
+    def _encode_obs(self, key, obs):
+        return encode(obs, self._obs_quantizers.get(key, None))
+
+    def _decode_obs(self, key, obs):
+        return decode(obs, self._obs_quantizers.get(key, None))
 
     def add_sample(self, observation, action, reward, terminal,
                    next_observation, **kwargs):
@@ -97,6 +223,13 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
     def num_steps_can_sample(self):
         return self._size
 
+    def load(self, directory):
+        super().load(directory)
+        if self._deduplicate_obs:
+            # The last row mirrors the first one and isn't saved.
+            for storage in self._obs_storage.values():
+                storage[-1] = storage[0]
+
     def add_path(self, path):
         obs = path["observations"]
         actions = path["actions"]
@@ -106,77 +239,109 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
         path_len = len(rewards)
 
         actions = flatten_n(actions)
-        if isinstance(self.env.action_space, Discrete):
+        if (
+                isinstance(self.env.action_space, Discrete)
+                and not self._store_action_indices
+        ):
             actions = np.eye(self._action_dim)[actions].reshape((-1, self._action_dim))
         obs = flatten_dict(obs, self.ob_keys_to_save + self.internal_keys)
+        if self._deduplicate_obs:
+            # Only the last next observation is not already in obs
+            if isinstance(next_obs, dict):
+                next_obs = {key: value[-1:] for key, value in next_obs.items()}
+            else:
+                next_obs = next_obs[-1:]
         next_obs = flatten_dict(next_obs, self.ob_keys_to_save + self.internal_keys)
         obs = preprocess_obs_dict(obs)
         next_obs = preprocess_obs_dict(next_obs)
 
-        if self._top + path_len >= self.max_size:
-            """
-            All of this logic is to handle wrapping the pointer when the
-            replay buffer gets full.
-            """
-            num_pre_wrap_steps = self.max_size - self._top
-            # numpy slice
-            pre_wrap_buffer_slice = np.s_[
-                                    self._top:self._top + num_pre_wrap_steps, :
-                                    ]
-            pre_wrap_path_slice = np.s_[0:num_pre_wrap_steps, :]
-
-            num_post_wrap_steps = path_len - num_pre_wrap_steps
-            post_wrap_buffer_slice = slice(0, num_post_wrap_steps)
-            post_wrap_path_slice = slice(num_pre_wrap_steps, path_len)
-            for buffer_slice, path_slice in [
-                (pre_wrap_buffer_slice, pre_wrap_path_slice),
-                (post_wrap_buffer_slice, post_wrap_path_slice),
-            ]:
-                self._actions[buffer_slice] = actions[path_slice]
-                self._terminals[buffer_slice] = terminals[path_slice]
-                for key in self.ob_keys_to_save + self.internal_keys:
-                    self._obs[key][buffer_slice] = obs[key][path_slice]
+        keys = self.ob_keys_to_save + self.internal_keys
+        for key in self._obs_quantizers:
+            obs[key] = self._encode_obs(key, obs[key])
+            next_obs[key] = self._encode_obs(key, next_obs[key])
+        num_new_rows = path_len + 1 if self._deduplicate_obs else path_len
+        top = self._reserve_rows(num_new_rows)
+        episode_end = (top + path_len) % self.max_size
+        for buffer_slice, path_slice in get_buffer_and_path_slices(
+                top, path_len, self.max_size
+        ):
+            self._actions[buffer_slice] = actions[path_slice]
+            self._terminals[buffer_slice] = terminals[path_slice]
+            for key in keys:
+                self._obs[key][buffer_slice] = obs[key][path_slice]
+                if not self._deduplicate_obs:
                     self._next_obs[key][buffer_slice] = next_obs[key][path_slice]
-            # Pointers from before the wrap
-            for i in range(self._top, self.max_size):
-                self._idx_to_future_obs_idx[i] = np.hstack((
-                    # Pre-wrap indices
-                    np.arange(i, self.max_size),
-                    # Post-wrap indices
-                    np.arange(0, num_post_wrap_steps)
-                ))
-            # Pointers after the wrap
-            for i in range(0, num_post_wrap_steps):
-                self._idx_to_future_obs_idx[i] = np.arange(
-                    i,
-                    num_post_wrap_steps,
-                )
-        else:
-            slc = np.s_[self._top:self._top + path_len, :]
-            self._actions[slc] = actions
-            self._terminals[slc] = terminals
-            for key in self.ob_keys_to_save + self.internal_keys:
-                self._obs[key][slc] = obs[key]
-                self._next_obs[key][slc] = next_obs[key]
-            for i in range(self._top, self._top + path_len):
-                self._idx_to_future_obs_idx[i] = np.arange(
-                    i, self._top + path_len
-                )
-        self._top = (self._top + path_len) % self.max_size
-        self._size = min(self._size + path_len, self.max_size)
+            if self._deduplicate_obs:
+                self._valid[buffer_slice] = 1
+            self._episode_ends[buffer_slice] = episode_end
+
+        if self._deduplicate_obs:
+            # Only the path that wrote row 0 updates its mirror, so that
+            # concurrent writers of the shared buffers can't copy a stale
+            # row 0 over it.
+            wrote_row_0 = top == 0 or top + num_new_rows > self.max_size
+            for key in keys:
+                self._obs[key][episode_end] = next_obs[key][-1]
+                if wrote_row_0:
+                    self._obs_storage[key][-1] = self._obs_storage[key][0]
+            self._valid[episode_end] = 0
+        self._commit_rows(top, num_new_rows)
+
+    def _reserve_rows(self, num_rows):
+        """
+        :return: Index of the first of the `num_rows` consecutive rows (modulo
+        the buffer size) that a new path is written to.
+        """
+        return self._top
+
+    def _commit_rows(self, top, num_rows):
+        """
+        Called once the rows returned by `_reserve_rows` have been written.
+        """
+        self._top = (top + num_rows) % self.max_size
+        self._size = min(self._size + num_rows, self.max_size)
 
     def _sample_indices(self, batch_size):
+        if self._deduplicate_obs:
+            return sample_valid_indices(self._valid, self._size, batch_size)
         return np.random.randint(0, self._size, batch_size)
 
     def random_batch(self, batch_size):
         indices = self._sample_indices(batch_size)
-        resampled_goals = self._next_obs[self.desired_goal_key][indices]
+        return self._get_batch(indices)
+
+    def random_batches(self, batch_size, num_batches):
+        """
+        The goals of a batch are relabeled by their position in it, so the
+        rows of the one large batch are dealt out to the batches in turn.
+        Every batch then gets its share of rollout, env and future goals.
+        """
+        batch = self.random_batch(batch_size * num_batches)
+        order = np.arange(batch_size * num_batches).reshape(
+            batch_size, num_batches
+        ).T.reshape(-1)
+        return split_batch({
+            key: value if key == 'image_fields' else value[order]
+            for key, value in batch.items()
+        }, num_batches)
+
+    def _get_batch(self, indices):
+        batch_size = len(indices)
+        resampled_goals = self._decode_obs(
+            self.desired_goal_key,
+            self._next_obs[self.desired_goal_key][indices],
+        )
 
         num_env_goals = int(batch_size * self.fraction_goals_env_goals)
         num_rollout_goals = int(batch_size * self.fraction_goals_rollout_goals)
         num_future_goals = batch_size - (num_env_goals + num_rollout_goals)
-        new_obs_dict = self._batch_obs_dict(indices)
-        new_next_obs_dict = self._batch_next_obs_dict(indices)
+        new_obs = self._decode_obs(
+            self.observation_key,
+            self._obs[self.observation_key][indices],
+        )
+        new_next_obs_dict = self._batch_next_obs_dict(
+            indices, self._next_obs_keys_to_sample,
+        )
 
         if num_env_goals > 0:
             env_goals = self.env.sample_goals(num_env_goals)
@@ -185,63 +350,53 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
             resampled_goals[num_rollout_goals:last_env_goal_idx] = (
                 env_goals[self.desired_goal_key]
             )
-            for goal_key in self.goal_keys:
-                new_obs_dict[goal_key][num_rollout_goals:last_env_goal_idx] = \
-                    env_goals[goal_key]
+            for goal_key in self._relabeled_goal_keys:
                 new_next_obs_dict[goal_key][
                 num_rollout_goals:last_env_goal_idx] = \
                     env_goals[goal_key]
         if num_future_goals > 0:
-            future_obs_idxs = []
-            for i in indices[-num_future_goals:]:
-                possible_future_obs_idxs = self._idx_to_future_obs_idx[i]
-                # This is generally faster than random.choice. Makes you wonder what
-                # random.choice is doing
-                num_options = len(possible_future_obs_idxs)
-                next_obs_i = int(np.random.randint(0, num_options))
-                future_obs_idxs.append(possible_future_obs_idxs[next_obs_i])
-            future_obs_idxs = np.array(future_obs_idxs)
-            resampled_goals[-num_future_goals:] = self._next_obs[
-                self.achieved_goal_key
-            ][future_obs_idxs]
-            for goal_key in self.goal_keys:
-                new_obs_dict[goal_key][-num_future_goals:] = \
-                    self._next_obs[goal_key][future_obs_idxs]
+            future_obs_idxs = self._sample_future_obs_idxs(
+                indices[-num_future_goals:]
+            )
+            resampled_goals[-num_future_goals:] = self._decode_obs(
+                self.achieved_goal_key,
+                self._next_obs[self.achieved_goal_key][future_obs_idxs],
+            )
+            for goal_key in self._relabeled_goal_keys:
                 new_next_obs_dict[goal_key][-num_future_goals:] = \
-                    self._next_obs[goal_key][future_obs_idxs]
+                    self._decode_obs(
+                        goal_key,
+                        self._next_obs[goal_key][future_obs_idxs],
+                    )
 
-        new_obs_dict[self.desired_goal_key] = resampled_goals
         new_next_obs_dict[self.desired_goal_key] = resampled_goals
-        new_obs_dict = postprocess_obs_dict(new_obs_dict)
-        new_next_obs_dict = postprocess_obs_dict(new_next_obs_dict)
-        # resampled_goals must be postprocessed as well
-        resampled_goals = new_next_obs_dict[self.desired_goal_key]
-
-        new_actions = self._actions[indices]
-        """
-        For example, the environments in this repo have batch-wise
-        implementations of computing rewards:
-
-        https://github.com/vitchyr/multiworld
-        """
-
-        if hasattr(self.env, 'compute_rewards'):
-            new_rewards = self.env.compute_rewards(
-                new_actions,
-                new_next_obs_dict,
-            )
-        else:  # Assuming it's a (possibly wrapped) gym GoalEnv
-            new_rewards = np.ones((batch_size, 1))
-            for i in range(batch_size):
-                new_rewards[i] = self.env.compute_reward(
-                    new_next_obs_dict[self.achieved_goal_key][i],
-                    new_next_obs_dict[self.desired_goal_key][i],
-                    None
+        new_next_obs = new_next_obs_dict[self.observation_key]
+        reward_obs_dict = {
+            key: new_next_obs_dict[key]
+            for key in self.reward_keys + [self.desired_goal_key]
+        }
+        # Images are only normalized where they are needed: for the reward
+        # and, if normalize_images is True, for the batch.
+        reward_obs_dict = postprocess_obs_dict(reward_obs_dict)
+        image_fields = []
+        if self.normalize_images:
+            new_obs = self._postprocess_obs(self.observation_key, new_obs)
+            if self.observation_key in reward_obs_dict:
+                new_next_obs = reward_obs_dict[self.observation_key]
+            else:
+                new_next_obs = self._postprocess_obs(
+                    self.observation_key, new_next_obs,
                 )
-        new_rewards = new_rewards.reshape(-1, 1)
+            resampled_goals = reward_obs_dict[self.desired_goal_key]
+        else:
+            if 'image' in self.observation_key:
+                image_fields += ['observations', 'next_observations']
+            if 'image' in self.desired_goal_key:
+                image_fields.append('resampled_goals')
+
+        new_actions = decode(self._actions[indices])
+        new_rewards = self._compute_rewards(new_actions, reward_obs_dict)
 
-        new_obs = new_obs_dict[self.observation_key]
-        new_next_obs = new_next_obs_dict[self.observation_key]
         batch = {
             'observations': new_obs,
             'actions': new_actions,
@@ -251,18 +406,85 @@ class ObsDictRelabelingBuffer(ReplayBuffer):
             'resampled_goals': resampled_goals,
             'indices': np.array(indices).reshape(-1, 1),
         }
+        if image_fields:
+            batch['image_fields'] = np.array(image_fields, dtype=object)
         return batch
 
-    def _batch_obs_dict(self, indices):
-        return {
-            key: self._obs[key][indices]
-            for key in self.ob_keys_to_save
-        }
+    def _postprocess_obs(self, key, obs):
+        return postprocess_obs_dict({key: obs})[key]
+
+    def _compute_rewards(self, actions, next_obs_dict):
+        if hasattr(self.env, 'compute_rewards') and self.reward_fn is None:
+            # For example, the multiworld environments have batch-wise
+            # implementations of computing rewards:
+            # https://github.com/vitchyr/multiworld
+            return np.asarray(self.env.compute_rewards(
+                actions, next_obs_dict
+            )).reshape(-1, 1)
+        achieved_goals = next_obs_dict[self.achieved_goal_key]
+        desired_goals = next_obs_dict[self.desired_goal_key]
+        if self.reward_fn is not None:
+            rewards = self.reward_fn(achieved_goals, desired_goals, None)
+        else:  # Assuming it's a (possibly wrapped) gym GoalEnv
+            if self._batched_compute_reward is None:
+                self._batched_compute_reward = self._probe_compute_reward(
+                    achieved_goals, desired_goals,
+                )
+            if self._batched_compute_reward:
+                rewards = self.env.compute_reward(
+                    achieved_goals, desired_goals, None
+                )
+            else:
+                rewards = self._compute_reward_per_sample(
+                    achieved_goals, desired_goals,
+                )
+        return np.asarray(rewards).reshape(-1, 1)
+
+    def _compute_reward_per_sample(self, achieved_goals, desired_goals):
+        rewards = np.ones((len(achieved_goals), 1))
+        for i in range(len(achieved_goals)):
+            rewards[i] = self.env.compute_reward(
+                achieved_goals[i],
+                desired_goals[i],
+                None
+            )
+        return rewards
 
-    def _batch_next_obs_dict(self, indices):
+    def _probe_compute_reward(self, achieved_goals, desired_goals):
+        """
+        :return: True if env.compute_reward returns the same rewards for a
+        whole batch of goals as it does for every sample on its own.
+        """
+        try:
+            rewards = np.asarray(self.env.compute_reward(
+                achieved_goals, desired_goals, None
+            ), dtype=np.float64)
+        except Exception:
+            return False
+        if rewards.size != len(achieved_goals):
+            return False
+        return np.allclose(
+            rewards.reshape(-1, 1),
+            self._compute_reward_per_sample(achieved_goals, desired_goals),
+        )
+
+    def _sample_future_obs_idxs(self, indices):
+        """
+        For every index i, sample uniformly from the indices j of the same
+        episode with j >= i.
+        """
+        num_options = (self._episode_ends[indices] - indices) % self.max_size
+        # Only an episode as long as the buffer ends where it starts
+        num_options[num_options == 0] = self.max_size
+        offsets = (np.random.random(len(indices)) * num_options).astype(
+            np.int64
+        )
+        return (indices + offsets) % self.max_size
+
+    def _batch_next_obs_dict(self, indices, keys):
         return {
-            key: self._next_obs[key][indices]
-            for key in self.ob_keys_to_save
+            key: self._decode_obs(key, self._next_obs[key][indices])
+            for key in keys
         }
 
 
@@ -273,8 +495,11 @@ def flatten_n(xs):
 
 def flatten_dict(dicts, keys):
     """
-    Turns list of dicts into dict of np arrays
+    Turns list of dicts, or a dict of arrays like the rollout functions
+    return, into dict of np arrays
     """
+    if isinstance(dicts, dict):
+        return {key: flatten_n(dicts[key]) for key in keys}
     return {
         key: flatten_n([d[key] for d in dicts])
         for key in keys
@@ -4,8 +4,11 @@ import rlkit.torch.pytorch_util as ptu
 from multiworld.core.image_env import normalize_image
 from rlkit.core.eval_util import create_stats_ordered_dict
 from rlkit.data_management.obs_dict_replay_buffer import flatten_dict
+from rlkit.data_management.replay_buffer import get_buffer_and_path_slices
 from rlkit.data_management.shared_obs_dict_replay_buffer import \
     SharedObsDictRelabelingBuffer
+from rlkit.data_management.storage import get_storage_dtype
+from rlkit.data_management.weighted_sampler import WeightedSampler
 from rlkit.envs.vae_wrapper import VAEWrappedEnv
 from rlkit.torch.vae.vae_trainer import (
     compute_p_x_np_to_np,
@@ -30,8 +33,18 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
             internal_keys=None,
             priority_function_kwargs=None,
             relabeling_goal_sampling_mode='vae_prior',
+            dtypes=None,
+            refresh_latents_batch_size=512,
+            refresh_latents_fraction=1.0,
             **kwargs
     ):
+        """
+        :param refresh_latents_batch_size: How many rows are encoded at once
+        in refresh_latents.
+        :param refresh_latents_fraction: Fraction of the buffer that is
+        refreshed by refresh_latents, in addition to the new rows. With 1,
+        all latents are refreshed every time.
+        """
         if internal_keys is None:
             internal_keys = []
 
@@ -42,7 +55,9 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
         ]:
             if key not in internal_keys:
                 internal_keys.append(key)
-        super().__init__(internal_keys=internal_keys, *args, **kwargs)
+        super().__init__(
+            internal_keys=internal_keys, dtypes=dtypes, *args, **kwargs
+        )
         assert isinstance(self.env, VAEWrappedEnv)
         self.vae = vae
         self.decoded_obs_key = decoded_obs_key
@@ -59,13 +74,27 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
                 exploration_rewards_type != 'None'
                 and exploration_rewards_scale != 0.
         )
-        self._exploration_rewards = np.zeros((self.max_size, 1))
+        self._exploration_rewards = self._allocate_array(
+            '_exploration_rewards',
+            (self.max_size, 1),
+            get_storage_dtype(dtypes, 'exploration_rewards'),
+        )
         self._prioritize_vae_samples = (
                 vae_priority_type != 'None'
                 and power != 0.
         )
-        self._vae_sample_priorities = np.zeros((self.max_size, 1))
+        self._vae_sample_priorities = self._allocate_array(
+            '_vae_sample_priorities', (self.max_size, 1), np.float64
+        )
         self._vae_sample_probs = None
+        self._vae_sampler = None
+        self.refresh_latents_batch_size = refresh_latents_batch_size
+        self.refresh_latents_fraction = refresh_latents_fraction
+        self._refresh_latents_start = 0
+        # self._stale_latents[i] = row i was added since the last refresh
+        self._stale_latents = self._allocate_array(
+            '_stale_latents', (self.max_size,), np.uint8
+        )
 
         type_to_function = {
             'vae_prob': self.vae_prob,
@@ -87,11 +116,19 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
         self.epoch = 0
         self._register_mp_array("_exploration_rewards")
         self._register_mp_array("_vae_sample_priorities")
+        self._register_mp_array("_stale_latents")
 
     def add_path(self, path):
         self.add_decoded_vae_goals_to_path(path)
         super().add_path(path)
 
+    def _commit_rows(self, top, num_rows):
+        for buffer_slice, _ in get_buffer_and_path_slices(
+                top, num_rows, self.max_size
+        ):
+            self._stale_latents[buffer_slice] = 1
+        super()._commit_rows(top, num_rows)
+
     def add_decoded_vae_goals_to_path(self, path):
         # decoding the self-sampled vae images should be done in batch (here)
         # rather than in the env for efficiency
@@ -104,6 +141,12 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
             len(desired_decoded_goals),
             -1
         )
+        if isinstance(path['observations'], dict):
+            path['observations'][self.decoded_desired_goal_key] = \
+                desired_decoded_goals
+            path['next_observations'][self.decoded_desired_goal_key] = \
+                desired_decoded_goals
+            return
         for idx, next_obs in enumerate(path['observations']):
             path['observations'][idx][self.decoded_desired_goal_key] = \
                 desired_decoded_goals[idx]
@@ -131,84 +174,58 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
                 'VAE Sample Probs',
                 vae_sample_probs,
             ))
+        stats.update(super().get_diagnostics())
         return stats
 
+    def _get_snapshot_metadata(self):
+        metadata = super()._get_snapshot_metadata()
+        metadata['epoch'] = self.epoch
+        return metadata
+
+    def _set_snapshot_metadata(self, metadata):
+        super()._set_snapshot_metadata(metadata)
+        # The sample probabilities are recomputed by the next refresh_latents.
+        self.epoch = metadata['epoch']
+        self.skew = (self.epoch > self.start_skew_epoch)
+
     def refresh_latents(self, epoch):
+        """
+        Re-encode the images in the buffer with the current VAE and update
+        the exploration rewards and sample priorities.
+
+        With refresh_latents_fraction < 1, only the rows added since the
+        last refresh and that fraction of the older rows, in a rotating
+        window, are refreshed.
+        """
         self.epoch = epoch
         self.skew = (self.epoch > self.start_skew_epoch)
-        batch_size = 512
-        next_idx = min(batch_size, self._size)
-
-        if self.exploration_rewards_type == 'hash_count':
-            # you have to count everything then compute exploration rewards
-            cur_idx = 0
-            next_idx = min(batch_size, self._size)
-            while cur_idx < self._size:
-                idxs = np.arange(cur_idx, next_idx)
-                normalized_imgs = (
-                    normalize_image(self._next_obs[self.decoded_obs_key][idxs])
-                )
-                cur_idx = next_idx
-                next_idx += batch_size
-                next_idx = min(next_idx, self._size)
 
-        cur_idx = 0
+        idxs = self._get_idxs_to_refresh()
+        for start in range(0, len(idxs), self.refresh_latents_batch_size):
+            self._refresh_latents(
+                idxs[start:start + self.refresh_latents_batch_size]
+            )
+        self._stale_latents[idxs] = 0
+        if self._deduplicate_obs:
+            for key in [
+                self.observation_key,
+                self.desired_goal_key,
+                self.achieved_goal_key,
+            ]:
+                self._obs_storage[key][-1] = self._obs_storage[key][0]
+
         obs_sum = np.zeros(self.vae.representation_size)
         obs_square_sum = np.zeros(self.vae.representation_size)
-        while cur_idx < self._size:
-            idxs = np.arange(cur_idx, next_idx)
-            self._obs[self.observation_key][idxs] = \
-                self.env._encode(
-                    normalize_image(self._obs[self.decoded_obs_key][idxs])
-                )
-            self._next_obs[self.observation_key][idxs] = \
-                self.env._encode(
-                    normalize_image(self._next_obs[self.decoded_obs_key][idxs])
-                )
-            # WARNING: we only refresh the desired/achieved latents for
-            # "next_obs". This means that obs[desired/achieve] will be invalid,
-            # so make sure there's no code that references this.
-            # TODO: enforce this with code and not a comment
-            self._next_obs[self.desired_goal_key][idxs] = \
-                self.env._encode(
-                    normalize_image(self._next_obs[self.decoded_desired_goal_key][idxs])
-                )
-            self._next_obs[self.achieved_goal_key][idxs] = \
-                self.env._encode(
-                    normalize_image(self._next_obs[self.decoded_achieved_goal_key][idxs])
-                )
-            normalized_imgs = (
-                normalize_image(self._next_obs[self.decoded_obs_key][idxs])
-            )
-            if self._give_explr_reward_bonus:
-                rewards = self.exploration_reward_func(
-                    normalized_imgs,
-                    idxs,
-                    **self.priority_function_kwargs
-                )
-                self._exploration_rewards[idxs] = rewards.reshape(-1, 1)
-            if self._prioritize_vae_samples:
-                if (
-                        self.exploration_rewards_type == self.vae_priority_type
-                        and self._give_explr_reward_bonus
-                ):
-                    self._vae_sample_priorities[idxs] = (
-                        self._exploration_rewards[idxs]
-                    )
-                else:
-                    self._vae_sample_priorities[idxs] = (
-                        self.vae_prioritization_func(
-                            normalized_imgs,
-                            idxs,
-                            **self.priority_function_kwargs
-                        ).reshape(-1, 1)
-                    )
-            obs_sum+= self._obs[self.observation_key][idxs].sum(axis=0)
-            obs_square_sum+= np.power(self._obs[self.observation_key][idxs], 2).sum(axis=0)
-
-            cur_idx = next_idx
-            next_idx += batch_size
-            next_idx = min(next_idx, self._size)
+        for start in range(0, self._size, self.refresh_latents_batch_size):
+            latent_obs = self._decode_obs(
+                self.observation_key,
+                self._obs[self.observation_key][
+                    start:min(start + self.refresh_latents_batch_size,
+                              self._size)
+                ],
+            ).astype(np.float64)
+            obs_sum += latent_obs.sum(axis=0)
+            obs_square_sum += np.power(latent_obs, 2).sum(axis=0)
         self.vae.dist_mu = obs_sum/self._size
         self.vae.dist_std = np.sqrt(obs_square_sum/self._size - np.power(self.vae.dist_mu, 2))
 
@@ -217,34 +234,187 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
             priority^power is calculated in the priority function
             for image_bernoulli_prob or image_gaussian_inv_prob and
             directly here if not.
+
+            The priorities of all rows are kept as they were computed, since
+            only some of them may have been refreshed.
             """
             if self.vae_priority_type == 'vae_prob':
-                self._vae_sample_priorities[:self._size] = relative_probs_from_log_probs(
+                self._vae_sample_probs = relative_probs_from_log_probs(
                     self._vae_sample_priorities[:self._size]
                 )
-                self._vae_sample_probs = self._vae_sample_priorities[:self._size]
             else:
                 self._vae_sample_probs = self._vae_sample_priorities[:self._size] ** self.power
             p_sum = np.sum(self._vae_sample_probs)
             assert p_sum > 0, "Unnormalized p sum is {}".format(p_sum)
             self._vae_sample_probs /= np.sum(self._vae_sample_probs)
             self._vae_sample_probs = self._vae_sample_probs.flatten()
+            assert (
+                np.max(self._vae_sample_probs) <= 1 and
+                np.min(self._vae_sample_probs) >= 0
+            )
+            self._vae_sampler = WeightedSampler(self._vae_sample_probs)
+
+    def _get_idxs_to_refresh(self):
+        if self.refresh_latents_fraction >= 1:
+            return np.arange(self._size)
+        new_idxs = np.flatnonzero(self._stale_latents[:self._size])
+        num_old_idxs = min(
+            int(np.ceil(self.refresh_latents_fraction * self._size)),
+            self._size,
+        )
+        old_idxs = (
+            self._refresh_latents_start + np.arange(num_old_idxs)
+        ) % max(self._size, 1)
+        self._refresh_latents_start = (
+            (self._refresh_latents_start + num_old_idxs) % max(self._size, 1)
+        )
+        return np.union1d(new_idxs, old_idxs)
+
+    def _refresh_latents(self, idxs):
+        """
+        Refresh the sorted rows `idxs`. Every distinct image is only encoded
+        once, and the encoding is reused to compute the priorities.
+        """
+        num_idxs = len(idxs)
+        images, image_idxs = self._get_unique_images(idxs)
+        normalized_images = normalize_image(images)
+        # Same as self.env._encode, but keep the full distribution.
+        latent_distribution_params = self.env.vae.encode(
+            ptu.from_numpy(normalized_images)
+        )
+        latents = ptu.get_numpy(latent_distribution_params[0])[image_idxs]
+
+        self._obs[self.observation_key][idxs] = self._encode_obs(
+            self.observation_key, latents[:num_idxs],
+        )
+        self._next_obs[self.observation_key][idxs] = self._encode_obs(
+            self.observation_key, latents[num_idxs:2 * num_idxs],
+        )
+        # WARNING: we only refresh the desired/achieved latents for
+        # "next_obs". This means that obs[desired/achieve] will be invalid,
+        # so make sure there's no code that references this.
+        # TODO: enforce this with code and not a comment
+        self._next_obs[self.desired_goal_key][idxs] = self._encode_obs(
+            self.desired_goal_key, latents[2 * num_idxs:3 * num_idxs],
+        )
+        self._next_obs[self.achieved_goal_key][idxs] = self._encode_obs(
+            self.achieved_goal_key, latents[3 * num_idxs:],
+        )
+
+        next_image_idxs = image_idxs[num_idxs:2 * num_idxs]
+        normalized_imgs = normalized_images[next_image_idxs]
+        if self.vae is self.env.vae:
+            priority_function_kwargs = dict(
+                self.priority_function_kwargs,
+                latent_distribution_params=tuple(
+                    param[next_image_idxs]
+                    for param in latent_distribution_params
+                ),
+            )
+        else:
+            priority_function_kwargs = self.priority_function_kwargs
+        if self._give_explr_reward_bonus:
+            rewards = self.exploration_reward_func(
+                normalized_imgs,
+                idxs,
+                **priority_function_kwargs
+            )
+            self._exploration_rewards[idxs] = rewards.reshape(-1, 1)
+        if self._prioritize_vae_samples:
+            if (
+                    self.exploration_rewards_type == self.vae_priority_type
+                    and self._give_explr_reward_bonus
+            ):
+                self._vae_sample_priorities[idxs] = (
+                    self._exploration_rewards[idxs]
+                )
+            else:
+                self._vae_sample_priorities[idxs] = (
+                    self.vae_prioritization_func(
+                        normalized_imgs,
+                        idxs,
+                        **priority_function_kwargs
+                    ).reshape(-1, 1)
+                )
+
+    def _get_unique_images(self, idxs):
+        """
+        Find the distinct images among the observations, next observations,
+        desired goals and achieved goals of the sorted rows `idxs`, using how
+        they relate instead of comparing every pair of images:
+         - the next observation of a row is the observation of the next row
+           of its episode, so it's only read for the last row of an episode,
+         - the desired goal usually stays the same for the whole episode,
+         - the achieved goal is usually the next observation.
+        The last two are checked by comparing the images with their
+        neighbours.
+
+        :return: Tuple of the distinct images and, for each of the
+        observations, next observations, desired goals and achieved goals, in
+        that order, the index of its image.
+        """
+        num_idxs = len(idxs)
+        obs = self._obs[self.decoded_obs_key][idxs]
+        desired_goals = self._next_obs[self.decoded_desired_goal_key][idxs]
+        achieved_goals = self._next_obs[self.decoded_achieved_goal_key][idxs]
+        episode_ends = self._episode_ends[idxs]
+        # has_next[k] = row k + 1 holds the next step of row k
+        has_next = np.zeros(num_idxs, dtype=bool)
+        has_next[:-1] = (
+            (idxs[1:] == idxs[:-1] + 1) & (idxs[1:] != episode_ends[:-1])
+        )
+        missing_next_obs = np.flatnonzero(~has_next)
+        next_obs = self._next_obs[self.decoded_obs_key][
+            idxs[missing_next_obs]
+        ]
+        next_obs_image_idxs = np.arange(1, num_idxs + 1)
+        next_obs_image_idxs[missing_next_obs] = (
+            num_idxs + np.arange(len(missing_next_obs))
+        )
+
+        # A desired goal that equals the one of the previous step is a copy.
+        new_goal = np.ones(num_idxs, dtype=bool)
+        new_goal[1:] = ~(
+            has_next[:-1] & rows_equal(desired_goals[1:], desired_goals[:-1])
+        )
+        num_images = num_idxs + len(missing_next_obs)
+        desired_goal_image_idxs = num_images + np.cumsum(new_goal) - 1
+        num_images += np.count_nonzero(new_goal)
+
+        is_next_obs = np.zeros(num_idxs, dtype=bool)
+        is_next_obs[:-1] = has_next[:-1] & rows_equal(
+            achieved_goals[:-1], obs[1:]
+        )
+        is_next_obs[missing_next_obs] = rows_equal(
+            achieved_goals[missing_next_obs], next_obs
+        )
+        achieved_goal_image_idxs = next_obs_image_idxs.copy()
+        new_achieved_goals = np.flatnonzero(~is_next_obs)
+        achieved_goal_image_idxs[new_achieved_goals] = (
+            num_images + np.arange(len(new_achieved_goals))
+        )
+
+        images = np.concatenate([
+            obs,
+            next_obs,
+            desired_goals[new_goal],
+            achieved_goals[new_achieved_goals],
+        ])
+        image_idxs = np.concatenate([
+            np.arange(num_idxs),
+            next_obs_image_idxs,
+            desired_goal_image_idxs,
+            achieved_goal_image_idxs,
+        ])
+        return images, image_idxs
 
     def sample_weighted_indices(self, batch_size):
         if (
             self._prioritize_vae_samples and
-            self._vae_sample_probs is not None and
+            self._vae_sampler is not None and
             self.skew
         ):
-            indices = np.random.choice(
-                len(self._vae_sample_probs),
-                batch_size,
-                p=self._vae_sample_probs,
-            )
-            assert (
-                np.max(self._vae_sample_probs) <= 1 and
-                np.min(self._vae_sample_probs) >= 0
-            )
+            indices = self._vae_sampler.sample(batch_size)
         else:
             indices = self._sample_indices(batch_size)
         return indices
@@ -272,7 +442,10 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
         next_image_obs = normalize_image(
             self._next_obs[self.decoded_obs_key][weighted_idxs]
         )
-        next_latent_obs = self._next_obs[self.achieved_goal_key][weighted_idxs]
+        next_latent_obs = self._decode_obs(
+            self.achieved_goal_key,
+            self._next_obs[self.achieved_goal_key][weighted_idxs],
+        )
         return {
             self.decoded_desired_goal_key:  next_image_obs,
             self.desired_goal_key:          next_latent_obs
@@ -293,6 +466,7 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
         )
 
     def vae_prob(self, next_vae_obs, indices, **kwargs):
+        # kwargs may include the latent_distribution_params of next_vae_obs
         return compute_p_x_np_to_np(
             self.vae,
             next_vae_obs,
@@ -300,10 +474,23 @@ class OnlineVaeRelabelingBuffer(SharedObsDictRelabelingBuffer):
             **kwargs
         )
 
-    def no_reward(self, next_vae_obs, indices):
+    def no_reward(self, next_vae_obs, indices, **kwargs):
         return np.zeros((len(next_vae_obs), 1))
 
     def _get_sorted_idx_and_train_weights(self):
         idx_and_weights = zip(range(len(self._vae_sample_probs)),
                               self._vae_sample_probs)
         return sorted(idx_and_weights, key=lambda x: x[1])
+
+
+def rows_equal(arr1, arr2):
+    """
+    :return: Whether every row of `arr1` equals the same row of `arr2`.
+    """
+    arr1 = np.ascontiguousarray(arr1).reshape(len(arr1), -1)
+    arr2 = np.ascontiguousarray(arr2).reshape(len(arr2), -1)
+    if arr1.shape[1] * arr1.itemsize % 8 == 0:
+        # Compare 8 bytes at a time.
+        arr1 = arr1.view(np.uint64)
+        arr2 = arr2.view(np.uint64)
+    return np.all(arr1 == arr2, axis=1)
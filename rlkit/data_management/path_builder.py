@@ -29,6 +29,12 @@ class PathBuilder(dict):
 
     Note that the key should be "actions" and not "action" since the
     resulting dictionary will have those keys.
+
+    Values are appended to a list per key, which is stacked into an array
+    by `get_all_stacked`. Dict values, e.g. dict observations or env infos,
+    are returned as a dict with one array per key. Dicts that can't be
+    stacked like that, e.g. ones whose keys change from step to step or
+    that hold strings, are returned as a list of dicts.
     """
 
     def __init__(self):
@@ -54,7 +60,53 @@ class PathBuilder(dict):
 
 
 def stack_list(lst):
-    if isinstance(lst[0], dict):
-        return lst
-    else:
+    """
+    :return: Array of the values in `lst`. If they are dicts, a dict of
+    arrays, or `lst` itself if the dicts can't be stacked key by key.
+    """
+    if not isinstance(lst[0], dict):
         return np.array(lst)
+    keys = lst[0].keys()
+    if any(not isinstance(d, dict) or d.keys() != keys for d in lst):
+        return lst
+    stacked = {}
+    for key in keys:
+        values = [d[key] for d in lst]
+        if isinstance(values[0], dict):
+            stacked[key] = stack_list(values)
+            if isinstance(stacked[key], list):
+                return lst
+            continue
+        try:
+            stacked[key] = np.array(values)
+        except ValueError:
+            # The values have different shapes.
+            return lst
+        if stacked[key].dtype.kind not in 'biufc':
+            return lst
+    return stacked
+
+
+def dict_obs_to_list(dict_obs, path_len=None):
+    """
+    Turns a dict of arrays into a list of dicts, one per time step. Lists
+    are returned as they are.
+
+    :param path_len: Length of the path. Only needed if `dict_obs` may be an
+    empty dict, e.g. agent infos of policies that don't return any.
+    """
+    if not isinstance(dict_obs, dict):
+        return dict_obs
+    if path_len is None:
+        path_len = len(next(iter(dict_obs.values())))
+    return [
+        {key: _get_step(value, t) for key, value in dict_obs.items()}
+        for t in range(path_len)
+    ]
+
+
+def _get_step(value, t):
+    if isinstance(value, dict):
+        return {k: _get_step(v, t) for k, v in value.items()}
+    return value[t]
+
@@ -0,0 +1,144 @@
+import numpy as np
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.replay_buffer import split_batch
+from rlkit.data_management.segment_tree import (
+    MinSegmentTree,
+    SumSegmentTree,
+)
+
+
+class PrioritizedReplayBuffer(EnvReplayBuffer):
+    """
+    Prioritized experience replay (Schaul et al., 2016).
+
+    Transition i is sampled with probability p_i^alpha / sum_j p_j^alpha, where
+    p_i is its last absolute TD error. New transitions get the highest
+    priority seen so far. Batches contain the sampled `indices` and the
+    normalized importance-sampling `weights`, and priorities are updated by
+    calling `update_priorities(indices, td_errors)`, usually through
+    `TorchTrainer.report_td_errors`.
+    """
+
+    def __init__(
+            self,
+            max_replay_buffer_size,
+            env,
+            alpha=0.6,
+            beta=0.4,
+            epsilon=1e-6,
+            **kwargs
+    ):
+        """
+        :param alpha: How much prioritization is used. 0 is uniform sampling.
+        :param beta: How much the importance-sampling weights correct for the
+        non-uniform sampling. 1 is a full correction.
+        :param epsilon: Added to the TD errors so that no transition has zero
+        probability of being sampled again.
+        """
+        super().__init__(max_replay_buffer_size, env, **kwargs)
+        assert alpha >= 0
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self._sum_tree = SumSegmentTree(max_replay_buffer_size)
+        self._min_tree = MinSegmentTree(max_replay_buffer_size)
+        self._max_priority = 1.0
+
+    def add_sample(self, observation, action, reward, next_observation,
+                   terminal, **kwargs):
+        idx = self._top
+        super().add_sample(
+            observation=observation,
+            action=action,
+            reward=reward,
+            next_observation=next_observation,
+            terminal=terminal,
+            **kwargs
+        )
+        self._set_new_priorities(
+            np.array([idx, (idx + 1) % self._max_replay_buffer_size])
+            if self._deduplicate_obs else np.array([idx])
+        )
+
+    def add_path(self, path):
+        old_top = self._top
+        super().add_path(path)
+        num_new_rows = (self._top - old_top) % self._max_replay_buffer_size
+        if num_new_rows == 0 and len(path["rewards"]) > 0:
+            num_new_rows = self._max_replay_buffer_size
+        self._set_new_priorities(
+            (old_top + np.arange(num_new_rows)) % self._max_replay_buffer_size
+        )
+
+    def _set_new_priorities(self, idxs):
+        priorities = np.full(len(idxs), self._max_priority ** self.alpha)
+        if self._deduplicate_obs:
+            priorities *= self._valid[idxs]
+        self._set_priorities(idxs, priorities)
+
+    def _set_priorities(self, idxs, priorities):
+        self._sum_tree[idxs] = priorities
+        # Rows that can't be sampled shouldn't count as the least likely one.
+        self._min_tree[idxs] = np.where(priorities > 0, priorities, np.inf)
+
+    def update_priorities(self, indices, td_errors):
+        """
+        :param indices: Buffer indices, as returned in the batch.
+        :param td_errors: The TD error of each of those transitions.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        priorities = np.abs(np.asarray(td_errors).reshape(-1)) + self.epsilon
+        self._max_priority = max(self._max_priority, priorities.max())
+        self._set_priorities(indices, priorities ** self.alpha)
+
+    def _sample_indices(self, batch_size, num_batches=1):
+        # Stratified sampling: every batch has one sample from each of
+        # batch_size equally sized segments of the cumulative priority.
+        total = self._sum_tree.reduce()
+        prefixsums = (
+            (
+                np.arange(batch_size)
+                + np.random.uniform(size=(num_batches, batch_size))
+            ) * total / batch_size
+        )
+        return self._sum_tree.find_prefixsum_idx(prefixsums.reshape(-1))
+
+    def random_batch(self, batch_size):
+        return self._get_weighted_batch(self._sample_indices(batch_size))
+
+    def random_batches(self, batch_size, num_batches):
+        indices = self._sample_indices(batch_size, num_batches)
+        return split_batch(self._get_weighted_batch(indices), num_batches)
+
+    def _get_weighted_batch(self, indices):
+        batch = self._get_batch(indices)
+        total = self._sum_tree.reduce()
+        probs = self._sum_tree[indices] / total
+        max_weight = (self._min_tree.reduce() / total * self._size) ** (
+            -self.beta
+        )
+        weights = (probs * self._size) ** (-self.beta) / max_weight
+        batch['weights'] = weights.reshape(-1, 1).astype(np.float32)
+        batch['indices'] = indices.reshape(-1, 1)
+        return batch
+
+    def _get_extra_snapshot_arrays(self):
+        arrays = super()._get_extra_snapshot_arrays()
+        arrays['_sum_tree'] = self._sum_tree._tree
+        arrays['_min_tree'] = self._min_tree._tree
+        return arrays
+
+    def _get_snapshot_metadata(self):
+        metadata = super()._get_snapshot_metadata()
+        metadata['max_priority'] = float(self._max_priority)
+        return metadata
+
+    def _set_snapshot_metadata(self, metadata):
+        super()._set_snapshot_metadata(metadata)
+        self._max_priority = metadata['max_priority']
+
+    def get_diagnostics(self):
+        stats = super().get_diagnostics()
+        stats['max priority'] = self._max_priority
+        return stats
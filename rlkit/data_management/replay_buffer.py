@@ -1,11 +1,36 @@
 import abc
+import functools
+import json
+import os
+import os.path as osp
+import shutil
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rlkit.data_management.path_builder import dict_obs_to_list
+
+SNAPSHOT_METADATA_FILE_NAME = 'metadata.json'
 
 
 class ReplayBuffer(object, metaclass=abc.ABCMeta):
     """
     A class used to save and replay data.
+
+    Calls to `add_path`, `random_batch` and `random_batches` are counted and
+    timed, including in subclasses that override them, and reported in
+    `get_diagnostics` along with the memory used by the arrays.
     """
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method_name in _INSTRUMENTED_METHODS:
+            # The method may also come from a mixin that isn't a ReplayBuffer.
+            method = getattr(cls, method_name)
+            if not getattr(method, 'is_instrumented', False):
+                setattr(cls, method_name, _instrument(method, method_name))
+
     @abc.abstractmethod
     def add_sample(self, observation, action, reward, next_observation,
                    terminal, **kwargs):
@@ -42,6 +67,7 @@ class ReplayBuffer(object, metaclass=abc.ABCMeta):
 
         :param path: Dict like one outputted by rlkit.samplers.util.rollout
         """
+        path_len = len(path["rewards"])
         for i, (
                 obs,
                 action,
@@ -51,13 +77,13 @@ class ReplayBuffer(object, metaclass=abc.ABCMeta):
                 agent_info,
                 env_info
         ) in enumerate(zip(
-            path["observations"],
+            dict_obs_to_list(path["observations"], path_len),
             path["actions"],
             path["rewards"],
-            path["next_observations"],
+            dict_obs_to_list(path["next_observations"], path_len),
             path["terminals"],
-            path["agent_infos"],
-            path["env_infos"],
+            dict_obs_to_list(path["agent_infos"], path_len),
+            dict_obs_to_list(path["env_infos"], path_len),
         )):
             self.add_sample(
                 observation=obs,
@@ -83,12 +109,331 @@ class ReplayBuffer(object, metaclass=abc.ABCMeta):
         """
         pass
 
-    def get_diagnostics(self):
+    def random_batches(self, batch_size, num_batches):
+        """
+        Return `num_batches` batches of size `batch_size`, stacked so that
+        every value has shape [num_batches, batch_size, ...]. All of them
+        are sampled with one call to `random_batch`, which saves the per-call
+        overhead of sampling them one at a time.
+        """
+        batch = self.random_batch(batch_size * num_batches)
+        return split_batch(batch, num_batches)
+
+    def _allocate_array(self, name, shape, dtype):
+        """
+        Allocate the zero-initialized array that stores the field `name`.
+
+        `name` is the attribute that holds the array, or "attribute/key" if
+        the attribute is a dict of arrays. Arrays allocated here are included
+        in `save` and `load`.
+        """
+        self.__dict__.setdefault('_array_names', []).append(name)
+        return self._create_array(name, shape, dtype)
+
+    def _create_array(self, name, shape, dtype):
+        """
+        Subclasses can override this to back the buffer with something other
+        than anonymous memory, e.g. files or shared memory.
+        """
+        return np.zeros(shape, dtype=dtype)
+
+    def _get_array(self, name):
+        attr_name, _, key = name.partition('/')
+        arr = getattr(self, attr_name)
+        if key:
+            arr = arr[key]
+        return arr
+
+    def save(self, directory, extra_metadata=None):
+        """
+        Save the contents of the buffer to `directory`: one uncompressed .npy
+        file per array plus a small JSON file with the pointers. Nothing is
+        pickled, so this is bounded by disk bandwidth. An existing snapshot
+        in `directory` is only replaced once the new one is complete.
+
+        :param extra_metadata: JSON-serializable dict saved with the
+        snapshot, e.g. the epoch, which `load_snapshot_metadata` returns.
+        """
+        tmp_directory = directory + '.tmp'
+        if osp.exists(tmp_directory):
+            shutil.rmtree(tmp_directory)
+        os.makedirs(tmp_directory)
+        # Rows past the buffer size have never been written.
+        max_num_rows = self.num_steps_can_sample() + 1
+        for name in getattr(self, '_array_names', []):
+            self._save_array(tmp_directory, name, max_num_rows)
+        for name, arr in self._get_extra_snapshot_arrays().items():
+            save_array(tmp_directory, name, arr)
+        metadata = self._get_snapshot_metadata()
+        metadata['extra'] = extra_metadata or {}
+        with open(osp.join(tmp_directory, SNAPSHOT_METADATA_FILE_NAME), 'w') as f:
+            json.dump(metadata, f)
+
+        old_directory = directory + '.old'
+        if osp.exists(directory):
+            os.rename(directory, old_directory)
+        os.rename(tmp_directory, directory)
+        if osp.exists(old_directory):
+            shutil.rmtree(old_directory)
+
+    def load(self, directory):
+        """
+        Restore the contents saved by `save` into this buffer. The arrays are
+        copied in place, so this also works for buffers backed by shared
+        memory or files. The buffer must have been constructed with the same
+        arguments as the one that was saved.
+        """
+        metadata = _load_metadata(directory)
+        for name in getattr(self, '_array_names', []):
+            self._load_array(directory, name)
+        for name, arr in self._get_extra_snapshot_arrays().items():
+            load_array_into(directory, name, arr)
+        self._set_snapshot_metadata(metadata)
+
+    def _save_array(self, directory, name, max_num_rows):
+        save_array(directory, name, self._get_array(name), max_num_rows)
+
+    def _load_array(self, directory, name):
+        load_array_into(directory, name, self._get_array(name))
+
+    def _get_extra_snapshot_arrays(self):
+        """
+        :return: dict mapping a name to an array that isn't allocated with
+        `_allocate_array` but should be saved in full as well.
+        """
         return {}
 
+    def _get_snapshot_metadata(self):
+        """
+        :return: JSON-serializable dict of everything besides the arrays that
+        `load` needs to restore.
+        """
+        return dict(top=self._top, size=self._size)
+
+    def _set_snapshot_metadata(self, metadata):
+        self._top = metadata['top']
+        self._size = metadata['size']
+
+    def get_diagnostics(self):
+        stats = OrderedDict()
+        stats.update(self._get_memory_diagnostics())
+        stats.update(self._get_call_diagnostics())
+        return stats
+
+    def _get_memory_diagnostics(self):
+        """
+        Resident bytes only count the rows that were written, since the
+        pages of zero-filled arrays are only backed by memory once touched.
+        """
+        arrays = OrderedDict(
+            (name, self._get_array(name))
+            for name in getattr(self, '_array_names', [])
+        )
+        arrays.update(self._get_extra_snapshot_arrays())
+        num_rows = self.num_steps_can_sample()
+        stats = OrderedDict()
+        allocated_bytes = 0
+        resident_bytes = 0
+        for name, arr in arrays.items():
+            nbytes = get_nbytes(arr)
+            stats['allocated bytes/' + name.lstrip('_')] = nbytes
+            allocated_bytes += nbytes
+            if name in getattr(self, '_array_names', []):
+                resident_bytes += nbytes * min(num_rows / max(len(arr), 1), 1)
+            else:
+                resident_bytes += nbytes
+        stats['allocated bytes'] = allocated_bytes
+        stats['resident bytes'] = int(resident_bytes)
+        return stats
+
+    def _get_call_diagnostics(self):
+        call_stats = getattr(self, '_call_stats', {})
+        stats = OrderedDict()
+        for stat_name in ['add_path', 'random_batch']:
+            num_calls, num_transitions, total_time = call_stats.get(
+                stat_name, (0, 0, 0.)
+            )
+            stats[stat_name + ' calls'] = num_calls
+            stats[stat_name + ' transitions'] = num_transitions
+            stats[stat_name + ' time (s)'] = total_time
+            stats[stat_name + ' transitions/s'] = (
+                num_transitions / total_time if total_time > 0 else 0.
+            )
+        return stats
+
     def get_snapshot(self):
         return {}
 
     def end_epoch(self, epoch):
         return
 
+
+# Method name -> (name of the stats it counts towards, function of the
+# method's arguments that returns the number of transitions).
+_INSTRUMENTED_METHODS = {
+    'add_path': ('add_path', lambda path: len(path['rewards'])),
+    'random_batch': ('random_batch', lambda batch_size: batch_size),
+    'random_batches': (
+        'random_batch',
+        lambda batch_size, num_batches: batch_size * num_batches,
+    ),
+}
+
+
+def _instrument(method, method_name):
+    """
+    Wrap a replay buffer method so that its calls are counted and timed.
+    Calls made from within another instrumented call with the same stats,
+    e.g. to super().add_path, are only counted once.
+    """
+    stat_name, get_num_transitions = _INSTRUMENTED_METHODS[method_name]
+
+    @functools.wraps(method)
+    def instrumented_method(self, *args, **kwargs):
+        active_stats = self.__dict__.setdefault('_active_call_stats', set())
+        if stat_name in active_stats:
+            return method(self, *args, **kwargs)
+        active_stats.add(stat_name)
+        start_time = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            active_stats.discard(stat_name)
+        total_time = time.perf_counter() - start_time
+        call_stats = self.__dict__.setdefault('_call_stats', {})
+        num_calls, num_transitions, prev_time = call_stats.get(
+            stat_name, (0, 0, 0.)
+        )
+        call_stats[stat_name] = (
+            num_calls + 1,
+            num_transitions + get_num_transitions(*args, **kwargs),
+            prev_time + total_time,
+        )
+        return result
+    instrumented_method.is_instrumented = True
+    return instrumented_method
+
+
+for _method_name in _INSTRUMENTED_METHODS:
+    setattr(ReplayBuffer, _method_name, _instrument(
+        ReplayBuffer.__dict__[_method_name], _method_name
+    ))
+
+
+def get_nbytes(arr):
+    """
+    :return: Size in bytes of a numpy array or torch tensor.
+    """
+    if hasattr(arr, 'nbytes'):
+        return int(arr.nbytes)
+    return arr.element_size() * arr.nelement()
+
+
+def get_buffer_and_path_slices(top, path_len, max_size):
+    """
+    Split a path of length `path_len` that is written at index `top` of a
+    ring buffer of size `max_size` into (buffer slice, path slice) pairs,
+    handling the wrap-around when the buffer is full. If the path is longer
+    than the buffer, only its last `max_size` steps are kept.
+    """
+    path_start = 0
+    if path_len > max_size:
+        path_start = path_len - max_size
+        top = (top + path_start) % max_size
+    num_pre_wrap_steps = min(max_size - top, path_len - path_start)
+    slices = [(
+        np.s_[top:top + num_pre_wrap_steps],
+        np.s_[path_start:path_start + num_pre_wrap_steps],
+    )]
+    num_post_wrap_steps = path_len - path_start - num_pre_wrap_steps
+    if num_post_wrap_steps > 0:
+        slices.append((
+            np.s_[0:num_post_wrap_steps],
+            np.s_[path_start + num_pre_wrap_steps:path_len],
+        ))
+    return slices
+
+
+def sample_valid_indices(valid, size, batch_size):
+    """
+    Sample `batch_size` indices uniformly from [0, size) where `valid` is
+    nonzero. Invalid indices are rare, so they are simply redrawn.
+    """
+    indices = np.random.randint(0, size, batch_size)
+    invalid = np.flatnonzero(valid[indices] == 0)
+    while len(invalid) > 0:
+        indices[invalid] = np.random.randint(0, size, len(invalid))
+        invalid = invalid[valid[indices[invalid]] == 0]
+    return indices
+
+
+def split_batch(batch, num_batches):
+    """
+    Reshape every value of a batch from [num_batches * batch_size, ...] to
+    [num_batches, batch_size, ...].
+
+    'image_fields' describes the whole batch, so it's left as it is.
+    """
+    return {
+        key: (
+            value if key == 'image_fields'
+            else value.reshape((num_batches, -1) + tuple(value.shape[1:]))
+        )
+        for key, value in batch.items()
+    }
+
+
+def load_snapshot_metadata(directory):
+    """
+    :return: The `extra_metadata` that the replay buffer snapshot in
+    `directory` was saved with.
+    """
+    return _load_metadata(directory).get('extra', {})
+
+
+def _load_metadata(directory):
+    with open(osp.join(directory, SNAPSHOT_METADATA_FILE_NAME)) as f:
+        return json.load(f)
+
+
+def save_array(directory, name, arr, max_num_rows=None):
+    """
+    Save the first `max_num_rows` rows of `arr` to `directory` as a .npy file.
+    """
+    if max_num_rows is not None:
+        arr = arr[:max_num_rows]
+    np.save(_get_array_path(directory, name), np.ascontiguousarray(arr))
+
+
+def load_array_into(directory, name, arr, chunk_size=2 ** 16):
+    """
+    Copy the array saved by `save_array` into the beginning of `arr`, in
+    chunks of `chunk_size` rows so that large arrays are never loaded into
+    memory twice.
+    """
+    for start, chunk in iterate_saved_array(
+            directory, name, arr.shape, chunk_size
+    ):
+        arr[start:start + len(chunk)] = chunk
+
+
+def iterate_saved_array(directory, name, shape, chunk_size=2 ** 16):
+    """
+    Yield (start row, rows) chunks of the array saved by `save_array`
+    without loading all of it into memory.
+
+    :param shape: Shape of the array it will be copied into.
+    """
+    saved_arr = np.load(_get_array_path(directory, name), mmap_mode='r')
+    assert (
+        saved_arr.shape[1:] == tuple(shape[1:])
+        and len(saved_arr) <= shape[0]
+    ), "Saved {} has shape {}, but the buffer has {}".format(
+        name, saved_arr.shape, tuple(shape),
+    )
+    for start in range(0, len(saved_arr), chunk_size):
+        yield start, np.array(saved_arr[start:start + chunk_size])
+
+
+def _get_array_path(directory, name):
+    return osp.join(directory, name.replace('/', '.') + '.npy')
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class SegmentTree(object):
+    """
+    Array-backed binary segment tree over `capacity` leaves.
+
+    Node 1 is the root and node i has children 2i and 2i + 1. The leaves are
+    stored at [capacity, 2 * capacity). All operations take a batch of indices
+    and loop over the O(log n) levels of the tree rather than the elements.
+    """
+
+    def __init__(self, capacity, operation, neutral_element):
+        assert capacity > 0
+        self._capacity = 2
+        while self._capacity < capacity:
+            self._capacity *= 2
+        self._operation = operation
+        self._neutral_element = neutral_element
+        self._tree = np.full(
+            2 * self._capacity, neutral_element, dtype=np.float64
+        )
+
+    def __setitem__(self, idxs, values):
+        idxs = np.asarray(idxs, dtype=np.int64).reshape(-1) + self._capacity
+        if len(idxs) == 0:
+            return
+        self._tree[idxs] = np.asarray(values, dtype=np.float64).reshape(-1)
+        while True:
+            # All indices are on the same level, so the root is reached at
+            # the same time for all of them.
+            idxs = np.unique(idxs // 2)
+            self._tree[idxs] = self._operation(
+                self._tree[2 * idxs],
+                self._tree[2 * idxs + 1],
+            )
+            if idxs[0] == 1:
+                break
+
+    def __getitem__(self, idxs):
+        return self._tree[np.asarray(idxs, dtype=np.int64) + self._capacity]
+
+    def reduce(self):
+        """
+        :return: operation applied to all leaves.
+        """
+        return self._tree[1]
+
+
+class SumSegmentTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.add, 0.)
+
+    def find_prefixsum_idx(self, prefixsums):
+        """
+        For every prefix sum s, find the index i such that
+        sum(leaves[:i]) <= s < sum(leaves[:i + 1]), so leaf i is never zero.
+        Prefix sums that rounding pushes to or past the total of the leaves
+        go to the last nonzero leaf.
+
+        :param prefixsums: np array of values in [0, self.reduce()).
+        :return: np array of leaf indices.
+        """
+        assert self.reduce() > 0
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        idxs = np.ones(len(prefixsums), dtype=np.int64)
+        while idxs[0] < self._capacity:
+            left_idxs = 2 * idxs
+            left_sums = self._tree[left_idxs]
+            # Only go down subtrees with a nonzero sum.
+            go_right = (
+                (prefixsums >= left_sums) & (self._tree[left_idxs + 1] > 0)
+            )
+            prefixsums -= left_sums * go_right
+            idxs = left_idxs + go_right
+        return idxs - self._capacity
+
+
+class MinSegmentTree(SegmentTree):
+    def __init__(self, capacity):
+        super().__init__(capacity, np.minimum, np.inf)
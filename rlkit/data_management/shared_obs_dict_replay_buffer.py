@@ -1,6 +1,14 @@
+from multiprocessing import shared_memory
+
 import numpy as np
 
 from rlkit.data_management.obs_dict_replay_buffer import ObsDictRelabelingBuffer
+from rlkit.data_management.shared_replay_buffer import (
+    commit_rows,
+    get_consistent_batch,
+    reserve_rows,
+    sample_written_indices,
+)
 
 import torch.multiprocessing as mp
 import ctypes
@@ -15,60 +23,131 @@ class SharedObsDictRelabelingBuffer(ObsDictRelabelingBuffer):
     of that). Technically, putting such large arrays in shared memory/requiring
     synchronized access can be extremely slow, but it seems ok empirically.
 
-    This code also breaks a lot of functionality for the subprocess. For example,
-    random_batch is incorrect as actions and _idx_to_future_obs_idx are not
-    shared. If the subprocess needs all of the functionality, a mp.Array
-    must be used for all numpy arrays in the replay buffer.
+    The actions, terminals and episode boundaries are shared as well, so
+    random_batch also works in the subprocess. Other state, such as _top, is
+    not shared. If the subprocess needs that, it must be registered with
+    _register_mp_array as well.
 
+    With use_shared_memory=True, the arrays are allocated directly in
+    multiprocessing.shared_memory instead. Nothing is zero-filled up front,
+    so memory is only touched as the buffer fills up. The top and size of
+    the buffer are shared as well, so paths can be added from every process.
+    As in SharedReplayBufferMixin, writers only hold a lock while reserving
+    their rows, and every row has a version that is odd while it is being
+    written. random_batch skips those rows and resamples rows that a writer
+    started on while the batch was gathered, so batches never mix old and
+    new data, also once the buffer wraps around. The future goals of a row
+    come from later rows of its episode, which are only overwritten after
+    it, so checking the sampled rows is enough. In this mode, the process
+    that created the buffer should call `close` when done.
     """
 
     def __init__(
             self,
             *args,
+            use_shared_memory=False,
             **kwargs
     ):
-        self._shared_size = mp.Value(ctypes.c_long, 0)
+        self._use_shared_memory = use_shared_memory
+        # name -> (SharedMemory, dtype, shape)
+        self._shared_memory_info = {}
+        if use_shared_memory:
+            self._shared_size = None
+            self._lock = mp.Lock()
+            # self._pointers = [top, size, number of reservations]
+            self._pointers = self._create_array('_pointers', (3,), np.int64)
+        else:
+            self._shared_size = mp.Value(ctypes.c_long, 0)
         ObsDictRelabelingBuffer.__init__(self, *args, **kwargs)
 
         self._mp_array_info = {}
         self._shared_obs_info = {}
         self._shared_next_obs_info = {}
 
-        for obs_key, obs_arr in self._obs.items():
-            ctype = ctypes.c_double
-            if obs_arr.dtype == np.uint8:
-                ctype = ctypes.c_uint8
-
-            self._shared_obs_info[obs_key] = (
-                mp.Array(ctype, obs_arr.size),
-                obs_arr.dtype,
-                obs_arr.shape,
-            )
-            self._shared_next_obs_info[obs_key] = (
-                mp.Array(ctype, obs_arr.size),
-                obs_arr.dtype,
-                obs_arr.shape,
+        if use_shared_memory:
+            # Everything already lives in shared memory.
+            for obs_key in self._obs:
+                if self._deduplicate_obs:
+                    self._shared_obs_info[obs_key] = (
+                        self._shared_memory_info['_obs_storage/' + obs_key]
+                    )
+                else:
+                    self._shared_obs_info[obs_key] = (
+                        self._shared_memory_info['_obs/' + obs_key]
+                    )
+                    self._shared_next_obs_info[obs_key] = (
+                        self._shared_memory_info['_next_obs/' + obs_key]
+                    )
+            if self._deduplicate_obs:
+                self._register_mp_array("_valid")
+            # Not allocated with _allocate_array, since the versions aren't
+            # data to save or count as buffer memory.
+            self._row_versions = self._create_array(
+                '_row_versions', (self.max_size,), np.int64
             )
+            self._register_mp_array("_pointers")
+            self._register_mp_array("_row_versions")
+        elif self._deduplicate_obs:
+            # Share the deduplicated storage. _obs and _next_obs are views.
+            for obs_key, obs_arr in self._obs_storage.items():
+                self._shared_obs_info[obs_key] = (
+                    mp.Array(get_ctype(obs_arr), obs_arr.size),
+                    obs_arr.dtype,
+                    obs_arr.shape,
+                )
+                self._set_obs_storage(
+                    obs_key, to_np(*self._shared_obs_info[obs_key])
+                )
+            self._register_mp_array("_valid")
+        else:
+            for obs_key, obs_arr in self._obs.items():
+                ctype = get_ctype(obs_arr)
 
-            self._obs[obs_key] = to_np(*self._shared_obs_info[obs_key])
-            self._next_obs[obs_key] = to_np(
-                *self._shared_next_obs_info[obs_key])
+                self._shared_obs_info[obs_key] = (
+                    mp.Array(ctype, obs_arr.size),
+                    obs_arr.dtype,
+                    obs_arr.shape,
+                )
+                self._shared_next_obs_info[obs_key] = (
+                    mp.Array(ctype, obs_arr.size),
+                    obs_arr.dtype,
+                    obs_arr.shape,
+                )
+
+                self._obs[obs_key] = to_np(*self._shared_obs_info[obs_key])
+                self._next_obs[obs_key] = to_np(
+                    *self._shared_next_obs_info[obs_key])
         self._register_mp_array("_actions")
         self._register_mp_array("_terminals")
+        self._register_mp_array("_episode_ends")
+
+    def _create_array(self, name, shape, dtype):
+        if not self._use_shared_memory:
+            return super()._create_array(name, shape, dtype)
+        dtype = np.dtype(dtype)
+        shape = tuple(shape)
+        # New shared memory is zero-filled, one page at a time when touched.
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1),
+        )
+        self._shared_memory_info[name] = (shm, dtype, shape)
+        return to_np(*self._shared_memory_info[name])
 
     def _register_mp_array(self, arr_instance_var_name):
         """
-        Use this function to register an array to be shared. This will wipe arr.
+        Use this function to register an array to be shared. This will wipe arr,
+        unless it was already allocated in shared memory.
         """
         assert hasattr(self, arr_instance_var_name), arr_instance_var_name
+        if arr_instance_var_name in self._shared_memory_info:
+            self._mp_array_info[arr_instance_var_name] = (
+                self._shared_memory_info[arr_instance_var_name]
+            )
+            return
         arr = getattr(self, arr_instance_var_name)
 
-        ctype = ctypes.c_double
-        if arr.dtype == np.uint8:
-            ctype = ctypes.c_uint8
-
         self._mp_array_info[arr_instance_var_name] = (
-            mp.Array(ctype, arr.size), arr.dtype, arr.shape,
+            mp.Array(get_ctype(arr), arr.size), arr.dtype, arr.shape,
         )
         setattr(
             self,
@@ -93,6 +172,11 @@ class SharedObsDictRelabelingBuffer(ObsDictRelabelingBuffer):
         self._shared_next_obs_info = shared_next_obs_info
         self._mp_array_info = mp_array_info
         for obs_key in self._shared_obs_info.keys():
+            if self._deduplicate_obs:
+                self._set_obs_storage(
+                    obs_key, to_np(*self._shared_obs_info[obs_key])
+                )
+                continue
             self._obs[obs_key] = to_np(*self._shared_obs_info[obs_key])
             self._next_obs[obs_key] = to_np(
                 *self._shared_next_obs_info[obs_key])
@@ -113,14 +197,87 @@ class SharedObsDictRelabelingBuffer(ObsDictRelabelingBuffer):
             self._shared_size,
         )
 
+    def close(self):
+        """
+        Free the shared memory if use_shared_memory is True. The buffer can't
+        be used afterwards.
+        """
+        for shm, _, _ in self._shared_memory_info.values():
+            shm.close()
+            shm.unlink()
+        self._shared_memory_info = {}
+
+    @property
+    def _top(self):
+        if self._use_shared_memory:
+            return int(self._pointers[0])
+        return self._local_top
+
+    @_top.setter
+    def _top(self, top):
+        if self._use_shared_memory:
+            self._pointers[0] = top
+        else:
+            self._local_top = top
+
     @property
     def _size(self):
+        if self._use_shared_memory:
+            return int(self._pointers[1])
         return self._shared_size.value
 
     @_size.setter
     def _size(self, size):
-        self._shared_size.value = size
+        if self._use_shared_memory:
+            self._pointers[1] = size
+        else:
+            self._shared_size.value = size
+
+    def _reserve_rows(self, num_rows):
+        if not self._use_shared_memory:
+            return super()._reserve_rows(num_rows)
+        top, self._row_version = reserve_rows(
+            self._lock, self._pointers, self._row_versions, num_rows
+        )
+        return top
+
+    def _commit_rows(self, top, num_rows):
+        if not self._use_shared_memory:
+            return super()._commit_rows(top, num_rows)
+        # The pointers were already moved in _reserve_rows.
+        commit_rows(
+            self._lock, self._row_versions, top, num_rows, self._row_version
+        )
+
+    def _sample_indices(self, batch_size):
+        if not self._use_shared_memory:
+            return super()._sample_indices(batch_size)
+        return sample_written_indices(
+            self._row_versions, super()._sample_indices, batch_size
+        )
+
+    def random_batch(self, batch_size):
+        if not self._use_shared_memory:
+            return super().random_batch(batch_size)
+        indices = self._sample_indices(batch_size)
+        return get_consistent_batch(
+            self._row_versions,
+            indices,
+            self._get_batch,
+            self.random_batch,
+            valid=self._valid if self._deduplicate_obs else None,
+        )
+
+
+def get_ctype(arr):
+    if arr.dtype == np.float16:
+        # ctypes has no half precision type. Only the item size matters since
+        # the buffer is viewed with the numpy dtype.
+        return ctypes.c_uint16
+    return np.ctypeslib.as_ctypes_type(arr.dtype)
 
 
 def to_np(shared_arr, np_dtype, shape):
+    if isinstance(shared_arr, shared_memory.SharedMemory):
+        return np.ndarray(shape, dtype=np_dtype, buffer=shared_arr.buf)
     return np.frombuffer(shared_arr.get_obj(), dtype=np_dtype).reshape(shape)
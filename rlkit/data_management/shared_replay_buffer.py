@@ -0,0 +1,239 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.replay_buffer import get_buffer_and_path_slices
+from rlkit.data_management.simple_replay_buffer import SimpleReplayBuffer
+
+
+class SharedReplayBufferMixin(object):
+    """
+    Backs every array of a replay buffer, including the pointers, with
+    multiprocessing.shared_memory, so that several processes can add paths
+    while another one samples from it.
+
+    Pass the buffer to the other processes as an argument when starting
+    them, e.g. `mp.Process(target=collect, args=(replay_buffer,))`. The
+    shared memory is attached again by name when the buffer is unpickled.
+
+    Writers reserve their rows while holding a lock, which only takes as long
+    as bumping the pointers, and then write them concurrently. Every row has
+    a version that is odd while the row is being written. Sampling skips
+    those rows and resamples rows whose version changed while the batch was
+    gathered, so batches never contain partially written transitions. See
+    `reserve_rows`.
+
+    Mix this in front of a replay buffer class and call
+    `_init_shared_memory` before the buffer's __init__ and
+    `_init_row_versions` after it. deduplicate_obs and n_step are not
+    supported.
+
+    The process that created the buffer should call `close` when done.
+    """
+
+    def _init_shared_memory(self):
+        self._owns_shared_memory = True
+        # name -> (SharedMemory, shape, dtype)
+        self._shared_arrays = {}
+        self._lock = mp.Lock()
+        # self._pointers = [top, size, number of reservations]
+        self._pointers = self._create_array('_pointers', (3,), np.int64)
+
+    def _init_row_versions(self):
+        assert not self._deduplicate_obs, (
+            "deduplicate_obs is not supported by shared replay buffers."
+        )
+        # Episode ids are counted per process.
+        assert self._n_step == 1, (
+            "n_step is not supported by shared replay buffers."
+        )
+        # Not allocated with _allocate_array, since the versions aren't data
+        # to save or count as buffer memory.
+        self._row_versions = self._create_array(
+            '_row_versions', (self._max_replay_buffer_size,), np.int64
+        )
+
+    def _create_array(self, name, shape, dtype):
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        # New shared memory is zero-filled.
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1),
+        )
+        self._shared_arrays[name] = (shm, shape, dtype)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @property
+    def _top(self):
+        return int(self._pointers[0])
+
+    @_top.setter
+    def _top(self, top):
+        self._pointers[0] = top
+
+    @property
+    def _size(self):
+        return int(self._pointers[1])
+
+    @_size.setter
+    def _size(self, size):
+        self._pointers[1] = size
+
+    def _reserve_rows(self, num_rows):
+        top, self._row_version = reserve_rows(
+            self._lock, self._pointers, self._row_versions, num_rows
+        )
+        return top
+
+    def _commit_rows(self, top, num_rows):
+        # The pointers were already moved in _reserve_rows.
+        commit_rows(
+            self._lock, self._row_versions, top, num_rows, self._row_version
+        )
+
+    def _sample_indices(self, batch_size):
+        return sample_written_indices(
+            self._row_versions,
+            lambda n: np.random.randint(0, self._size, n),
+            batch_size,
+        )
+
+    def random_batch(self, batch_size):
+        indices = self._sample_indices(batch_size)
+        return get_consistent_batch(
+            self._row_versions, indices, self._get_batch, self.random_batch
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The arrays are recreated from the shared memory in __setstate__.
+        for name in self._shared_arrays:
+            state.pop(name.partition('/')[0], None)
+        if '_env_info_keys' in state:
+            state['_env_info_keys'] = list(state['_env_info_keys'])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._owns_shared_memory = False
+        for name, (shm, shape, dtype) in self._shared_arrays.items():
+            arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            attr_name, _, key = name.partition('/')
+            if key:
+                self.__dict__.setdefault(attr_name, {})[key] = arr
+            else:
+                self.__dict__[attr_name] = arr
+
+    def close(self):
+        """
+        Release the shared memory. It is freed once the process that
+        created the buffer closes it.
+        """
+        for name in self._shared_arrays:
+            self.__dict__.pop(name.partition('/')[0], None)
+        for shm, _, _ in self._shared_arrays.values():
+            shm.close()
+            if self._owns_shared_memory:
+                shm.unlink()
+        self._shared_arrays = {}
+
+
+class SharedSimpleReplayBuffer(SharedReplayBufferMixin, SimpleReplayBuffer):
+    def __init__(self, *args, **kwargs):
+        self._init_shared_memory()
+        super().__init__(*args, **kwargs)
+        self._init_row_versions()
+
+
+class SharedEnvReplayBuffer(SharedReplayBufferMixin, EnvReplayBuffer):
+    def __init__(self, *args, **kwargs):
+        self._init_shared_memory()
+        super().__init__(*args, **kwargs)
+        self._init_row_versions()
+
+
+def reserve_rows(lock, pointers, row_versions, num_rows):
+    """
+    Reserve the next `num_rows` rows of a ring buffer shared by several
+    writers and mark them as being written.
+
+    Every reservation gets its own odd version, which its rows keep until
+    `commit_rows` makes it even. Versions are set rather than incremented,
+    so a row that a later reservation took over while it was still being
+    written stays odd until that later write is committed.
+
+    :param pointers: Shared array of [top, size, number of reservations].
+    :param row_versions: Shared array with the version of every row.
+    :return: Tuple of the first reserved row and the version of the
+    reservation, to pass to `commit_rows`.
+    """
+    max_size = len(row_versions)
+    with lock:
+        top = int(pointers[0])
+        version = 2 * int(pointers[2]) + 1
+        pointers[2] += 1
+        for buffer_slice, _ in get_buffer_and_path_slices(
+                top, num_rows, max_size
+        ):
+            row_versions[buffer_slice] = version
+        pointers[0] = (top + num_rows) % max_size
+        pointers[1] = min(int(pointers[1]) + num_rows, max_size)
+    return top, version
+
+
+def commit_rows(lock, row_versions, top, num_rows, version):
+    """
+    Mark the rows reserved by `reserve_rows` as written, except the ones that
+    a later reservation has taken over since.
+    """
+    with lock:
+        for buffer_slice, _ in get_buffer_and_path_slices(
+                top, num_rows, len(row_versions)
+        ):
+            versions = row_versions[buffer_slice]
+            versions[versions == version] = version + 1
+
+
+def sample_written_indices(row_versions, sample_indices, batch_size):
+    """
+    :param sample_indices: Function that samples a given number of indices.
+    :return: `batch_size` indices from `sample_indices`, redrawing those of
+    rows that are being written.
+    """
+    indices = sample_indices(batch_size)
+    invalid = np.flatnonzero(row_versions[indices] % 2)
+    while len(invalid) > 0:
+        indices[invalid] = sample_indices(len(invalid))
+        invalid = invalid[row_versions[indices[invalid]] % 2 == 1]
+    return indices
+
+
+def get_consistent_batch(
+        row_versions, indices, get_batch, random_batch, valid=None,
+):
+    """
+    :param get_batch: Function that gathers the batch of some indices.
+    :param random_batch: Function that samples a batch of a given size, to
+    replace the transitions that a writer started on while they were
+    gathered.
+    :param valid: Optional array that is 0 for the rows that aren't
+    transitions. A row may have stopped being one by the time it is gathered.
+    :return: The batch of `indices`, without partially written transitions.
+    """
+    versions = row_versions[indices]
+    batch = get_batch(indices)
+    torn = versions % 2 == 1
+    if valid is not None:
+        # Read before the versions are checked again, so that it belongs to
+        # the same write as the batch.
+        torn |= valid[indices] == 0
+    torn = np.flatnonzero(torn | (row_versions[indices] != versions))
+    if len(torn) > 0:
+        resampled_batch = random_batch(len(torn))
+        for key, value in batch.items():
+            # 'image_fields' describes the whole batch.
+            if key != 'image_fields':
+                value[torn] = resampled_batch[key]
+    return batch
@@ -2,7 +2,18 @@ from collections import OrderedDict
 
 import numpy as np
 
-from rlkit.data_management.replay_buffer import ReplayBuffer
+from rlkit.data_management.replay_buffer import (
+    ReplayBuffer,
+    get_buffer_and_path_slices,
+    sample_valid_indices,
+)
+from rlkit.data_management.storage import (
+    AffineQuantizer,
+    decode,
+    encode,
+    get_storage_dtype,
+    is_quantized,
+)
 
 
 class SimpleReplayBuffer(ReplayBuffer):
@@ -13,65 +24,295 @@ class SimpleReplayBuffer(ReplayBuffer):
         observation_dim,
         action_dim,
         env_info_sizes,
+        deduplicate_obs=False,
+        dtypes=None,
+        observation_bounds=None,
+        n_step=1,
+        discount=None,
     ):
+        """
+        :param deduplicate_obs: If True, save every observation only once.
+        The next observation of transition i is stored in row i + 1 and every
+        episode uses one extra row for its last next observation. That row is
+        not a valid transition and is never sampled.
+        :param dtypes: Dict mapping 'observations', 'actions', 'rewards' or an
+        env info key to the dtype it is stored as. Defaults to float32.
+        Observations may be stored as uint8, in which case they are affinely
+        quantized using `observation_bounds`.
+        :param observation_bounds: (low, high) tuple of the observations.
+        Only needed if the observations are quantized.
+        :param n_step: If larger than 1, sampled transitions span up to
+        n_step steps: the rewards are the discounted sum of the rewards over
+        those steps, the next observations are the ones after the last step,
+        and the batch has the `discounts` to bootstrap with. Transitions are
+        cut short at terminals, at the end of an episode and at the write
+        head of the buffer.
+        :param discount: Discount used to sum up n-step rewards. Required if
+        n_step is larger than 1. The trainer bootstraps with the `discounts`
+        of the batch instead of its own discount, so this should be the same
+        as the trainer's.
+        """
         self._observation_dim = observation_dim
         self._action_dim = action_dim
         self._max_replay_buffer_size = max_replay_buffer_size
-        self._observations = np.zeros((max_replay_buffer_size, observation_dim))
-        # It's a bit memory inefficient to save the observations twice,
-        # but it makes the code *much* easier since you no longer have to
-        # worry about termination conditions.
-        self._next_obs = np.zeros((max_replay_buffer_size, observation_dim))
-        self._actions = np.zeros((max_replay_buffer_size, action_dim))
+        self._deduplicate_obs = deduplicate_obs
+        obs_dtype = get_storage_dtype(dtypes, 'observations')
+        self._obs_quantizer = None
+        if is_quantized(obs_dtype):
+            assert observation_bounds is not None, (
+                "observation_bounds are needed to quantize observations."
+            )
+            self._obs_quantizer = AffineQuantizer(*observation_bounds)
+        if deduplicate_obs:
+            # The last row mirrors row 0 so that the next observations can be
+            # a view into the same memory, even across the wrap-around.
+            self._obs_storage = self._allocate_array(
+                '_obs_storage',
+                (max_replay_buffer_size + 1, observation_dim),
+                obs_dtype,
+            )
+            self._observations = self._obs_storage[:-1]
+            self._next_obs = self._obs_storage[1:]
+            # self._valid[i] = row i is a transition and not the last next
+            # observation of an episode
+            self._valid = self._allocate_array(
+                '_valid', (max_replay_buffer_size,), np.uint8
+            )
+        else:
+            self._observations = self._allocate_array(
+                '_observations',
+                (max_replay_buffer_size, observation_dim),
+                obs_dtype,
+            )
+            # It's a bit memory inefficient to save the observations twice,
+            # but it makes the code *much* easier since you no longer have to
+            # worry about termination conditions.
+            self._next_obs = self._allocate_array(
+                '_next_obs',
+                (max_replay_buffer_size, observation_dim),
+                obs_dtype,
+            )
+        self._actions = self._allocate_array(
+            '_actions',
+            (max_replay_buffer_size, action_dim),
+            get_storage_dtype(dtypes, 'actions'),
+        )
         # Make everything a 2D np array to make it easier for other code to
         # reason about the shape of the data
-        self._rewards = np.zeros((max_replay_buffer_size, 1))
+        self._rewards = self._allocate_array(
+            '_rewards',
+            (max_replay_buffer_size, 1),
+            get_storage_dtype(dtypes, 'rewards'),
+        )
         # self._terminals[i] = a terminal was received at time i
-        self._terminals = np.zeros((max_replay_buffer_size, 1), dtype='uint8')
+        self._terminals = self._allocate_array(
+            '_terminals', (max_replay_buffer_size, 1), np.uint8
+        )
         # Define self._env_infos[key][i] to be the return value of env_info[key]
         # at time i
         self._env_infos = {}
         for key, size in env_info_sizes.items():
-            self._env_infos[key] = np.zeros((max_replay_buffer_size, size))
+            self._env_infos[key] = self._allocate_array(
+                '_env_infos/' + key,
+                (max_replay_buffer_size, size),
+                get_storage_dtype(dtypes, key),
+            )
         self._env_info_keys = env_info_sizes.keys()
 
+        assert n_step >= 1
+        assert n_step == 1 or discount is not None, (
+            "The discount is needed to sum up n-step rewards."
+        )
+        self._n_step = n_step
+        self._discount = discount
+        # Counts the episodes that were added, starting at 1.
+        self._episode_id = 1
+        if n_step > 1:
+            # self._episode_ids[i] = which episode row i belongs to, or 0 if
+            # it was never written
+            self._episode_ids = self._allocate_array(
+                '_episode_ids', (max_replay_buffer_size,), np.int64
+            )
+
         self._top = 0
         self._size = 0
 
     def add_sample(self, observation, action, reward, next_observation,
                    terminal, env_info, **kwargs):
-        self._observations[self._top] = observation
-        self._actions[self._top] = action
-        self._rewards[self._top] = reward
-        self._terminals[self._top] = terminal
-        self._next_obs[self._top] = next_observation
+        top = self._reserve_rows(1)
+        self._observations[top] = encode(observation, self._obs_quantizer)
+        self._actions[top] = action
+        self._rewards[top] = reward
+        self._terminals[top] = terminal
+        self._next_obs[top] = encode(next_observation, self._obs_quantizer)
+        if self._deduplicate_obs:
+            # The next observation overwrote the following row, which stays
+            # invalid until the next sample or terminate_episode.
+            self._valid[top] = 1
+            self._valid[(top + 1) % self._max_replay_buffer_size] = 0
+            if top == self._max_replay_buffer_size - 1:
+                self._obs_storage[0] = self._obs_storage[-1]
+            else:
+                self._obs_storage[-1] = self._obs_storage[0]
 
         for key in self._env_info_keys:
-            self._env_infos[key][self._top] = env_info[key]
-        self._advance()
+            self._env_infos[key][top] = env_info[key]
+        if self._n_step > 1:
+            self._episode_ids[top] = self._episode_id
+        self._commit_rows(top, 1)
+
+    def add_path(self, path):
+        """
+        Copy an entire path into the buffer with one slice assignment per
+        field instead of calling `add_sample` for every step.
+        """
+        path_len = len(path["rewards"])
+        if path_len == 0:
+            return
+        num_new_rows = path_len + 1 if self._deduplicate_obs else path_len
+        top = self._reserve_rows(num_new_rows)
+        fields = [
+            (
+                self._observations,
+                encode(path["observations"], self._obs_quantizer),
+            ),
+            (self._actions, path["actions"]),
+            (self._rewards, path["rewards"]),
+            (self._terminals, path["terminals"]),
+        ]
+        if not self._deduplicate_obs:
+            fields.append((
+                self._next_obs,
+                encode(path["next_observations"], self._obs_quantizer),
+            ))
+        env_infos = path.get("env_infos", None)
+        for key in self._env_info_keys:
+            fields.append((
+                self._env_infos[key],
+                get_env_info_column(env_infos, key),
+            ))
+        fields = [
+            (buffer_arr, np.asarray(path_arr).reshape(path_len, -1))
+            for buffer_arr, path_arr in fields
+        ]
+        for buffer_slice, path_slice in get_buffer_and_path_slices(
+                top, path_len, self._max_replay_buffer_size
+        ):
+            for buffer_arr, path_arr in fields:
+                buffer_arr[buffer_slice] = path_arr[path_slice]
+            if self._deduplicate_obs:
+                self._valid[buffer_slice] = 1
+            if self._n_step > 1:
+                self._episode_ids[buffer_slice] = self._episode_id
+
+        if self._deduplicate_obs:
+            last_idx = (top + path_len) % self._max_replay_buffer_size
+            self._observations[last_idx] = encode(
+                np.asarray(path["next_observations"]).reshape(path_len, -1)[-1],
+                self._obs_quantizer,
+            )
+            self._valid[last_idx] = 0
+            self._obs_storage[-1] = self._obs_storage[0]
+        self._episode_id += 1
+        self._commit_rows(top, num_new_rows)
+
+    def _reserve_rows(self, num_rows):
+        """
+        :return: Index of the first of the `num_rows` consecutive rows (modulo
+        the buffer size) that a new sample or path is written to.
+        """
+        return self._top
+
+    def _commit_rows(self, top, num_rows):
+        """
+        Called once the rows returned by `_reserve_rows` have been written.
+        """
+        self._top = (top + num_rows) % self._max_replay_buffer_size
+        self._size = min(self._size + num_rows, self._max_replay_buffer_size)
 
     def terminate_episode(self):
-        pass
+        self._episode_id += 1
+        if self._deduplicate_obs:
+            # Keep the last next observation of the episode in its own row.
+            self._valid[self._top] = 0
+            self._advance()
 
     def _advance(self):
         self._top = (self._top + 1) % self._max_replay_buffer_size
         if self._size < self._max_replay_buffer_size:
             self._size += 1
 
+    def _sample_indices(self, batch_size):
+        if self._deduplicate_obs:
+            return sample_valid_indices(self._valid, self._size, batch_size)
+        return np.random.randint(0, self._size, batch_size)
+
     def random_batch(self, batch_size):
-        indices = np.random.randint(0, self._size, batch_size)
+        indices = self._sample_indices(batch_size)
+        return self._get_batch(indices)
+
+    def _get_batch(self, indices):
         batch = dict(
-            observations=self._observations[indices],
-            actions=self._actions[indices],
-            rewards=self._rewards[indices],
+            observations=decode(
+                self._observations[indices], self._obs_quantizer
+            ),
+            actions=decode(self._actions[indices]),
+            rewards=decode(self._rewards[indices]),
             terminals=self._terminals[indices],
-            next_observations=self._next_obs[indices],
+            next_observations=decode(
+                self._next_obs[indices], self._obs_quantizer
+            ),
         )
+        if self._n_step > 1:
+            rewards, last_indices, discounts = self._get_n_step_returns(
+                indices
+            )
+            batch['rewards'] = rewards
+            batch['terminals'] = self._terminals[last_indices]
+            batch['next_observations'] = decode(
+                self._next_obs[last_indices], self._obs_quantizer
+            )
+            batch['discounts'] = discounts
         for key in self._env_info_keys:
             assert key not in batch.keys()
-            batch[key] = self._env_infos[key][indices]
+            batch[key] = decode(self._env_infos[key][indices])
         return batch
 
+    def _get_n_step_returns(self, indices):
+        """
+        :return: Tuple of
+         - the discounted sum of the rewards of up to n_step steps starting
+           at each index,
+         - the index of the last of those steps, and
+         - discount ** (number of steps), to bootstrap with.
+        """
+        max_size = self._max_replay_buffer_size
+        offsets = np.arange(self._n_step)
+        rows = (indices[:, None] + offsets) % max_size
+        # Rows at or past the write head hold older data. If the buffer is
+        # full, the oldest row is at the write head, so all rows can be used.
+        steps_to_head = (self._top - indices - 1) % max_size + 1
+        in_episode = (
+            (offsets < steps_to_head[:, None])
+            & (self._episode_ids[rows] == self._episode_ids[indices][:, None])
+        )
+        if self._deduplicate_obs:
+            in_episode &= self._valid[rows].astype(bool)
+        # Stop after the first terminal.
+        in_episode[:, 1:] &= self._terminals[rows[:, :-1], 0] == 0
+        in_episode = np.cumprod(in_episode, axis=1).astype(bool)
+
+        num_steps = in_episode.sum(axis=1)
+        last_indices = rows[np.arange(len(indices)), num_steps - 1]
+        step_discounts = in_episode * self._discount ** offsets
+        rewards = np.sum(
+            decode(self._rewards[rows])[..., 0] * step_discounts, axis=1,
+        ).reshape(-1, 1).astype(np.float32)
+        discounts = (
+            self._discount ** num_steps
+        ).reshape(-1, 1).astype(np.float32)
+        return rewards, last_indices, discounts
+
     def rebuild_env_info_dict(self, idx):
         return {
             key: self._env_infos[key][idx]
@@ -87,7 +328,34 @@ class SimpleReplayBuffer(ReplayBuffer):
     def num_steps_can_sample(self):
         return self._size
 
+    def load(self, directory):
+        super().load(directory)
+        if self._deduplicate_obs:
+            # The last row mirrors the first one and isn't saved.
+            self._obs_storage[-1] = self._obs_storage[0]
+
+    def _get_snapshot_metadata(self):
+        metadata = super()._get_snapshot_metadata()
+        metadata['episode_id'] = self._episode_id
+        return metadata
+
+    def _set_snapshot_metadata(self, metadata):
+        super()._set_snapshot_metadata(metadata)
+        self._episode_id = metadata['episode_id']
+
     def get_diagnostics(self):
-        return OrderedDict([
+        stats = OrderedDict([
             ('size', self._size)
         ])
+        stats.update(super().get_diagnostics())
+        return stats
+
+
+def get_env_info_column(env_infos, key):
+    """
+    Stack env_info[key] over time. `env_infos` is either a list of dicts, as
+    returned by rlkit.samplers.rollout_functions.rollout, or a dict of arrays.
+    """
+    if isinstance(env_infos, dict):
+        return env_infos[key]
+    return [env_info[key] for env_info in env_infos]
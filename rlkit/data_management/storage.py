@@ -0,0 +1,84 @@
+"""
+Helpers for choosing the dtype that replay buffer fields are stored as.
+
+Fields are stored as float32 by default, since everything is cast to float32
+when converted to torch anyway. float16 halves memory again, and bounded
+fields can be affinely quantized to uint8. Both are decoded back to float32
+when a batch is sampled.
+"""
+import numpy as np
+
+DEFAULT_DTYPE = np.float32
+QUANTIZED_DTYPE = np.uint8
+
+
+def get_storage_dtype(dtypes, field, default=DEFAULT_DTYPE):
+    """
+    :param dtypes: Dict mapping a field name to a dtype, or None.
+    :param field: Name of the field.
+    :param default: dtype used if the field is not in `dtypes`.
+    :return: np.dtype
+    """
+    if dtypes is None or field not in dtypes:
+        return np.dtype(default)
+    return np.dtype(dtypes[field])
+
+
+def get_action_index_dtypes(dtypes, num_actions):
+    """
+    :return: `dtypes` with the dtype of 'actions' set to the smallest unsigned
+    integer type that can store an index into `num_actions` actions, unless
+    it was already set.
+    """
+    dtypes = dict(dtypes or {})
+    dtypes.setdefault('actions', np.min_scalar_type(max(num_actions - 1, 0)))
+    return dtypes
+
+
+def is_quantized(dtype):
+    return np.dtype(dtype) == QUANTIZED_DTYPE
+
+
+class AffineQuantizer(object):
+    """
+    Maps values in [low, high] to uint8 and back.
+    """
+
+    def __init__(self, low, high):
+        low = np.asarray(low, dtype=np.float32).flatten()
+        high = np.asarray(high, dtype=np.float32).flatten()
+        assert np.all(np.isfinite(low)) and np.all(np.isfinite(high)), (
+            "Quantization requires finite bounds."
+        )
+        self.low = low
+        self.scale = np.where(
+            high > low, (high - low) / 255., 1.
+        ).astype(np.float32)
+
+    def quantize(self, x):
+        x = (np.asarray(x) - self.low) / self.scale
+        return np.clip(np.rint(x), 0, 255).astype(QUANTIZED_DTYPE)
+
+    def dequantize(self, x):
+        return x.astype(np.float32) * self.scale + self.low
+
+
+def encode(x, quantizer=None):
+    """
+    Convert `x` to what is written into a buffer.
+    """
+    if quantizer is None:
+        return x
+    return quantizer.quantize(x)
+
+
+def decode(x, quantizer=None):
+    """
+    Convert stored values back into float32 (or the stored dtype if it is
+    already float32 or wider).
+    """
+    if quantizer is not None:
+        return quantizer.dequantize(x)
+    if x.dtype == np.float16:
+        return x.astype(np.float32)
+    return x
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+class WeightedSampler(object):
+    """
+    Samples indices with probability proportional to a fixed set of weights.
+
+    `np.random.choice(n, size, p=p)` validates `p` and rebuilds its
+    cumulative sum on every call, which is O(n). This builds the cumulative
+    sum once, so every call to `sample` is O(size * log n). Rebuild the
+    sampler whenever the weights change.
+
+    For the same random state, `sample` returns the same indices as
+    `np.random.choice(len(weights), size, p=weights / weights.sum())`.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        assert len(weights) > 0, "Cannot sample from empty weights."
+        assert np.all(weights >= 0), "Weights must be non-negative."
+        cdf = np.cumsum(weights)
+        assert cdf[-1] > 0, "Weights sum to {}".format(cdf[-1])
+        # The last entry is exactly 1, so no sample falls past the end.
+        self._cdf = cdf / cdf[-1]
+
+    def __len__(self):
+        return len(self._cdf)
+
+    def sample(self, size):
+        """
+        :return: int64 array with `size` indices.
+        """
+        # side='right' never returns an index with zero weight.
+        return self._cdf.searchsorted(
+            np.random.random_sample(size), side='right'
+        )
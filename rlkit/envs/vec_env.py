@@ -0,0 +1,312 @@
+import multiprocessing as mp
+import traceback
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from gym.spaces import Dict
+
+
+class VecEnv(object):
+    """
+    Steps several environments in lockstep in the current process.
+
+    `reset` and `step` take the indices of the environments to reset or step,
+    so that environments whose episodes end at different times can be reset
+    on their own.
+    """
+
+    def __init__(self, envs):
+        assert len(envs) > 0
+        self.envs = list(envs)
+        self.num_envs = len(self.envs)
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+
+    def reset(self, env_idxs=None):
+        """
+        :return: List with the first observation of every environment in
+        `env_idxs`, which defaults to all of them.
+        """
+        if env_idxs is None:
+            env_idxs = range(self.num_envs)
+        return [self.envs[i].reset() for i in env_idxs]
+
+    def step(self, actions, env_idxs=None):
+        """
+        :param actions: One action for every environment in `env_idxs`.
+        :return: Tuple of the list of next observations, the rewards, the
+        terminals and the list of env infos.
+        """
+        if env_idxs is None:
+            env_idxs = range(self.num_envs)
+        next_obs, rewards, terminals, env_infos = [], [], [], []
+        for i, action in zip(env_idxs, actions):
+            next_ob, reward, terminal, env_info = self.envs[i].step(action)
+            next_obs.append(next_ob)
+            rewards.append(reward)
+            terminals.append(terminal)
+            env_infos.append(env_info)
+        return next_obs, np.array(rewards), np.array(terminals), env_infos
+
+    def set_attr(self, name, value):
+        """
+        Set an attribute, e.g. the goal sampling mode, on every environment.
+        """
+        for env in self.envs:
+            setattr(env, name, value)
+
+    def env_method(self, name, *args, **kwargs):
+        """
+        :return: List with the result of calling method `name` of every
+        environment.
+        """
+        return [getattr(env, name)(*args, **kwargs) for env in self.envs]
+
+    def close(self):
+        for env in self.envs:
+            if hasattr(env, 'close'):
+                env.close()
+
+
+class SubprocVecEnv(object):
+    """
+    Same interface as VecEnv, but every environment runs in its own worker
+    process, so that the environments step in parallel.
+
+    The actions, observations, rewards and terminals are exchanged through
+    preallocated multiprocessing.shared_memory arrays with one row per
+    environment. The pipes to the workers only carry the commands and the
+    env infos. Dict observation spaces are stored as one array per key.
+
+    Actions and observations are stored with the dtype of their space, so
+    they are cast to it, e.g. float64 actions of a float32 Box are passed to
+    the environments as float32.
+
+    Call `close` when done to stop the workers and free the shared memory.
+    """
+
+    def __init__(self, env_fns, context=None):
+        """
+        :param env_fns: List of functions that create the environments. They
+        are called in the workers, so they must be picklable, e.g.
+        functools.partial of a module-level function, unless the 'fork'
+        start method is used. Pickling the SubprocVecEnv, e.g. in a snapshot,
+        pickles them as well.
+        :param context: multiprocessing start method, e.g. 'spawn' when the
+        environments use CUDA. Defaults to the platform default.
+        """
+        assert len(env_fns) > 0
+        self._env_fns = list(env_fns)
+        self._context = context
+        self.num_envs = len(env_fns)
+        ctx = mp.get_context(context)
+        # Start the resource tracker before forking, so that the workers
+        # share it instead of starting their own, which would unlink the
+        # shared memory when they exit.
+        resource_tracker.ensure_running()
+        self._remotes = []
+        self._processes = []
+        for env_idx, env_fn in enumerate(env_fns):
+            remote, worker_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(worker_remote, remote, env_fn, env_idx),
+                daemon=True,
+            )
+            process.start()
+            worker_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+        self._closed = False
+
+        self.observation_space, self.action_space = self._call(
+            0, 'get_spaces'
+        )
+        self._is_dict_obs = isinstance(self.observation_space, Dict)
+        # name -> (SharedMemory, shape, dtype)
+        self._shared_arrays = {}
+        self._actions = self._create_array(
+            'actions',
+            self.action_space.shape,
+            self.action_space.dtype,
+        )
+        self._rewards = self._create_array('rewards', (), np.float64)
+        self._terminals = self._create_array('terminals', (), np.bool_)
+        if self._is_dict_obs:
+            self._obs = {
+                key: self._create_array(
+                    'obs/' + key, space.shape, space.dtype,
+                )
+                for key, space in self.observation_space.spaces.items()
+            }
+        else:
+            self._obs = self._create_array(
+                'obs',
+                self.observation_space.shape,
+                self.observation_space.dtype,
+            )
+        specs = {
+            name: (shm.name, shape, dtype)
+            for name, (shm, shape, dtype) in self._shared_arrays.items()
+        }
+        self._call_all(range(self.num_envs), 'attach', specs)
+
+    def _create_array(self, name, shape, dtype):
+        shape = (self.num_envs,) + tuple(shape)
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1),
+        )
+        self._shared_arrays[name] = (shm, shape, dtype)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def _call(self, env_idx, command, data=None):
+        return self._call_all([env_idx], command, data)[0]
+
+    def _call_all(self, env_idxs, command, data=None):
+        env_idxs = list(env_idxs)
+        for i in env_idxs:
+            self._remotes[i].send((command, data))
+        results = []
+        for i in env_idxs:
+            success, result = self._remotes[i].recv()
+            if not success:
+                raise RuntimeError(
+                    "Environment {} failed:\n{}".format(i, result)
+                )
+            results.append(result)
+        return results
+
+    def _get_obs(self, env_idxs):
+        if self._is_dict_obs:
+            return [
+                {key: arr[i].copy() for key, arr in self._obs.items()}
+                for i in env_idxs
+            ]
+        return [self._obs[i].copy() for i in env_idxs]
+
+    def reset(self, env_idxs=None):
+        if env_idxs is None:
+            env_idxs = range(self.num_envs)
+        env_idxs = list(env_idxs)
+        self._call_all(env_idxs, 'reset')
+        return self._get_obs(env_idxs)
+
+    def step(self, actions, env_idxs=None):
+        if env_idxs is None:
+            env_idxs = range(self.num_envs)
+        env_idxs = list(env_idxs)
+        self._actions[env_idxs] = np.asarray(actions).reshape(
+            (len(env_idxs),) + self._actions.shape[1:]
+        )
+        env_infos = self._call_all(env_idxs, 'step')
+        return (
+            self._get_obs(env_idxs),
+            self._rewards[env_idxs],
+            self._terminals[env_idxs],
+            env_infos,
+        )
+
+    def set_attr(self, name, value):
+        self._call_all(range(self.num_envs), 'set_attr', (name, value))
+
+    def env_method(self, name, *args, **kwargs):
+        return self._call_all(
+            range(self.num_envs), 'env_method', (name, args, kwargs)
+        )
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for remote in self._remotes:
+            try:
+                remote.send(('close', None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self._processes:
+            process.join()
+        for remote in self._remotes:
+            remote.close()
+        self._actions = self._rewards = self._terminals = self._obs = None
+        for shm, _, _ in self._shared_arrays.values():
+            shm.close()
+            shm.unlink()
+        self._shared_arrays = {}
+
+    def __getstate__(self):
+        # The workers are started again when unpickled, e.g. when loading a
+        # snapshot.
+        return dict(env_fns=self._env_fns, context=self._context)
+
+    def __setstate__(self, state):
+        self.__init__(state['env_fns'], context=state['context'])
+
+
+def _worker(remote, parent_remote, env_fn, env_idx):
+    parent_remote.close()
+    env = env_fn()
+    shms = []
+    arrays = {}
+    try:
+        while True:
+            command, data = remote.recv()
+            try:
+                if command == 'step':
+                    ob, reward, terminal, env_info = env.step(
+                        arrays['actions'][env_idx]
+                    )
+                    _write_obs(arrays, env_idx, ob)
+                    arrays['rewards'][env_idx] = reward
+                    arrays['terminals'][env_idx] = terminal
+                    result = env_info
+                elif command == 'reset':
+                    _write_obs(arrays, env_idx, env.reset())
+                    result = None
+                elif command == 'get_spaces':
+                    result = (env.observation_space, env.action_space)
+                elif command == 'attach':
+                    for name, (shm_name, shape, dtype) in data.items():
+                        shm = shared_memory.SharedMemory(name=shm_name)
+                        shms.append(shm)
+                        arrays[name] = np.ndarray(
+                            shape, dtype=dtype, buffer=shm.buf
+                        )
+                    result = None
+                elif command == 'set_attr':
+                    setattr(env, *data)
+                    result = None
+                elif command == 'env_method':
+                    name, args, kwargs = data
+                    result = getattr(env, name)(*args, **kwargs)
+                elif command == 'close':
+                    break
+                else:
+                    raise ValueError("Unknown command: {}".format(command))
+            except Exception:
+                remote.send((False, traceback.format_exc()))
+            else:
+                remote.send((True, result))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        arrays.clear()
+        for shm in shms:
+            shm.close()
+        if hasattr(env, 'close'):
+            env.close()
+        remote.close()
+
+
+def _write_obs(arrays, env_idx, ob):
+    if isinstance(ob, dict):
+        for key, value in ob.items():
+            name = 'obs/' + key
+            if name not in arrays:
+                raise KeyError(
+                    "Observation key '{}' is not in the observation "
+                    "space.".format(key)
+                )
+            arrays[name][env_idx] = value
+    else:
+        arrays['obs'][env_idx] = ob
@@ -1,13 +1,26 @@
 import abc
 
+import numpy as np
+
 from rlkit.policies.base import ExplorationPolicy
 
 
 class ExplorationStrategy(object, metaclass=abc.ABCMeta):
     @abc.abstractmethod
-    def get_action(self, t, observation, policy, **kwargs):
+    def get_action(self, t, policy, observation, **kwargs):
         pass
 
+    def get_actions(self, t, policy, observations, **kwargs):
+        return np.array([
+            self.get_action(t, policy, o, **kwargs)[0] for o in observations
+        ])
+
+    def get_actions_and_infos(self, t, policy, observations, **kwargs):
+        actions, agent_infos = zip(*[
+            self.get_action(t, policy, o, **kwargs) for o in observations
+        ])
+        return np.array(actions), list(agent_infos)
+
     def reset(self):
         pass
 
@@ -21,6 +34,25 @@ class RawExplorationStrategy(ExplorationStrategy, metaclass=abc.ABCMeta):
         action, agent_info = policy.get_action(*args, **kwargs)
         return self.get_action_from_raw_action(action, t=t), agent_info
 
+    def get_actions_from_raw_actions(self, actions, **kwargs):
+        """
+        :param actions: Batch of actions, one per row.
+        :return: Batch of actions. This default implementation calls
+        get_action_from_raw_action for every action.
+        """
+        return np.array([
+            self.get_action_from_raw_action(action, **kwargs)
+            for action in actions
+        ])
+
+    def get_actions(self, t, policy, *args, **kwargs):
+        actions = policy.get_actions(*args, **kwargs)
+        return self.get_actions_from_raw_actions(actions, t=t)
+
+    def get_actions_and_infos(self, t, policy, *args, **kwargs):
+        actions, agent_infos = policy.get_actions_and_infos(*args, **kwargs)
+        return self.get_actions_from_raw_actions(actions, t=t), agent_infos
+
     def reset(self):
         pass
 
@@ -41,6 +73,14 @@ class PolicyWrappedWithExplorationStrategy(ExplorationPolicy):
     def get_action(self, *args, **kwargs):
         return self.es.get_action(self.t, self.policy, *args, **kwargs)
 
+    def get_actions(self, *args, **kwargs):
+        return self.es.get_actions(self.t, self.policy, *args, **kwargs)
+
+    def get_actions_and_infos(self, *args, **kwargs):
+        return self.es.get_actions_and_infos(
+            self.t, self.policy, *args, **kwargs
+        )
+
     def reset(self):
         self.es.reset()
         self.policy.reset()
@@ -13,6 +13,10 @@ class OUStrategy(RawExplorationStrategy):
     where Wt denotes the Wiener process
 
     Based on the rllab implementation.
+
+    Batches of actions, e.g. from VecMdpPathCollector, get one noise state
+    per row. The rows are assumed to be the same environments from one
+    batch to the next, and all their states are reset together by `reset`.
     """
 
     def __init__(
@@ -38,10 +42,12 @@ class OUStrategy(RawExplorationStrategy):
         self.low = action_space.low
         self.high = action_space.high
         self.state = np.ones(self.dim) * self.mu
+        self.batch_state = np.ones((0, self.dim)) * self.mu
         self.reset()
 
     def reset(self):
         self.state = np.ones(self.dim) * self.mu
+        self.batch_state = np.ones((0, self.dim)) * self.mu
 
     def evolve_state(self):
         x = self.state
@@ -49,11 +55,38 @@ class OUStrategy(RawExplorationStrategy):
         self.state = x + dx
         return self.state
 
-    def get_action_from_raw_action(self, action, t=0, **kwargs):
-        ou_state = self.evolve_state()
+    def evolve_batch_state(self, batch_size):
+        """
+        Evolve the noise states of the first `batch_size` rows, starting new
+        rows from `mu`.
+        """
+        num_new_rows = batch_size - len(self.batch_state)
+        if num_new_rows > 0:
+            self.batch_state = np.vstack((
+                self.batch_state,
+                np.ones((num_new_rows, self.dim)) * self.mu,
+            ))
+        x = self.batch_state[:batch_size]
+        dx = self.theta * (self.mu - x) + self.sigma * nr.randn(*x.shape)
+        self.batch_state[:batch_size] = x + dx
+        return self.batch_state[:batch_size]
+
+    def _update_sigma(self, t):
         self.sigma = (
             self._max_sigma
             - (self._max_sigma - self._min_sigma)
             * min(1.0, t * 1.0 / self._decay_period)
         )
+
+    def get_action_from_raw_action(self, action, t=0, **kwargs):
+        ou_state = self.evolve_state()
+        self._update_sigma(t)
         return np.clip(action + ou_state, self.low, self.high)
+
+    def get_actions_from_raw_actions(self, actions, t=0, **kwargs):
+        actions = np.asarray(actions)
+        ou_state = self.evolve_batch_state(len(actions))
+        self._update_sigma(t)
+        return np.clip(
+            actions + ou_state.reshape(actions.shape), self.low, self.high
+        )
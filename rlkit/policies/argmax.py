@@ -19,3 +19,7 @@ class ArgmaxDiscretePolicy(nn.Module, Policy):
         q_values = self.qf(obs).squeeze(0)
         q_values_np = ptu.get_numpy(q_values)
         return q_values_np.argmax(), {}
+
+    def get_actions(self, obs):
+        q_values = self.qf(ptu.from_numpy(np.asarray(obs)).float())
+        return ptu.get_numpy(q_values).argmax(axis=1)
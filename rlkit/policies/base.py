@@ -1,5 +1,7 @@
 import abc
 
+import numpy as np
+
 
 class Policy(object, metaclass=abc.ABCMeta):
     """
@@ -14,6 +16,30 @@ class Policy(object, metaclass=abc.ABCMeta):
         """
         pass
 
+    def get_actions(self, observations):
+        """
+        :param observations: Batch of observations, one per row.
+        :return: Batch of actions. This default implementation calls
+        get_action for every observation.
+        """
+        return np.array([self.get_action(o)[0] for o in observations])
+
+    def get_actions_and_infos(self, observations):
+        """
+        :param observations: Batch of observations, one per row.
+        :return: Tuple of the batch of actions and the list of agent infos,
+        one per observation. Policies with their own get_actions are batched
+        and have empty agent infos. Otherwise get_action is called for every
+        observation.
+        """
+        if type(self).get_actions is not Policy.get_actions:
+            actions = self.get_actions(observations)
+            return actions, [{} for _ in range(len(actions))]
+        actions, agent_infos = zip(*[
+            self.get_action(o) for o in observations
+        ])
+        return np.array(actions), list(agent_infos)
+
     def reset(self):
         pass
 
@@ -6,6 +6,8 @@ from rlkit.samplers.data_collector.base import (
 from rlkit.samplers.data_collector.path_collector import (
     MdpPathCollector,
     GoalConditionedPathCollector,
+    VecMdpPathCollector,
+    VecGoalConditionedPathCollector,
 )
 from rlkit.samplers.data_collector.step_collector import (
     GoalConditionedStepCollector
@@ -1,6 +1,13 @@
 from collections import deque, OrderedDict
 
+import numpy as np
+
 from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.data_management.path_builder import (
+    PathBuilder,
+    dict_obs_to_list,
+)
+from rlkit.envs.vec_env import VecEnv
 from rlkit.samplers.rollout_functions import rollout, multitask_rollout
 from rlkit.samplers.data_collector.base import PathCollector
 
@@ -172,3 +179,224 @@ class GoalConditionedPathCollector(PathCollector):
             observation_key=self._observation_key,
             desired_goal_key=self._desired_goal_key,
         )
+
+
+class VecMdpPathCollector(PathCollector):
+    """
+    Collects paths from several environments that are stepped in lockstep,
+    so that the policy is evaluated once per step on the stacked
+    observations of all environments instead of once per environment.
+
+    Every environment is reset on its own when its path ends. Like
+    MdpPathCollector, full paths are collected until the next one would go
+    over `num_steps`: a path is only started if the steps that are not
+    already set aside for the running paths fit a whole path. If incomplete
+    paths are kept, paths are also started with the steps that are left and
+    cut short when they run out.
+
+    The policy is only reset once per call of `collect_new_paths`, so its
+    state, e.g. the timestep of an exploration strategy, is shared by all
+    environments. OUStrategy keeps a noise state per environment, but it is
+    not reset when an environment starts a new path.
+    """
+
+    def __init__(
+            self,
+            envs,
+            policy,
+            max_num_epoch_paths_saved=None,
+    ):
+        """
+        :param envs: List of environments, or a VecEnv.
+        :param policy: Policy with `get_actions_and_infos`, which takes a
+        batch of observations and returns a batch of actions and their agent
+        infos.
+        """
+        if isinstance(envs, (list, tuple)):
+            envs = VecEnv(envs)
+        self._env = envs
+        self._policy = policy
+        self._max_num_epoch_paths_saved = max_num_epoch_paths_saved
+        self._epoch_paths = deque(maxlen=self._max_num_epoch_paths_saved)
+
+        self._num_steps_total = 0
+        self._num_paths_total = 0
+
+    def collect_new_paths(
+            self,
+            max_path_length,
+            num_steps,
+            discard_incomplete_paths,
+    ):
+        paths = []
+        num_steps_collected = 0
+        # Steps set aside for the running paths, which may use up to their
+        # whole budget.
+        num_steps_reserved = 0
+        num_envs = self._env.num_envs
+        path_builders = [None] * num_envs
+        path_budgets = [0] * num_envs
+        path_starts = [None] * num_envs
+        obs = [None] * num_envs
+        self._policy.reset()
+        while True:
+            env_idxs_to_reset = []
+            for env_idx in range(num_envs):
+                if path_builders[env_idx] is not None:
+                    continue
+                budget = min(max_path_length, num_steps - num_steps_reserved)
+                if budget <= 0 or (
+                        discard_incomplete_paths
+                        and budget < max_path_length < np.inf
+                ):
+                    break
+                path_builders[env_idx] = PathBuilder()
+                path_budgets[env_idx] = budget
+                num_steps_reserved += budget
+                env_idxs_to_reset.append(env_idx)
+            if env_idxs_to_reset:
+                for env_idx, ob in zip(
+                        env_idxs_to_reset,
+                        self._env.reset(env_idxs_to_reset),
+                ):
+                    obs[env_idx] = ob
+                    path_starts[env_idx] = ob
+            env_idxs = [
+                env_idx for env_idx in range(num_envs)
+                if path_builders[env_idx] is not None
+            ]
+            if not env_idxs:
+                break
+            actions, agent_infos = self._policy.get_actions_and_infos(
+                self._get_policy_inputs(
+                    [obs[i] for i in env_idxs],
+                    [path_starts[i] for i in env_idxs],
+                )
+            )
+            next_obs, rewards, terminals, env_infos = self._env.step(
+                actions, env_idxs,
+            )
+            for i, env_idx in enumerate(env_idxs):
+                path_builder = path_builders[env_idx]
+                path_builder.add_all(
+                    observations=obs[env_idx],
+                    actions=actions[i],
+                    rewards=rewards[i],
+                    next_observations=next_obs[i],
+                    terminals=terminals[i],
+                    agent_infos=agent_infos[i],
+                    env_infos=env_infos[i],
+                )
+                obs[env_idx] = next_obs[i]
+                path_len = len(path_builder)
+                if terminals[i] or path_len == path_budgets[env_idx]:
+                    if (
+                            terminals[i]
+                            or path_len == max_path_length
+                            or not discard_incomplete_paths
+                    ):
+                        paths.append(self._get_path(
+                            path_builder, path_starts[env_idx]
+                        ))
+                        num_steps_collected += path_len
+                    # Give back the steps this path didn't use.
+                    num_steps_reserved -= path_budgets[env_idx] - path_len
+                    path_builders[env_idx] = None
+        self._num_paths_total += len(paths)
+        self._num_steps_total += num_steps_collected
+        self._epoch_paths.extend(paths)
+        return paths
+
+    def _get_policy_inputs(self, obs, path_starts):
+        """
+        :param obs: Current observation of every environment that is stepped.
+        :param path_starts: First observation of their current paths.
+        """
+        return np.array(obs)
+
+    def _get_path(self, path_builder, path_start):
+        path = path_builder.get_all_stacked()
+        actions = path['actions']
+        if len(actions.shape) == 1:
+            path['actions'] = np.expand_dims(actions, 1)
+        path['rewards'] = path['rewards'].reshape(-1, 1)
+        path['terminals'] = path['terminals'].reshape(-1, 1)
+        for key in ['observations', 'next_observations']:
+            if (
+                    isinstance(path[key], np.ndarray)
+                    and len(path[key].shape) == 1
+            ):
+                path[key] = np.expand_dims(path[key], 1)
+        return path
+
+    def get_epoch_paths(self):
+        return self._epoch_paths
+
+    def end_epoch(self, epoch):
+        self._epoch_paths = deque(maxlen=self._max_num_epoch_paths_saved)
+
+    def get_diagnostics(self):
+        path_lens = [len(path['actions']) for path in self._epoch_paths]
+        stats = OrderedDict([
+            ('num steps total', self._num_steps_total),
+            ('num paths total', self._num_paths_total),
+        ])
+        stats.update(create_stats_ordered_dict(
+            "path length",
+            path_lens,
+            always_show_all_stats=True,
+        ))
+        return stats
+
+    def get_snapshot(self):
+        return dict(
+            env=self._env,
+            policy=self._policy,
+        )
+
+
+class VecGoalConditionedPathCollector(VecMdpPathCollector):
+    """
+    Goal-conditioned version of VecMdpPathCollector. The paths have the same
+    format as the ones of GoalConditionedPathCollector.
+    """
+
+    def __init__(
+            self,
+            envs,
+            policy,
+            max_num_epoch_paths_saved=None,
+            observation_key='observation',
+            desired_goal_key='desired_goal',
+    ):
+        super().__init__(
+            envs,
+            policy,
+            max_num_epoch_paths_saved=max_num_epoch_paths_saved,
+        )
+        self._observation_key = observation_key
+        self._desired_goal_key = desired_goal_key
+
+    def _get_policy_inputs(self, obs, path_starts):
+        # Like multitask_rollout, the goal of a path is the one it was reset
+        # with.
+        return np.hstack((
+            np.array([o[self._observation_key] for o in obs]),
+            np.array([o[self._desired_goal_key] for o in path_starts]),
+        ))
+
+    def _get_path(self, path_builder, path_start):
+        path = super()._get_path(path_builder, path_start)
+        path['goals'] = np.repeat(
+            path_start[self._desired_goal_key][None], len(path_builder), 0
+        )
+        path['full_observations'] = dict_obs_to_list(path['observations'])
+        return path
+
+    def get_snapshot(self):
+        return dict(
+            env=self._env,
+            policy=self._policy,
+            observation_key=self._observation_key,
+            desired_goal_key=self._desired_goal_key,
+        )
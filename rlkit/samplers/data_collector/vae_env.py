@@ -1,5 +1,8 @@
 from rlkit.envs.vae_wrapper import VAEWrappedEnv
-from rlkit.samplers.data_collector import GoalConditionedPathCollector
+from rlkit.samplers.data_collector import (
+    GoalConditionedPathCollector,
+    VecGoalConditionedPathCollector,
+)
 
 
 class VAEWrappedEnvPathCollector(GoalConditionedPathCollector):
@@ -18,4 +21,39 @@ class VAEWrappedEnvPathCollector(GoalConditionedPathCollector):
     def collect_new_paths(self, *args, **kwargs):
         self._env.goal_sampling_mode = self._goal_sampling_mode
         self._env.decode_goals = self._decode_goals
-        return super().collect_new_paths(*args, **kwargs)
\ No newline at end of file
+        return super().collect_new_paths(*args, **kwargs)
+
+
+class VecVAEWrappedEnvPathCollector(VecGoalConditionedPathCollector):
+    """
+    VAEWrappedEnvPathCollector for several VAEWrappedEnvs, e.g. in a
+    SubprocVecEnv.
+    """
+
+    def __init__(
+            self,
+            goal_sampling_mode,
+            envs,
+            policy,
+            decode_goals=False,
+            vae_env: VAEWrappedEnv = None,
+            **kwargs
+    ):
+        """
+        :param vae_env: If given, the VAE and mode map of this env are sent to
+        the environments before every collection. Use it when the
+        environments run in other processes and the VAE is trained online.
+        """
+        super().__init__(envs, policy, **kwargs)
+        self._goal_sampling_mode = goal_sampling_mode
+        self._decode_goals = decode_goals
+        self._vae_env = vae_env
+
+    def collect_new_paths(self, *args, **kwargs):
+        if self._vae_env is not None:
+            self._env.env_method(
+                'update_env', **self._vae_env.get_env_update()
+            )
+        self._env.set_attr('goal_sampling_mode', self._goal_sampling_mode)
+        self._env.set_attr('decode_goals', self._decode_goals)
+        return super().collect_new_paths(*args, **kwargs)
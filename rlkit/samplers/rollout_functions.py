@@ -1,5 +1,147 @@
 import numpy as np
 
+# Initial capacity of the arrays of paths with an infinite max_path_length.
+_INITIAL_CAPACITY = 64
+# Avoids converting every reward to an array to get its dtype.
+_PYTHON_SCALAR_DTYPES = {
+    bool: np.dtype(np.bool_),
+    int: np.dtype(np.int64),
+    float: np.dtype(np.float64),
+}
+
+
+class _PathWriter(object):
+    """
+    Writes the steps of a path into arrays that are allocated on the first
+    write of every key, with the shape and dtype of its value, and with room
+    for `max_path_length` steps. If
+    `max_path_length` is infinite, the arrays double in size whenever they
+    are full instead. Dict values, e.g. dict observations, are stored as one
+    array per key.
+    """
+
+    def __init__(self, max_path_length):
+        if np.isinf(max_path_length):
+            self._size = _INITIAL_CAPACITY
+        else:
+            self._size = int(max_path_length)
+        self._columns = {}
+
+    def write(self, t, **values):
+        if t >= self._size:
+            self._size *= 2
+            self._columns = {
+                key: _grow(column, self._size)
+                for key, column in self._columns.items()
+            }
+        for key, value in values.items():
+            if key not in self._columns:
+                self._columns[key] = _allocate(value, self._size)
+            self._columns[key] = _write(self._columns[key], t, value)
+
+    def trim(self, size):
+        """
+        Copy the arrays to arrays with `size` rows if they are less than half
+        full, so that the views of a short path don't keep the whole
+        preallocated arrays alive.
+        """
+        if 2 * size > self._size:
+            return
+        self._size = size
+        self._columns = {
+            key: _grow(column, size)
+            for key, column in self._columns.items()
+        }
+
+    def get(self, key, start, stop):
+        """
+        :return: View of the steps [start, stop) of `key`.
+        """
+        return _slice(self._columns[key], start, stop)
+
+
+def _allocate(value, size):
+    if isinstance(value, dict):
+        return {k: _allocate(v, size) for k, v in value.items()}
+    value = np.asarray(value)
+    return np.empty((size,) + value.shape, dtype=value.dtype)
+
+
+def _grow(column, size):
+    """
+    :return: Copy of `column` with room for `size` values. Only the first
+    `size` values are copied if the column is longer.
+    """
+    if isinstance(column, dict):
+        return {k: _grow(v, size) for k, v in column.items()}
+    new_column = np.empty((size,) + column.shape[1:], dtype=column.dtype)
+    num_values = min(len(column), size)
+    new_column[:num_values] = column[:num_values]
+    return new_column
+
+
+def _write(column, t, value):
+    """
+    Write `value` at index `t` of `column`. Nothing is written if `value`
+    doesn't fit: a KeyError is raised if it is a dict with other keys than
+    the column, and a ValueError if its shape differs or it isn't numeric.
+
+    :return: The column, which is a copy with a wider dtype if `value` can't
+    be cast to the dtype of the column without losing precision, e.g. a
+    float64 array written to a float32 column or a float to an int column.
+    """
+    dtypes = _get_write_dtypes(column, value)
+    return _write_with_dtypes(column, t, value, dtypes)
+
+
+def _get_write_dtypes(column, value):
+    """
+    :return: The dtype that `column` needs to hold `value`, or a dict of
+    dtypes if the column is a dict.
+    """
+    if isinstance(column, dict):
+        if not isinstance(value, dict) or value.keys() != column.keys():
+            raise KeyError(
+                "Expected a dict with keys {}".format(list(column.keys()))
+            )
+        return {
+            k: _get_write_dtypes(column[k], value[k]) for k in column
+        }
+    dtype = _PYTHON_SCALAR_DTYPES.get(type(value))
+    if dtype is None:
+        value = np.asarray(value)
+        dtype, shape, casting = value.dtype, value.shape, 'safe'
+    else:
+        # Python scalars have no precision of their own, so only a change of
+        # kind, e.g. a float written to an int column, widens the column.
+        shape, casting = (), 'same_kind'
+    if shape != column.shape[1:]:
+        raise ValueError("Expected shape {}, got {}".format(
+            column.shape[1:], shape
+        ))
+    if np.can_cast(dtype, column.dtype, casting=casting):
+        return column.dtype
+    if dtype.kind not in 'biufc':
+        raise ValueError("Can't store {} values".format(dtype))
+    return np.result_type(column.dtype, dtype)
+
+
+def _write_with_dtypes(column, t, value, dtypes):
+    if isinstance(column, dict):
+        for k in column:
+            column[k] = _write_with_dtypes(column[k], t, value[k], dtypes[k])
+        return column
+    if dtypes != column.dtype:
+        column = column.astype(dtypes)
+    column[t] = value
+    return column
+
+
+def _slice(column, start, stop):
+    if isinstance(column, dict):
+        return {k: _slice(v, start, stop) for k, v in column.items()}
+    return column[start:stop]
+
 
 def multitask_rollout(
         env,
@@ -12,19 +154,22 @@ def multitask_rollout(
         get_action_kwargs=None,
         return_dict_obs=False,
 ):
+    """
+    Same as `rollout`, but the policy gets the observation concatenated with
+    the goal the environment was reset with.
+
+    If `return_dict_obs` is True, the observations and next observations are
+    dicts with an array per key. Otherwise they are the `observation_key`
+    arrays. `full_observations` is the list of observation dicts.
+    """
     if render_kwargs is None:
         render_kwargs = {}
     if get_action_kwargs is None:
         get_action_kwargs = {}
-    dict_obs = []
-    dict_next_obs = []
-    observations = []
-    actions = []
-    rewards = []
-    terminals = []
+    writer = _PathWriter(max_path_length)
+    full_observations = []
     agent_infos = []
     env_infos = []
-    next_observations = []
     path_length = 0
     agent.reset()
     o = env.reset()
@@ -32,44 +177,52 @@ def multitask_rollout(
         env.render(**render_kwargs)
     goal = o[desired_goal_key]
     while path_length < max_path_length:
-        dict_obs.append(o)
         if observation_key:
-            o = o[observation_key]
-        new_obs = np.hstack((o, goal))
+            policy_o = o[observation_key]
+        else:
+            policy_o = o
+        new_obs = np.hstack((policy_o, goal))
         a, agent_info = agent.get_action(new_obs, **get_action_kwargs)
         next_o, r, d, env_info = env.step(a)
         if render:
             env.render(**render_kwargs)
-        observations.append(o)
-        rewards.append(r)
-        terminals.append(d)
-        actions.append(a)
-        next_observations.append(next_o)
-        dict_next_obs.append(next_o)
+        writer.write(
+            path_length,
+            observations=o,
+            actions=a,
+            rewards=r,
+            next_observations=next_o,
+            terminals=d,
+        )
+        full_observations.append(o)
         agent_infos.append(agent_info)
         env_infos.append(env_info)
         path_length += 1
         if d:
             break
         o = next_o
-    actions = np.array(actions)
+    writer.trim(path_length)
+    actions = writer.get('actions', 0, path_length)
     if len(actions.shape) == 1:
         actions = np.expand_dims(actions, 1)
-    observations = np.array(observations)
-    next_observations = np.array(next_observations)
+    dict_obs = writer.get('observations', 0, path_length)
+    dict_next_obs = writer.get('next_observations', 0, path_length)
     if return_dict_obs:
         observations = dict_obs
         next_observations = dict_next_obs
+    else:
+        observations = dict_obs[observation_key]
+        next_observations = dict_next_obs[observation_key]
     return dict(
         observations=observations,
         actions=actions,
-        rewards=np.array(rewards).reshape(-1, 1),
+        rewards=writer.get('rewards', 0, path_length).reshape(-1, 1),
         next_observations=next_observations,
-        terminals=np.array(terminals).reshape(-1, 1),
+        terminals=writer.get('terminals', 0, path_length).reshape(-1, 1),
         agent_infos=agent_infos,
         env_infos=env_infos,
         goals=np.repeat(goal[None], path_length, 0),
-        full_observations=dict_obs,
+        full_observations=full_observations,
     )
 
 
@@ -93,28 +246,30 @@ def rollout(
     the list being the index into the time
      - agent_infos
      - env_infos
+
+    Dict observations are returned as dicts with an array per key.
     """
     if render_kwargs is None:
         render_kwargs = {}
-    observations = []
-    actions = []
-    rewards = []
-    terminals = []
+    writer = _PathWriter(max_path_length)
     agent_infos = []
     env_infos = []
     o = env.reset()
     agent.reset()
-    next_o = None
     path_length = 0
     if render:
         env.render(**render_kwargs)
     while path_length < max_path_length:
         a, agent_info = agent.get_action(o)
         next_o, r, d, env_info = env.step(a)
-        observations.append(o)
-        rewards.append(r)
-        terminals.append(d)
-        actions.append(a)
+        writer.write(
+            path_length,
+            observations=o,
+            actions=a,
+            rewards=r,
+            next_observations=next_o,
+            terminals=d,
+        )
         agent_infos.append(agent_info)
         env_infos.append(env_info)
         path_length += 1
@@ -124,25 +279,24 @@ def rollout(
         if render:
             env.render(**render_kwargs)
 
-    actions = np.array(actions)
+    writer.trim(path_length)
+    actions = writer.get('actions', 0, path_length)
     if len(actions.shape) == 1:
         actions = np.expand_dims(actions, 1)
-    observations = np.array(observations)
-    if len(observations.shape) == 1:
+    observations = writer.get('observations', 0, path_length)
+    next_observations = writer.get('next_observations', 0, path_length)
+    if (
+            not isinstance(observations, dict)
+            and len(observations.shape) == 1
+    ):
         observations = np.expand_dims(observations, 1)
-        next_o = np.array([next_o])
-    next_observations = np.vstack(
-        (
-            observations[1:, :],
-            np.expand_dims(next_o, 0)
-        )
-    )
+        next_observations = np.expand_dims(next_observations, 1)
     return dict(
         observations=observations,
         actions=actions,
-        rewards=np.array(rewards).reshape(-1, 1),
+        rewards=writer.get('rewards', 0, path_length).reshape(-1, 1),
         next_observations=next_observations,
-        terminals=np.array(terminals).reshape(-1, 1),
+        terminals=writer.get('terminals', 0, path_length).reshape(-1, 1),
         agent_infos=agent_infos,
         env_infos=env_infos,
     )
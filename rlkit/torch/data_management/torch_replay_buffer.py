@@ -0,0 +1,211 @@
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from gym.spaces import Discrete
+
+import rlkit.torch.pytorch_util as ptu
+from rlkit.data_management.replay_buffer import (
+    ReplayBuffer,
+    get_buffer_and_path_slices,
+    iterate_saved_array,
+    save_array,
+)
+from rlkit.data_management.simple_replay_buffer import get_env_info_column
+from rlkit.envs.env_utils import get_dim
+
+
+class TorchReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer that keeps all of its data in float32 torch tensors on
+    `ptu.device`, so that `random_batch` samples and gathers on the device
+    and returns a batch that the TorchTrainers can use without converting it
+    from numpy. Paths are copied to the device once, when they are added.
+    """
+
+    def __init__(
+            self,
+            max_replay_buffer_size,
+            env,
+            env_info_sizes=None,
+            device=None,
+            store_action_indices=False,
+    ):
+        """
+        :param device: Where to store the data. Defaults to `ptu.device`, or
+        the CPU if that is not set.
+        :param store_action_indices: If True and the action space is
+        Discrete, store the action indices instead of one-hot rows. The
+        batch's actions then have shape [batch_size, 1].
+        """
+        self.env = env
+        self._ob_space = env.observation_space
+        self._action_space = env.action_space
+        self._observation_dim = get_dim(self._ob_space)
+        self._store_action_indices = (
+            store_action_indices and isinstance(self._action_space, Discrete)
+        )
+        if self._store_action_indices:
+            self._action_dim = 1
+        else:
+            self._action_dim = get_dim(self._action_space)
+        self._max_replay_buffer_size = max_replay_buffer_size
+
+        if env_info_sizes is None:
+            if hasattr(env, 'info_sizes'):
+                env_info_sizes = env.info_sizes
+            else:
+                env_info_sizes = dict()
+
+        if device is None:
+            device = ptu.device if ptu.device is not None else 'cpu'
+        self._device = torch.device(device)
+
+        self._observations = self._allocate_array(
+            '_observations', (max_replay_buffer_size, self._observation_dim),
+            torch.float32,
+        )
+        self._next_obs = self._allocate_array(
+            '_next_obs', (max_replay_buffer_size, self._observation_dim),
+            torch.float32,
+        )
+        self._actions = self._allocate_array(
+            '_actions', (max_replay_buffer_size, self._action_dim),
+            torch.float32,
+        )
+        self._rewards = self._allocate_array(
+            '_rewards', (max_replay_buffer_size, 1), torch.float32,
+        )
+        # Stored as floats since that's what the trainers use them as.
+        self._terminals = self._allocate_array(
+            '_terminals', (max_replay_buffer_size, 1), torch.float32,
+        )
+        self._env_infos = {}
+        for key, size in env_info_sizes.items():
+            self._env_infos[key] = self._allocate_array(
+                '_env_infos/' + key, (max_replay_buffer_size, size),
+                torch.float32,
+            )
+        self._env_info_keys = env_info_sizes.keys()
+
+        self._top = 0
+        self._size = 0
+
+    def _create_array(self, name, shape, dtype):
+        return torch.zeros(shape, dtype=dtype, device=self._device)
+
+    def _to_tensor(self, x, num_rows):
+        x = np.asarray(x, dtype=np.float32).reshape(num_rows, -1)
+        return torch.from_numpy(x).to(self._device)
+
+    def _one_hot_actions(self, actions):
+        if (
+                not isinstance(self._action_space, Discrete)
+                or self._store_action_indices
+        ):
+            return actions
+        actions = np.asarray(actions).reshape(-1).astype(int)
+        one_hot_actions = np.zeros((len(actions), self._action_dim))
+        one_hot_actions[np.arange(len(actions)), actions] = 1
+        return one_hot_actions
+
+    def add_sample(self, observation, action, reward, terminal,
+                   next_observation, env_info=None, **kwargs):
+        top = self._top
+        self._observations[top] = self._to_tensor(observation, 1)[0]
+        self._actions[top] = self._to_tensor(
+            self._one_hot_actions([action]), 1
+        )[0]
+        self._rewards[top] = self._to_tensor(reward, 1)[0]
+        self._terminals[top] = self._to_tensor(terminal, 1)[0]
+        self._next_obs[top] = self._to_tensor(next_observation, 1)[0]
+        for key in self._env_info_keys:
+            self._env_infos[key][top] = self._to_tensor(env_info[key], 1)[0]
+        self._top = (top + 1) % self._max_replay_buffer_size
+        self._size = min(self._size + 1, self._max_replay_buffer_size)
+
+    def add_path(self, path):
+        """
+        Copy an entire path to the device with one transfer per field.
+        """
+        path_len = len(path["rewards"])
+        if path_len == 0:
+            return
+        fields = [
+            (self._observations, path["observations"]),
+            (self._actions, self._one_hot_actions(path["actions"])),
+            (self._rewards, path["rewards"]),
+            (self._terminals, path["terminals"]),
+            (self._next_obs, path["next_observations"]),
+        ]
+        env_infos = path.get("env_infos", None)
+        for key in self._env_info_keys:
+            fields.append((
+                self._env_infos[key],
+                get_env_info_column(env_infos, key),
+            ))
+        fields = [
+            (buffer_tensor, self._to_tensor(path_arr, path_len))
+            for buffer_tensor, path_arr in fields
+        ]
+        for buffer_slice, path_slice in get_buffer_and_path_slices(
+                self._top, path_len, self._max_replay_buffer_size
+        ):
+            for buffer_tensor, path_tensor in fields:
+                buffer_tensor[buffer_slice] = path_tensor[path_slice]
+        self._top = (self._top + path_len) % self._max_replay_buffer_size
+        self._size = min(self._size + path_len, self._max_replay_buffer_size)
+
+    def terminate_episode(self):
+        pass
+
+    def random_batch(self, batch_size):
+        indices = torch.randint(
+            0, self._size, (batch_size,), device=self._device,
+        )
+        batch = dict(
+            observations=self._observations[indices],
+            actions=self._actions[indices],
+            rewards=self._rewards[indices],
+            terminals=self._terminals[indices],
+            next_observations=self._next_obs[indices],
+        )
+        for key in self._env_info_keys:
+            assert key not in batch.keys()
+            batch[key] = self._env_infos[key][indices]
+        return batch
+
+    def to(self, device):
+        """
+        Move the stored data to `device`.
+        """
+        self._device = torch.device(device)
+        self._observations = self._observations.to(self._device)
+        self._next_obs = self._next_obs.to(self._device)
+        self._actions = self._actions.to(self._device)
+        self._rewards = self._rewards.to(self._device)
+        self._terminals = self._terminals.to(self._device)
+        for key in self._env_info_keys:
+            self._env_infos[key] = self._env_infos[key].to(self._device)
+
+    def num_steps_can_sample(self):
+        return self._size
+
+    def _save_array(self, directory, name, max_num_rows):
+        save_array(
+            directory, name, ptu.get_numpy(self._get_array(name)[:max_num_rows])
+        )
+
+    def _load_array(self, directory, name):
+        tensor = self._get_array(name)
+        for start, chunk in iterate_saved_array(directory, name, tensor.shape):
+            tensor[start:start + len(chunk)] = torch.from_numpy(chunk).to(
+                self._device
+            )
+
+    def get_diagnostics(self):
+        stats = OrderedDict([
+            ('size', self._size)
+        ])
+        stats.update(super().get_diagnostics())
+        return stats
@@ -75,6 +75,7 @@ class DDPGTrainer(TorchTrainer):
     def train_from_torch(self, batch):
         rewards = batch['rewards']
         terminals = batch['terminals']
+        discount = batch.get('discounts', self.discount)
         obs = batch['observations']
         actions = batch['actions']
         next_obs = batch['next_observations']
@@ -111,12 +112,15 @@ class DDPGTrainer(TorchTrainer):
             next_obs,
             next_actions,
         )
-        q_target = rewards + (1. - terminals) * self.discount * target_q_values
+        q_target = rewards + (1. - terminals) * discount * target_q_values
         q_target = q_target.detach()
         q_target = torch.clamp(q_target, self.min_q_value, self.max_q_value)
         q_pred = self.qf(obs, actions)
         bellman_errors = (q_pred - q_target) ** 2
-        raw_qf_loss = self.qf_criterion(q_pred, q_target)
+        raw_qf_loss = self.compute_weighted_loss(
+            self.qf_criterion, q_pred, q_target, batch,
+        )
+        self.report_td_errors(batch, (q_pred - q_target).detach())
 
         if self.qf_weight_decay > 0:
             reg_loss = self.qf_weight_decay * sum(
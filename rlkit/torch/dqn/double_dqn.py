@@ -1,15 +1,15 @@
 import numpy as np
-import torch
 
 import rlkit.torch.pytorch_util as ptu
 from rlkit.core.eval_util import create_stats_ordered_dict
-from rlkit.torch.dqn.dqn import DQNTrainer
+from rlkit.torch.dqn.dqn import DQNTrainer, get_action_q_values
 
 
 class DoubleDQNTrainer(DQNTrainer):
     def train_from_torch(self, batch):
         rewards = batch['rewards']
         terminals = batch['terminals']
+        discount = batch.get('discounts', self.discount)
         obs = batch['observations']
         actions = batch['actions']
         next_obs = batch['next_observations']
@@ -24,11 +24,13 @@ class DoubleDQNTrainer(DQNTrainer):
         target_q_values = self.target_qf(next_obs).gather(
             1, best_action_idxs
         ).detach()
-        y_target = rewards + (1. - terminals) * self.discount * target_q_values
+        y_target = rewards + (1. - terminals) * discount * target_q_values
         y_target = y_target.detach()
-        # actions is a one-hot vector
-        y_pred = torch.sum(self.qf(obs) * actions, dim=1, keepdim=True)
-        qf_loss = self.qf_criterion(y_pred, y_target)
+        y_pred = get_action_q_values(self.qf(obs), actions)
+        qf_loss = self.compute_weighted_loss(
+            self.qf_criterion, y_pred, y_target, batch,
+        )
+        self.report_td_errors(batch, (y_pred - y_target).detach())
 
         """
         Update networks
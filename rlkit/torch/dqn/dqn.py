@@ -43,6 +43,7 @@ class DQNTrainer(TorchTrainer):
     def train_from_torch(self, batch):
         rewards = batch['rewards'] * self.reward_scale
         terminals = batch['terminals']
+        discount = batch.get('discounts', self.discount)
         obs = batch['observations']
         actions = batch['actions']
         next_obs = batch['next_observations']
@@ -54,11 +55,13 @@ class DQNTrainer(TorchTrainer):
         target_q_values = self.target_qf(next_obs).detach().max(
             1, keepdim=True
         )[0]
-        y_target = rewards + (1. - terminals) * self.discount * target_q_values
+        y_target = rewards + (1. - terminals) * discount * target_q_values
         y_target = y_target.detach()
-        # actions is a one-hot vector
-        y_pred = torch.sum(self.qf(obs) * actions, dim=1, keepdim=True)
-        qf_loss = self.qf_criterion(y_pred, y_target)
+        y_pred = get_action_q_values(self.qf(obs), actions)
+        qf_loss = self.compute_weighted_loss(
+            self.qf_criterion, y_pred, y_target, batch,
+        )
+        self.report_td_errors(batch, (y_pred - y_target).detach())
 
         """
         Soft target network updates
@@ -104,3 +107,17 @@ class DQNTrainer(TorchTrainer):
             qf=self.qf,
             target_qf=self.target_qf,
         )
+
+
+def get_action_q_values(q_values, actions):
+    """
+    :param q_values: [batch_size, num_actions] Q values of every action.
+    :param actions: Either one-hot actions or, with shape [batch_size, 1],
+    action indices, as stored with `store_action_indices=True`.
+    :return: [batch_size, 1] Q values of the taken actions.
+    """
+    if q_values.shape[1] == 1:
+        return q_values
+    if actions.shape[1] == 1:
+        return q_values.gather(1, actions.long())
+    return torch.sum(q_values * actions, dim=1, keepdim=True)
@@ -16,6 +16,9 @@ class HERTrainer(TorchTrainer):
         data['next_observations'] = torch.cat((next_obs, goals), dim=1)
         self._base_trainer.train_from_torch(data)
 
+    def set_td_error_callback(self, callback):
+        self._base_trainer.set_td_error_callback(callback)
+
     def get_diagnostics(self):
         return self._base_trainer.get_diagnostics()
 
@@ -131,3 +131,7 @@ class MakeDeterministic(Policy):
     def get_action(self, observation):
         return self.stochastic_policy.get_action(observation,
                                                  deterministic=True)
+
+    def get_actions(self, observations):
+        return self.stochastic_policy.get_actions(observations,
+                                                  deterministic=True)
@@ -85,6 +85,7 @@ class SACTrainer(TorchTrainer):
     def train_from_torch(self, batch):
         rewards = batch['rewards']
         terminals = batch['terminals']
+        discount = batch.get('discounts', self.discount)
         obs = batch['observations']
         actions = batch['actions']
         next_obs = batch['next_observations']
@@ -125,9 +126,14 @@ class SACTrainer(TorchTrainer):
             self.target_qf2(next_obs, new_next_actions),
         ) - alpha * new_log_pi
 
-        q_target = self.reward_scale * rewards + (1. - terminals) * self.discount * target_q_values
-        qf1_loss = self.qf_criterion(q1_pred, q_target.detach())
-        qf2_loss = self.qf_criterion(q2_pred, q_target.detach())
+        q_target = self.reward_scale * rewards + (1. - terminals) * discount * target_q_values
+        qf1_loss = self.compute_weighted_loss(
+            self.qf_criterion, q1_pred, q_target.detach(), batch,
+        )
+        qf2_loss = self.compute_weighted_loss(
+            self.qf_criterion, q2_pred, q_target.detach(), batch,
+        )
+        self.report_td_errors(batch, (q1_pred - q_target).detach())
 
         """
         Update networks
@@ -75,6 +75,7 @@ class TD3Trainer(TorchTrainer):
     def train_from_torch(self, batch):
         rewards = batch['rewards']
         terminals = batch['terminals']
+        discount = batch.get('discounts', self.discount)
         obs = batch['observations']
         actions = batch['actions']
         next_obs = batch['next_observations']
@@ -95,16 +96,22 @@ class TD3Trainer(TorchTrainer):
         target_q1_values = self.target_qf1(next_obs, noisy_next_actions)
         target_q2_values = self.target_qf2(next_obs, noisy_next_actions)
         target_q_values = torch.min(target_q1_values, target_q2_values)
-        q_target = self.reward_scale * rewards + (1. - terminals) * self.discount * target_q_values
+        q_target = self.reward_scale * rewards + (1. - terminals) * discount * target_q_values
         q_target = q_target.detach()
 
         q1_pred = self.qf1(obs, actions)
         bellman_errors_1 = (q1_pred - q_target) ** 2
-        qf1_loss = bellman_errors_1.mean()
-
         q2_pred = self.qf2(obs, actions)
         bellman_errors_2 = (q2_pred - q_target) ** 2
-        qf2_loss = bellman_errors_2.mean()
+        # The Q losses are the mean squared Bellman errors, not qf_criterion.
+        weights = batch.get('weights', None)
+        if weights is None:
+            qf1_loss = bellman_errors_1.mean()
+            qf2_loss = bellman_errors_2.mean()
+        else:
+            qf1_loss = (weights * bellman_errors_1).mean()
+            qf2_loss = (weights * bellman_errors_2).mean()
+        self.report_td_errors(batch, (q1_pred - q_target).detach())
 
         """
         Update Networks
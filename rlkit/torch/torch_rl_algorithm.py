@@ -1,19 +1,38 @@
 import abc
+import copy
 from collections import OrderedDict
 
 from typing import Iterable
+
+import torch
 from torch import nn as nn
 
 from rlkit.core.batch_rl_algorithm import BatchRLAlgorithm
 from rlkit.core.online_rl_algorithm import OnlineRLAlgorithm
 from rlkit.core.trainer import Trainer
+from rlkit.torch import pytorch_util as ptu
 from rlkit.torch.core import np_to_pytorch_batch
 
 
+def to_torch_batch(batch):
+    """
+    Convert a numpy batch to torch, unless it already is one, e.g. because
+    it was sampled from a TorchReplayBuffer.
+    """
+    if all(isinstance(v, torch.Tensor) for v in batch.values()):
+        return batch
+    return np_to_pytorch_batch(batch)
+
+
 class TorchOnlineRLAlgorithm(OnlineRLAlgorithm):
+    def _get_train_data_transform(self):
+        return to_torch_batch
+
     def to(self, device):
         for net in self.trainer.networks:
             net.to(device)
+        if hasattr(self.replay_buffer, 'to'):
+            self.replay_buffer.to(device)
 
     def training_mode(self, mode):
         for net in self.trainer.networks:
@@ -21,9 +40,14 @@ class TorchOnlineRLAlgorithm(OnlineRLAlgorithm):
 
 
 class TorchBatchRLAlgorithm(BatchRLAlgorithm):
+    def _get_train_data_transform(self):
+        return to_torch_batch
+
     def to(self, device):
         for net in self.trainer.networks:
             net.to(device)
+        if hasattr(self.replay_buffer, 'to'):
+            self.replay_buffer.to(device)
 
     def training_mode(self, mode):
         for net in self.trainer.networks:
@@ -33,12 +57,63 @@ class TorchBatchRLAlgorithm(BatchRLAlgorithm):
 class TorchTrainer(Trainer, metaclass=abc.ABCMeta):
     def __init__(self):
         self._num_train_steps = 0
+        self._td_error_callback = None
+
+    def set_td_error_callback(self, callback):
+        """
+        :param callback: Function called with (indices, td_errors) numpy
+        arrays whenever the trainer reports TD errors, e.g.
+        PrioritizedReplayBuffer.update_priorities.
+        """
+        self._td_error_callback = callback
+
+    def report_td_errors(self, batch, td_errors):
+        """
+        Hand the per-sample TD errors of `batch` back to whoever sampled it.
+        Does nothing if no callback is set or the batch has no indices.
+        """
+        if self._td_error_callback is None or 'indices' not in batch:
+            return
+        indices = ptu.get_numpy(batch['indices']).round().astype(int)
+        self._td_error_callback(
+            indices.flatten(),
+            ptu.get_numpy(td_errors).flatten(),
+        )
+
+    def compute_weighted_loss(self, criterion, pred, target, batch):
+        """
+        :return: `criterion(pred, target)`, or if the batch has `weights`,
+        e.g. the importance-sampling weights of prioritized replay, the mean
+        of the per-sample losses of the criterion times the weights.
+        """
+        weights = batch.get('weights', None)
+        if weights is None:
+            return criterion(pred, target)
+        assert hasattr(criterion, 'reduction'), (
+            "Weighted losses need a criterion with a `reduction`, like the "
+            "ones of torch.nn, but got {}".format(criterion)
+        )
+        per_sample_criterion = copy.copy(criterion)
+        per_sample_criterion.reduction = 'none'
+        return (weights * per_sample_criterion(pred, target)).mean()
 
     def train(self, np_batch):
         self._num_train_steps += 1
-        batch = np_to_pytorch_batch(np_batch)
+        batch = to_torch_batch(np_batch)
         self.train_from_torch(batch)
 
+    def train_batches(self, np_batches, num_batches):
+        """
+        Convert all of the stacked batches to torch at once and then only
+        index into them.
+        """
+        batches = to_torch_batch(np_batches)
+        for i in range(num_batches):
+            self._num_train_steps += 1
+            self.train_from_torch({
+                key: value[i] for key, value in batches.items()
+            })
+
     def get_diagnostics(self):
         return OrderedDict([
             ('num train calls', self._num_train_steps),
@@ -9,6 +9,7 @@ from torchvision.utils import save_image
 from multiworld.core.image_env import normalize_image
 from rlkit.core import logger
 from rlkit.core.eval_util import create_stats_ordered_dict
+from rlkit.data_management.weighted_sampler import WeightedSampler
 from rlkit.torch import pytorch_util as ptu
 from rlkit.torch.data import (
     ImageDataset,
@@ -34,11 +35,17 @@ def compute_log_p_log_q_log_d(
     data,
     decoder_distribution='bernoulli',
     num_latents_to_sample=1,
-    sampling_method='importance_sampling'
+    sampling_method='importance_sampling',
+    latent_distribution_params=None,
 ):
+    """
+    :param latent_distribution_params: model.encode(data), if it was already
+    computed.
+    """
     assert data.dtype == np.float64, 'images should be normalized'
     imgs = ptu.from_numpy(data)
-    latent_distribution_params = model.encode(imgs)
+    if latent_distribution_params is None:
+        latent_distribution_params = model.encode(imgs)
     batch_size = data.shape[0]
     representation_size = model.representation_size
     log_p, log_q, log_d = ptu.zeros((batch_size, num_latents_to_sample)), ptu.zeros(
@@ -83,7 +90,8 @@ def compute_p_x_np_to_np(
     power,
     decoder_distribution='bernoulli',
     num_latents_to_sample=1,
-    sampling_method='importance_sampling'
+    sampling_method='importance_sampling',
+    latent_distribution_params=None,
 ):
     assert data.dtype == np.float64, 'images should be normalized'
     assert power >= -1 and power <= 0, 'power for skew-fit should belong to [-1, 0]'
@@ -93,7 +101,8 @@ def compute_p_x_np_to_np(
         data,
         decoder_distribution,
         num_latents_to_sample,
-        sampling_method
+        sampling_method,
+        latent_distribution_params=latent_distribution_params,
     )
 
     if sampling_method == 'importance_sampling':
@@ -180,8 +189,10 @@ class ConvVAETrainer(object):
 
         if self.skew_dataset:
             self._train_weights = self._compute_train_weights()
+            self._train_sampler = WeightedSampler(self._train_weights)
         else:
             self._train_weights = None
+            self._train_sampler = None
 
         if use_parallel_dataloading:
             self.train_dataset_pt = ImageDataset(
@@ -241,6 +252,7 @@ class ConvVAETrainer(object):
     def update_train_weights(self):
         if self.skew_dataset:
             self._train_weights = self._compute_train_weights()
+            self._train_sampler = WeightedSampler(self._train_weights)
             if self.use_parallel_dataloading:
                 self.train_dataloader = DataLoader(
                     self.train_dataset_pt,
@@ -294,12 +306,7 @@ class ConvVAETrainer(object):
         if epoch is not None:
             skew = (self.start_skew_epoch < epoch)
         if train and self.skew_dataset and skew:
-            probs = self._train_weights / np.sum(self._train_weights)
-            ind = np.random.choice(
-                len(probs),
-                self.batch_size,
-                p=probs,
-            )
+            ind = self._train_sampler.sample(self.batch_size)
         else:
             ind = np.random.randint(0, len(dataset), self.batch_size)
         samples = normalize_image(dataset[ind, :])
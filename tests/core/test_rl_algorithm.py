@@ -0,0 +1,230 @@
+import csv
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+import gtimer as gt
+import numpy as np
+import torch
+from gym.spaces import Box
+from torch import nn
+
+from rlkit.core import logger
+from rlkit.core.async_evaluator import AsyncEvaluator
+from rlkit.core.batch_rl_algorithm import BatchRLAlgorithm
+from rlkit.core.trainer import Trainer
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.policies.base import Policy
+from rlkit.samplers.data_collector.path_collector import MdpPathCollector
+
+
+class RandomEnv(object):
+    observation_space = Box(-np.inf, np.inf, (2,))
+    action_space = Box(-1, 1, (1,))
+
+    def reset(self):
+        return np.random.randn(2)
+
+    def step(self, action):
+        return np.random.randn(2), np.random.randn(), False, {}
+
+
+class RandomPolicy(Policy):
+    def get_action(self, observation):
+        return np.random.uniform(-1, 1, 1), {}
+
+
+class ConstantPolicy(nn.Module, Policy):
+    def __init__(self, action):
+        super().__init__()
+        self.action = nn.Parameter(torch.tensor([action]))
+
+    def get_action(self, observation):
+        return self.action.detach().numpy().copy(), {}
+
+
+class CountingTrainer(Trainer):
+    def __init__(self):
+        self.num_train_steps = 0
+
+    def train(self, data):
+        self.num_train_steps += 1
+
+
+class BatchCountingTrainer(CountingTrainer):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def train(self, data):
+        super().train(data)
+        self.batch_sizes.append(len(data['observations']))
+
+
+class Algorithm(BatchRLAlgorithm):
+    def training_mode(self, mode):
+        pass
+
+
+def make_algorithm(num_epochs, replay_buffer_snapshot_gap=2, **kwargs):
+    env = RandomEnv()
+    algorithm_kwargs = dict(
+        trainer=CountingTrainer(),
+        exploration_env=env,
+        evaluation_env=env,
+        exploration_data_collector=MdpPathCollector(env, RandomPolicy()),
+        evaluation_data_collector=MdpPathCollector(env, RandomPolicy()),
+        replay_buffer=EnvReplayBuffer(1000, env),
+        batch_size=4,
+        max_path_length=5,
+        num_epochs=num_epochs,
+        num_eval_steps_per_epoch=5,
+        num_expl_steps_per_train_loop=10,
+        num_trains_per_train_loop=2,
+        replay_buffer_snapshot_gap=replay_buffer_snapshot_gap,
+    )
+    algorithm_kwargs.update(kwargs)
+    return Algorithm(**algorithm_kwargs)
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        # Every algorithm enters a new timed loop.
+        gt.reset_root()
+        snapshot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshot_dir)
+        self.addCleanup(logger.reset)
+        logger.reset()
+        logger.set_snapshot_dir(snapshot_dir)
+        logger.set_snapshot_mode('none')
+
+    def assert_same_buffer(self, buffer1, buffer2):
+        self.assertEqual(
+            buffer1.num_steps_can_sample(), buffer2.num_steps_can_sample()
+        )
+        self.assertEqual(buffer1._top, buffer2._top)
+        for name in buffer1._array_names:
+            np.testing.assert_array_equal(
+                buffer1._get_array(name), buffer2._get_array(name)
+            )
+
+    def test_resume_loads_replay_buffer(self):
+        # The buffer is saved after epochs 0 and 2.
+        algorithm = make_algorithm(num_epochs=3)
+        algorithm.train()
+        self.assertEqual(algorithm.replay_buffer.num_steps_can_sample(), 30)
+        gt.reset_root()
+
+        resumed_algorithm = make_algorithm(num_epochs=3)
+        resumed_algorithm.train(start_epoch=3)
+        self.assert_same_buffer(
+            algorithm.replay_buffer, resumed_algorithm.replay_buffer
+        )
+
+    def test_resume_continues_training(self):
+        make_algorithm(num_epochs=3).train()
+        gt.reset_root()
+        resumed_algorithm = make_algorithm(num_epochs=5)
+        resumed_algorithm.train(start_epoch=3)
+        self.assertEqual(
+            resumed_algorithm.replay_buffer.num_steps_can_sample(), 50
+        )
+        self.assertEqual(resumed_algorithm.trainer.num_train_steps, 4)
+
+    def test_older_snapshot_is_loaded(self):
+        # Only epoch 0 is saved with a gap of 2.
+        make_algorithm(num_epochs=2).train()
+        gt.reset_root()
+        resumed_algorithm = make_algorithm(num_epochs=2)
+        resumed_algorithm.train(start_epoch=2)
+        self.assertEqual(
+            resumed_algorithm.replay_buffer.num_steps_can_sample(), 10
+        )
+
+    def test_newer_snapshot_is_rejected(self):
+        make_algorithm(num_epochs=3).train()
+        gt.reset_root()
+        with self.assertRaises(ValueError):
+            make_algorithm(num_epochs=3).train(start_epoch=2)
+
+    def test_no_snapshot(self):
+        algorithm = make_algorithm(
+            num_epochs=3, replay_buffer_snapshot_gap=None
+        )
+        algorithm.train(start_epoch=1)
+        self.assertEqual(algorithm.replay_buffer.num_steps_can_sample(), 20)
+
+
+class TestBatchesPerSample(unittest.TestCase):
+    def setUp(self):
+        gt.reset_root()
+        self.addCleanup(logger.reset)
+        logger.reset()
+
+    def test_all_train_steps_are_taken(self):
+        algorithm = make_algorithm(
+            num_epochs=2,
+            replay_buffer_snapshot_gap=None,
+            num_batches_per_sample=3,
+            num_trains_per_train_loop=8,
+            trainer=BatchCountingTrainer(),
+        )
+        self.assertEqual(algorithm._get_batch_counts(), [3, 3, 2])
+        algorithm.train()
+        self.assertEqual(algorithm.trainer.batch_sizes, [4] * 16)
+
+
+class TestAsyncEval(unittest.TestCase):
+    def setUp(self):
+        gt.reset_root()
+        self.addCleanup(logger.reset)
+        logger.reset()
+
+    def test_each_epoch_evaluates_its_own_policy(self):
+        env = RandomEnv()
+        policy = ConstantPolicy(0.25)
+        evaluator = AsyncEvaluator(MdpPathCollector(env, policy), env)
+        self.addCleanup(evaluator.close)
+        evaluator.submit(0, max_path_length=5, num_steps=10)
+        with torch.no_grad():
+            policy.action.fill_(-0.5)
+        evaluator.submit(1, max_path_length=5, num_steps=10)
+        diagnostics = evaluator.get(1)[-1]
+        self.assertAlmostEqual(diagnostics['Actions Mean'], -0.5)
+        self.assertEqual(diagnostics['Num Paths'], 2)
+        self.assertAlmostEqual(evaluator.get(0)[-1]['Actions Mean'], 0.25)
+        # The evaluator's copy of the policy is separate.
+        self.assertEqual(policy.action.item(), -0.5)
+
+    def test_log_rows(self):
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_path = osp.join(log_dir, 'progress.csv')
+        logger.add_tabular_output(log_path)
+        env = RandomEnv()
+        algorithm = make_algorithm(
+            num_epochs=3,
+            replay_buffer_snapshot_gap=None,
+            evaluation_data_collector=MdpPathCollector(
+                env, ConstantPolicy(0.25)
+            ),
+            async_eval_max_staleness=1,
+        )
+        algorithm.train()
+        self.assertIsNone(algorithm.async_evaluator)
+        logger.remove_tabular_output(log_path)
+        with open(log_path) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['Epoch'] for row in rows], ['0', '1', '2'])
+        for row in rows:
+            self.assertEqual(float(row['evaluation/Actions Mean']), 0.25)
+            self.assertEqual(row['evaluation/Num Paths'], '1')
+            self.assertEqual(
+                row['exploration/num steps total'],
+                str(10 * (int(row['Epoch']) + 1)),
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import threading
+import unittest
+
+from rlkit.data_management.batch_prefetcher import BatchPrefetcher
+
+
+class Counter(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, num_batches):
+        self.calls.append(num_batches)
+        return len(self.calls), num_batches
+
+
+class TestBatchPrefetcher(unittest.TestCase):
+    def test_samples_in_order(self):
+        sample_fn = Counter()
+        prefetcher = BatchPrefetcher(
+            sample_fn, queue_size=2, transform=lambda x: ('t',) + x,
+        )
+        prefetcher.start([3, 3, 2])
+        samples = [prefetcher.get() for _ in range(3)]
+        prefetcher.stop()
+        self.assertEqual(samples, [('t', 1, 3), ('t', 2, 3), ('t', 3, 2)])
+        self.assertEqual(sample_fn.calls, [3, 3, 2])
+        self.assertEqual(prefetcher.get_diagnostics()['prefetch gets'], 3)
+
+    def test_stop_drops_unused_samples(self):
+        sample_fn = Counter()
+        prefetcher = BatchPrefetcher(sample_fn, queue_size=1)
+        prefetcher.start([1] * 100)
+        self.assertEqual(prefetcher.get(), (1, 1))
+        prefetcher.stop()
+        # Stopped before sampling everything ahead.
+        self.assertLess(len(sample_fn.calls), 100)
+        prefetcher.start([5])
+        self.assertEqual(prefetcher.get()[1], 5)
+        prefetcher.stop()
+
+    def test_errors_are_raised_by_get(self):
+        def sample_fn(num_batches):
+            raise ValueError("sampling failed")
+        prefetcher = BatchPrefetcher(sample_fn)
+        prefetcher.start([1])
+        with self.assertRaises(ValueError):
+            prefetcher.get()
+        prefetcher.stop()
+
+    def test_samples_in_background(self):
+        sampled = threading.Event()
+
+        def sample_fn(num_batches):
+            sampled.set()
+            return num_batches
+        prefetcher = BatchPrefetcher(sample_fn)
+        prefetcher.start([1])
+        self.assertTrue(sampled.wait(timeout=5))
+        self.assertEqual(prefetcher.get(), 1)
+        prefetcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os.path as osp
+import shutil
+import tempfile
+import unittest
+
+from rlkit.data_management.benchmark import BUFFER_TYPES, get_configs, main
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_report(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        output = osp.join(output_dir, 'report.json')
+        main([
+            '--output', output,
+            '--max-sizes', '100',
+            '--obs-dims', '3',
+            '--image-dims', '0,12',
+            '--batch-sizes', '8',
+            '--path-len', '10',
+            '--num-batches', '2',
+            '--repeats', '1',
+        ])
+        with open(output) as f:
+            report = json.load(f)
+        configs = list(
+            get_configs(BUFFER_TYPES, [100], [3], [0, 12], [8])
+        )
+        self.assertEqual(len(report['results']), len(configs))
+        for result in report['results']:
+            self.assertEqual(result['max_size'], 100)
+            self.assertEqual(result['path_len'], 10)
+            for key in [
+                'add_path_transitions_per_second',
+                'random_batch_batches_per_second',
+                'np_to_pytorch_batch_batches_per_second',
+            ]:
+                self.assertGreater(result[key], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from gym.spaces import Box
+
+from rlkit.data_management.memmap_replay_buffer import (
+    MemmapEnvReplayBuffer,
+)
+
+
+class Env(object):
+    observation_space = Box(-np.inf, np.inf, (2,))
+    action_space = Box(-1, 1, (1,))
+
+
+def make_path(path_len, first_value=0):
+    values = np.arange(first_value, first_value + path_len, dtype=np.float64)
+    return dict(
+        observations=np.repeat(values[:, None], 2, 1),
+        actions=values[:, None],
+        rewards=values[:, None],
+        next_observations=np.repeat(values[:, None] + 1, 2, 1),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+class TestMemmapEnvReplayBuffer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _make_buffer(self, **kwargs):
+        return MemmapEnvReplayBuffer(
+            10, Env(), directory=self.directory, **kwargs
+        )
+
+    def test_reopen(self):
+        replay_buffer = self._make_buffer()
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.add_path(make_path(4, first_value=10))
+        replay_buffer.end_epoch(0)
+        del replay_buffer
+
+        replay_buffer = self._make_buffer()
+        self.assertEqual(replay_buffer.num_steps_can_sample(), 8)
+        self.assertEqual(replay_buffer._top, 8)
+        np.testing.assert_array_equal(
+            replay_buffer._observations[:8, 0],
+            [0, 1, 2, 3, 10, 11, 12, 13],
+        )
+        replay_buffer.add_path(make_path(3, first_value=20))
+        self.assertEqual(replay_buffer._top, 1)
+        self.assertEqual(replay_buffer.num_steps_can_sample(), 10)
+        batch = replay_buffer.random_batch(50)
+        np.testing.assert_array_equal(
+            batch['next_observations'], batch['observations'] + 1
+        )
+
+    def test_no_reopen(self):
+        replay_buffer = self._make_buffer()
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.flush()
+        replay_buffer = self._make_buffer(reopen=False)
+        self.assertEqual(replay_buffer.num_steps_can_sample(), 0)
+        self.assertEqual(replay_buffer._top, 0)
+
+    def test_reopen_deduplicated_obs(self):
+        replay_buffer = self._make_buffer(deduplicate_obs=True)
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.flush()
+        replay_buffer = self._make_buffer(deduplicate_obs=True)
+        replay_buffer.add_path(make_path(4, first_value=10))
+        batch = replay_buffer.random_batch(50)
+        np.testing.assert_array_equal(
+            batch['next_observations'], batch['observations'] + 1
+        )
+
+    def test_reopen_keeps_episode_ids(self):
+        replay_buffer = self._make_buffer(n_step=3, discount=0.5)
+        replay_buffer.add_path(make_path(3))
+        replay_buffer.flush()
+        replay_buffer = self._make_buffer(n_step=3, discount=0.5)
+        replay_buffer.add_path(make_path(3, first_value=10))
+        # The last transition of the first path doesn't run into the second.
+        batch = replay_buffer._get_batch(np.array([2, 3]))
+        np.testing.assert_allclose(
+            batch['rewards'][:, 0], [2, 10 + 0.5 * 11 + 0.25 * 12]
+        )
+
+    def test_mismatched_shape_is_rejected(self):
+        replay_buffer = self._make_buffer()
+        replay_buffer.flush()
+        with self.assertRaises(AssertionError):
+            MemmapEnvReplayBuffer(20, Env(), directory=self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.obs_dict_replay_buffer import (
+    ObsDictRelabelingBuffer,
+)
+
+
+class GoalEnv(object):
+    observation_space = Dict(dict(
+        observation=Box(-np.inf, np.inf, (2,)),
+        desired_goal=Box(-np.inf, np.inf, (1,)),
+        achieved_goal=Box(-np.inf, np.inf, (1,)),
+        state_desired_goal=Box(-np.inf, np.inf, (1,)),
+    ))
+    action_space = Box(-1, 1, (1,))
+
+    def compute_rewards(self, actions, obs):
+        # Zero if the extra goal key was relabeled with the desired goal.
+        return -np.abs(
+            obs['state_desired_goal'] - obs['desired_goal']
+        ).sum(axis=1)
+
+
+def make_path(path_len, first_value=0):
+    """
+    Step t of the path has observation [v, v], where v = first_value + t.
+    Its achieved goal and state_desired_goal are its next observation's v.
+    """
+    values = np.arange(first_value, first_value + path_len + 1, dtype=float)
+
+    def obs_dict(values):
+        return dict(
+            observation=np.repeat(values[:, None], 2, 1),
+            desired_goal=np.full((len(values), 1), -1.),
+            achieved_goal=values[:, None],
+            state_desired_goal=values[:, None],
+        )
+    return dict(
+        observations=obs_dict(values[:-1]),
+        actions=values[:-1, None],
+        rewards=np.zeros((path_len, 1)),
+        next_observations=obs_dict(values[1:]),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+class TestGoalKeys(unittest.TestCase):
+    def test_unsaved_goal_key_is_rejected(self):
+        with self.assertRaises(AssertionError):
+            ObsDictRelabelingBuffer(
+                10, GoalEnv(), goal_keys=['state_desired_goal'],
+            )
+
+    def test_goal_keys_are_relabeled(self):
+        replay_buffer = ObsDictRelabelingBuffer(
+            50,
+            GoalEnv(),
+            fraction_goals_rollout_goals=0.,
+            internal_keys=['state_desired_goal'],
+            goal_keys=['state_desired_goal'],
+            reward_keys=['state_desired_goal'],
+        )
+        replay_buffer.add_path(make_path(10))
+        batch = replay_buffer.random_batch(100)
+        np.testing.assert_array_equal(batch['rewards'], 0)
+        # The future goals are reached at or after the next observation.
+        self.assertTrue(np.all(
+            batch['resampled_goals'][:, 0] >= batch['actions'][:, 0] + 1
+        ))
+
+
+class TestDeduplicateObs(unittest.TestCase):
+    def _make_buffers(self, max_size, **kwargs):
+        return [
+            ObsDictRelabelingBuffer(
+                max_size,
+                GoalEnv(),
+                deduplicate_obs=deduplicate_obs,
+                internal_keys=['state_desired_goal'],
+                goal_keys=['state_desired_goal'],
+                reward_keys=['state_desired_goal'],
+                **kwargs
+            )
+            for deduplicate_obs in [False, True]
+        ]
+
+    def test_same_batches(self):
+        replay_buffers = self._make_buffers(
+            23, fraction_goals_rollout_goals=0.2,
+            fraction_goals_env_goals=0.,
+        )
+        # The buffers wrap around, in the middle of a path.
+        for i in range(6):
+            for replay_buffer in replay_buffers:
+                replay_buffer.add_path(make_path(5, first_value=100 * i))
+        # Map every transition of the deduplicated buffer, which holds fewer
+        # of them, to its row in the other buffer.
+        dedup_indices = replay_buffers[1]._sample_indices(200)
+        indices = np.array([
+            np.flatnonzero(
+                replay_buffers[0]._obs['observation'][:, 0]
+                == replay_buffers[1]._obs['observation'][i, 0]
+            )[0]
+            for i in dedup_indices
+        ])
+        batches = []
+        for replay_buffer, idxs in zip(
+                replay_buffers, [indices, dedup_indices]
+        ):
+            np.random.seed(0)
+            batches.append(replay_buffer._get_batch(idxs))
+        for key in ['observations', 'actions', 'next_observations',
+                    'rewards', 'resampled_goals']:
+            np.testing.assert_array_equal(batches[0][key], batches[1][key])
+
+    def test_future_goals_stay_in_episode(self):
+        _, replay_buffer = self._make_buffers(
+            23, fraction_goals_rollout_goals=0.,
+        )
+        for i in range(6):
+            replay_buffer.add_path(make_path(5, first_value=100 * i))
+        batch = replay_buffer.random_batch(500)
+        np.testing.assert_array_equal(
+            batch['next_observations'], batch['observations'] + 1
+        )
+        steps = batch['actions'][:, 0]
+        goals = batch['resampled_goals'][:, 0]
+        self.assertTrue(np.all(goals >= steps + 1))
+        # Same path: at most its last next observation.
+        self.assertTrue(np.all(goals <= steps // 100 * 100 + 5))
+
+
+class DistanceGoalEnv(object):
+    """
+    GoalEnv whose compute_reward is the negative distance between the goals.
+    """
+    observation_space = Dict(dict(
+        observation=Box(-np.inf, np.inf, (2,)),
+        desired_goal=Box(-np.inf, np.inf, (1,)),
+        achieved_goal=Box(-np.inf, np.inf, (1,)),
+    ))
+    action_space = Box(-1, 1, (1,))
+
+    def __init__(self, batched=True):
+        self.batched = batched
+        self.num_calls = 0
+
+    def compute_reward(self, achieved_goal, desired_goal, info):
+        self.num_calls += 1
+        if not self.batched:
+            # Only works with one goal at a time.
+            return -float(np.linalg.norm(achieved_goal - desired_goal))
+        return -np.linalg.norm(achieved_goal - desired_goal, axis=-1)
+
+
+class TestRewards(unittest.TestCase):
+    def _make_buffer(self, env, **kwargs):
+        replay_buffer = ObsDictRelabelingBuffer(
+            50, env, fraction_goals_rollout_goals=0.5, **kwargs
+        )
+        replay_buffer.add_path(make_path(10))
+        return replay_buffer
+
+    def assert_distance_rewards(self, batch):
+        # The achieved goal of a transition is its next observation.
+        np.testing.assert_allclose(batch['rewards'][:, 0], -np.abs(
+            batch['next_observations'][:, 0] - batch['resampled_goals'][:, 0]
+        ))
+
+    def test_batched_compute_reward(self):
+        env = DistanceGoalEnv()
+        replay_buffer = self._make_buffer(env)
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+        # Once it's known to take batches, it's called once per batch.
+        num_calls = env.num_calls
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+        self.assertEqual(env.num_calls, num_calls + 1)
+
+    def test_per_sample_compute_reward(self):
+        env = DistanceGoalEnv(batched=False)
+        replay_buffer = self._make_buffer(env)
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+
+    def test_reward_fn(self):
+        def reward_fn(achieved_goals, desired_goals, info):
+            return -np.abs(achieved_goals - desired_goals).sum(axis=1)
+        env = DistanceGoalEnv()
+        replay_buffer = self._make_buffer(env, reward_fn=reward_fn)
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+        self.assertEqual(env.num_calls, 0)
+
+    def test_compute_rewards(self):
+        replay_buffer = self._make_buffer(
+            GoalEnv(),
+            internal_keys=['state_desired_goal'],
+            reward_keys=['state_desired_goal'],
+        )
+        # GoalEnv.compute_rewards uses state_desired_goal, which is the same
+        # as the achieved goal.
+        self.assert_distance_rewards(replay_buffer.random_batch(40))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import types
+import unittest
+
+import numpy as np
+
+try:
+    from rlkit.data_management.online_vae_replay_buffer import (
+        OnlineVaeRelabelingBuffer,
+        rows_equal,
+    )
+except ImportError:  # multiworld is not installed
+    OnlineVaeRelabelingBuffer = None
+
+
+@unittest.skipIf(OnlineVaeRelabelingBuffer is None, "needs multiworld")
+class TestGetUniqueImages(unittest.TestCase):
+    def setUp(self):
+        max_size = 40
+        path_len = 10
+        image_size = 12
+        images = np.random.randint(
+            0, 256, (max_size + 1, image_size), dtype=np.uint8
+        )
+        obs = images[:-1]
+        next_obs = images[1:].copy()
+        # The next observation of the last step isn't the first observation
+        # of the next episode.
+        last_steps = np.arange(path_len - 1, max_size, path_len)
+        next_obs[last_steps] = np.random.randint(
+            0, 256, (len(last_steps), image_size), dtype=np.uint8
+        )
+        goals = np.random.randint(
+            0, 256, (max_size // path_len, image_size), dtype=np.uint8
+        )
+        desired_goals = np.repeat(goals, path_len, 0)
+        # The goal changes halfway through the first episode.
+        desired_goals[5:10] = goals[1]
+        achieved_goals = next_obs.copy()
+        achieved_goals[3] = 0
+        self.buffer = types.SimpleNamespace(
+            max_size=max_size,
+            decoded_obs_key='image_observation',
+            decoded_desired_goal_key='image_desired_goal',
+            decoded_achieved_goal_key='image_achieved_goal',
+            _obs=dict(image_observation=obs),
+            _next_obs=dict(
+                image_observation=next_obs,
+                image_desired_goal=desired_goals,
+                image_achieved_goal=achieved_goals,
+            ),
+            _episode_ends=(np.arange(max_size) // path_len + 1) * path_len
+            % max_size,
+        )
+
+    def _get_unique_images(self, idxs):
+        images, image_idxs = OnlineVaeRelabelingBuffer._get_unique_images(
+            self.buffer, idxs
+        )
+        all_images = np.concatenate([
+            self.buffer._obs['image_observation'][idxs],
+            self.buffer._next_obs['image_observation'][idxs],
+            self.buffer._next_obs['image_desired_goal'][idxs],
+            self.buffer._next_obs['image_achieved_goal'][idxs],
+        ])
+        np.testing.assert_array_equal(images[image_idxs], all_images)
+        return images
+
+    def test_contiguous_rows(self):
+        images = self._get_unique_images(np.arange(40))
+        # 40 observations, 4 last next observations, 5 goals and the
+        # achieved goal that isn't the next observation.
+        self.assertEqual(len(images), 40 + 4 + 5 + 1)
+
+    def test_wrap_around(self):
+        images = self._get_unique_images(
+            np.union1d(np.arange(35, 40), np.arange(0, 4))
+        )
+        self.assertEqual(len(images), 9 + 2 + 2 + 1)
+
+    def test_scattered_rows(self):
+        idxs = np.sort(np.random.choice(40, 15, replace=False))
+        self._get_unique_images(idxs)
+
+    def test_rows_equal(self):
+        arr = np.arange(24, dtype=np.uint8).reshape(3, 8)
+        other = arr.copy()
+        other[1, 7] = 0
+        np.testing.assert_array_equal(
+            rows_equal(arr, other), [True, False, True]
+        )
+        np.testing.assert_array_equal(
+            rows_equal(arr[:, :3], other[:, :3]), [True, True, True]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
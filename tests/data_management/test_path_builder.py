@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from rlkit.data_management.path_builder import PathBuilder, dict_obs_to_list
+
+
+class TestPathBuilder(unittest.TestCase):
+    def _build(self, samples):
+        path_builder = PathBuilder()
+        for sample in samples:
+            path_builder.add_all(**sample)
+        return path_builder
+
+    def test_stacks_arrays(self):
+        obs = [np.random.randn(3) for _ in range(5)]
+        path_builder = self._build([
+            dict(observations=o, rewards=np.array([float(i)]))
+            for i, o in enumerate(obs)
+        ])
+        path = path_builder.get_all_stacked()
+        self.assertEqual(len(path_builder), 5)
+        np.testing.assert_array_equal(path['observations'], np.array(obs))
+        self.assertEqual(path['rewards'].shape, (5, 1))
+
+    def test_keeps_dtypes(self):
+        path = self._build([
+            dict(actions=np.ones(2, dtype=np.float32), terminals=False)
+            for _ in range(3)
+        ]).get_all_stacked()
+        self.assertEqual(path['actions'].dtype, np.float32)
+        self.assertEqual(path['terminals'].dtype, np.bool_)
+
+    def test_widens_instead_of_downcasting(self):
+        path = self._build([
+            dict(observations=np.zeros(2, dtype=np.float32)),
+            dict(observations=np.full(2, 1 / 3)),
+        ]).get_all_stacked()
+        self.assertEqual(path['observations'].dtype, np.float64)
+        self.assertEqual(path['observations'][1, 0], 1 / 3)
+
+    def test_dicts_are_stacked_per_key(self):
+        samples = [
+            dict(env_infos={'a': float(i), 'b': np.full(2, i)})
+            for i in range(4)
+        ]
+        path = self._build(samples).get_all_stacked()
+        np.testing.assert_array_equal(path['env_infos']['a'], np.arange(4))
+        self.assertEqual(path['env_infos']['b'].shape, (4, 2))
+        for step, sample in zip(
+                dict_obs_to_list(path['env_infos']), samples
+        ):
+            self.assertEqual(step['a'], sample['env_infos']['a'])
+
+    def test_empty_dicts(self):
+        path = self._build([dict(agent_infos={})] * 3).get_all_stacked()
+        self.assertEqual(dict_obs_to_list(path['agent_infos'], 3), [{}] * 3)
+
+    def test_unstackable_dicts_stay_lists(self):
+        changing_keys = [{'a': 1}, {'a': 1, 'b': 2}]
+        strings = [{'name': 'x'}, {'name': 'y'}]
+        shapes = [{'a': np.zeros(2)}, {'a': np.zeros(3)}]
+        for infos in [changing_keys, strings, shapes]:
+            path = self._build(
+                [dict(env_infos=info) for info in infos]
+            ).get_all_stacked()
+            self.assertEqual(path['env_infos'], infos)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box
+
+from rlkit.data_management.prioritized_replay_buffer import (
+    PrioritizedReplayBuffer,
+)
+
+
+class Env(object):
+    observation_space = Box(-np.inf, np.inf, (2,))
+    action_space = Box(-1, 1, (1,))
+
+
+def make_path(path_len, first_value=0):
+    values = np.arange(first_value, first_value + path_len, dtype=np.float64)
+    return dict(
+        observations=np.repeat(values[:, None], 2, 1),
+        actions=values[:, None],
+        rewards=values[:, None],
+        next_observations=np.repeat(values[:, None] + 1, 2, 1),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+    def test_weights(self):
+        replay_buffer = PrioritizedReplayBuffer(8, Env(), alpha=1., beta=1.)
+        replay_buffer.add_path(make_path(4))
+        td_errors = np.array([1., 2., 3., 4.])
+        replay_buffer.update_priorities(np.arange(4), td_errors)
+        batch = replay_buffer.random_batch(100)
+        indices = batch['indices'][:, 0]
+        priorities = td_errors + replay_buffer.epsilon
+        probs = priorities / priorities.sum()
+        # (N * P(i)) ** -beta, normalized by the largest weight.
+        expected_weights = (4 * probs) ** -1.
+        expected_weights /= expected_weights.max()
+        np.testing.assert_allclose(
+            batch['weights'][:, 0], expected_weights[indices], rtol=1e-6
+        )
+        np.testing.assert_array_equal(batch['actions'][:, 0], indices)
+
+    def test_new_samples_get_max_priority(self):
+        replay_buffer = PrioritizedReplayBuffer(8, Env(), alpha=1., beta=1.)
+        replay_buffer.add_path(make_path(2))
+        replay_buffer.update_priorities([0, 1], [3., 0.])
+        replay_buffer.add_path(make_path(1, first_value=2))
+        np.testing.assert_allclose(
+            replay_buffer._sum_tree[[0, 1, 2]],
+            np.array([3., 0., 3.]) + replay_buffer.epsilon,
+        )
+
+    def test_samples_follow_priorities(self):
+        np.random.seed(0)
+        replay_buffer = PrioritizedReplayBuffer(8, Env(), alpha=1.)
+        replay_buffer.add_path(make_path(3))
+        replay_buffer.update_priorities([0, 1, 2], [1., 0., 3.])
+        indices = replay_buffer.random_batch(4000)['indices'][:, 0]
+        counts = np.bincount(indices, minlength=8)
+        self.assertEqual(counts[1], 0)
+        self.assertEqual(counts[3:].sum(), 0)
+        self.assertAlmostEqual(counts[2] / counts[0], 3., delta=0.3)
+
+    def test_deduplicated_obs_never_samples_episode_ends(self):
+        replay_buffer = PrioritizedReplayBuffer(
+            10, Env(), deduplicate_obs=True,
+        )
+        for i in range(5):
+            replay_buffer.add_path(make_path(2, first_value=10 * i))
+        batch = replay_buffer.random_batch(1000)
+        np.testing.assert_array_equal(
+            batch['next_observations'], batch['observations'] + 1
+        )
+        self.assertTrue(np.all(batch['weights'] > 0))
+
+    def test_random_batches(self):
+        replay_buffer = PrioritizedReplayBuffer(8, Env())
+        replay_buffer.add_path(make_path(5))
+        batches = replay_buffer.random_batches(4, 3)
+        self.assertEqual(batches['weights'].shape, (3, 4, 1))
+        self.assertEqual(batches['indices'].shape, (3, 4, 1))
+        self.assertTrue(np.all(batches['indices'] < 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
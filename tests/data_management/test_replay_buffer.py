@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.obs_dict_replay_buffer import (
+    ObsDictRelabelingBuffer,
+)
+from rlkit.data_management.prioritized_replay_buffer import (
+    PrioritizedReplayBuffer,
+)
+from rlkit.data_management.replay_buffer import (
+    load_snapshot_metadata,
+    split_batch,
+)
+
+
+class Env(object):
+    observation_space = Box(-10, 10, (2,))
+    action_space = Box(-1, 1, (1,))
+
+
+class GoalEnv(object):
+    observation_space = Dict(dict(
+        observation=Box(-np.inf, np.inf, (2,)),
+        desired_goal=Box(-np.inf, np.inf, (1,)),
+        achieved_goal=Box(-np.inf, np.inf, (1,)),
+    ))
+    action_space = Box(-1, 1, (1,))
+
+    def compute_reward(self, achieved_goal, desired_goal, info):
+        return -np.abs(achieved_goal - desired_goal).sum(axis=-1)
+
+
+def make_path(path_len, first_value=0, dict_obs=False):
+    values = np.arange(first_value, first_value + path_len, dtype=np.float64)
+
+    def obs(values):
+        if dict_obs:
+            return dict(
+                observation=np.repeat(values[:, None], 2, 1),
+                desired_goal=np.zeros((len(values), 1)),
+                achieved_goal=values[:, None],
+            )
+        return np.repeat(values[:, None] / 10, 2, 1)
+    return dict(
+        observations=obs(values),
+        actions=values[:, None] / 100,
+        rewards=values[:, None],
+        next_observations=obs(values + 1),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+class TestSaveLoad(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = os.path.join(directory, 'replay_buffer_snapshot')
+
+    def _test_round_trip(self, make_buffer, dict_obs=False):
+        replay_buffer = make_buffer()
+        # The buffer wraps around.
+        for i in range(5):
+            replay_buffer.add_path(
+                make_path(4, first_value=10 * i, dict_obs=dict_obs)
+            )
+        replay_buffer.save(self.directory, extra_metadata=dict(epoch=3))
+        self.assertEqual(load_snapshot_metadata(self.directory)['epoch'], 3)
+
+        loaded_buffer = make_buffer()
+        loaded_buffer.load(self.directory)
+        self.assertEqual(loaded_buffer._top, replay_buffer._top)
+        self.assertEqual(
+            loaded_buffer.num_steps_can_sample(),
+            replay_buffer.num_steps_can_sample(),
+        )
+        for name in replay_buffer._array_names:
+            np.testing.assert_array_equal(
+                loaded_buffer._get_array(name),
+                replay_buffer._get_array(name),
+                err_msg=name,
+            )
+        indices = replay_buffer._sample_indices(50)
+        batch = replay_buffer._get_batch(indices)
+        loaded_batch = loaded_buffer._get_batch(indices)
+        for key in batch:
+            np.testing.assert_array_equal(loaded_batch[key], batch[key])
+        return replay_buffer, loaded_buffer
+
+    def test_env_replay_buffer(self):
+        self._test_round_trip(lambda: EnvReplayBuffer(15, Env()))
+
+    def test_deduplicate_obs_and_n_step(self):
+        replay_buffer, loaded_buffer = self._test_round_trip(
+            lambda: EnvReplayBuffer(
+                15, Env(), deduplicate_obs=True, n_step=3, discount=0.9,
+            )
+        )
+        # The mirror row isn't saved but restored.
+        np.testing.assert_array_equal(
+            loaded_buffer._obs_storage[-1], loaded_buffer._obs_storage[0]
+        )
+        self.assertEqual(loaded_buffer._episode_id, replay_buffer._episode_id)
+
+    def test_quantized(self):
+        self._test_round_trip(lambda: EnvReplayBuffer(
+            15, Env(), dtypes=dict(observations=np.uint8, rewards=np.float16),
+        ))
+
+    def test_prioritized_replay_buffer(self):
+        def make_buffer():
+            return PrioritizedReplayBuffer(15, Env())
+        replay_buffer = make_buffer()
+        replay_buffer.add_path(make_path(6))
+        replay_buffer.update_priorities(np.arange(6), np.arange(6) + 1.)
+        replay_buffer.save(self.directory)
+        loaded_buffer = make_buffer()
+        loaded_buffer.load(self.directory)
+        np.testing.assert_array_equal(
+            loaded_buffer._sum_tree._tree, replay_buffer._sum_tree._tree
+        )
+        np.testing.assert_array_equal(
+            loaded_buffer._min_tree._tree, replay_buffer._min_tree._tree
+        )
+        self.assertEqual(
+            loaded_buffer._max_priority, replay_buffer._max_priority
+        )
+
+    def test_obs_dict_replay_buffer(self):
+        self._test_round_trip(
+            lambda: ObsDictRelabelingBuffer(
+                15, GoalEnv(), deduplicate_obs=True,
+            ),
+            dict_obs=True,
+        )
+
+    def test_snapshot_is_replaced(self):
+        replay_buffer = EnvReplayBuffer(15, Env())
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.save(self.directory)
+        replay_buffer.add_path(make_path(4, first_value=10))
+        replay_buffer.save(self.directory)
+        self.assertFalse(os.path.exists(self.directory + '.tmp'))
+        self.assertFalse(os.path.exists(self.directory + '.old'))
+        loaded_buffer = EnvReplayBuffer(15, Env())
+        loaded_buffer.load(self.directory)
+        self.assertEqual(loaded_buffer.num_steps_can_sample(), 8)
+        self.assertEqual(load_snapshot_metadata(self.directory), {})
+
+
+class TestRandomBatches(unittest.TestCase):
+    def test_shapes(self):
+        replay_buffer = EnvReplayBuffer(15, Env(), n_step=2, discount=0.9)
+        replay_buffer.add_path(make_path(10))
+        batches = replay_buffer.random_batches(4, 3)
+        self.assertEqual(batches['observations'].shape, (3, 4, 2))
+        self.assertEqual(batches['rewards'].shape, (3, 4, 1))
+        self.assertEqual(batches['discounts'].shape, (3, 4, 1))
+
+    def test_split_batch(self):
+        batch = dict(
+            observations=np.arange(12).reshape(6, 2),
+            image_fields=np.array(['observations'], dtype=object),
+        )
+        batches = split_batch(batch, 3)
+        np.testing.assert_array_equal(
+            batches['observations'][1], [[4, 5], [6, 7]]
+        )
+        self.assertIs(batches['image_fields'], batch['image_fields'])
+
+    def test_obs_dict_replay_buffer(self):
+        replay_buffer = ObsDictRelabelingBuffer(
+            15, GoalEnv(), fraction_goals_rollout_goals=0.5,
+        )
+        replay_buffer.add_path(make_path(10, dict_obs=True))
+        batches = replay_buffer.random_batches(4, 3)
+        self.assertEqual(batches['observations'].shape, (3, 4, 2))
+        self.assertEqual(batches['resampled_goals'].shape, (3, 4, 1))
+        # Every batch has its share of rollout goals, which are all 0.
+        np.testing.assert_array_equal(
+            batches['resampled_goals'][:, :2], 0
+        )
+        self.assertTrue(np.all(batches['resampled_goals'][:, 2:] > 0))
+
+
+class TestDiagnostics(unittest.TestCase):
+    def test_call_stats(self):
+        # PrioritizedReplayBuffer.add_path calls EnvReplayBuffer.add_path,
+        # which calls SimpleReplayBuffer.add_path.
+        replay_buffer = PrioritizedReplayBuffer(20, Env())
+        for _ in range(3):
+            replay_buffer.add_path(make_path(4))
+        replay_buffer.random_batch(8)
+        replay_buffer.random_batches(8, 2)
+        stats = replay_buffer.get_diagnostics()
+        self.assertEqual(stats['add_path calls'], 3)
+        self.assertEqual(stats['add_path transitions'], 12)
+        self.assertEqual(stats['random_batch calls'], 2)
+        self.assertEqual(stats['random_batch transitions'], 24)
+        self.assertGreater(stats['random_batch transitions/s'], 0)
+
+    def test_memory_stats(self):
+        replay_buffer = EnvReplayBuffer(20, Env())
+        stats = replay_buffer.get_diagnostics()
+        # Two float32 observation arrays, actions and rewards, and uint8
+        # terminals.
+        self.assertEqual(
+            stats['allocated bytes'], 20 * (4 * (2 + 2 + 1 + 1) + 1)
+        )
+        self.assertEqual(stats['allocated bytes/observations'], 20 * 2 * 4)
+        self.assertEqual(stats['resident bytes'], 0)
+        replay_buffer.add_path(make_path(5))
+        self.assertEqual(
+            replay_buffer.get_diagnostics()['resident bytes'],
+            stats['allocated bytes'] // 4,
+        )
+        self.assertEqual(replay_buffer.get_diagnostics()['size'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
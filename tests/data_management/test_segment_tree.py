@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+
+from rlkit.data_management.segment_tree import (
+    MinSegmentTree,
+    SumSegmentTree,
+)
+
+
+class TestSumSegmentTree(unittest.TestCase):
+    def test_find_prefixsum_idx(self):
+        tree = SumSegmentTree(5)
+        tree[np.arange(5)] = [1., 0., 2., 0., 3.]
+        self.assertEqual(tree.reduce(), 6.)
+        np.testing.assert_array_equal(
+            tree.find_prefixsum_idx([0., 0.5, 1., 2.9, 3., 5.99]),
+            [0, 0, 2, 2, 4, 4],
+        )
+
+    def test_boundaries_skip_zero_leaves(self):
+        tree = SumSegmentTree(8)
+        # The last leaves were never written.
+        tree[np.arange(3)] = [1., 1., 0.]
+        np.testing.assert_array_equal(
+            tree.find_prefixsum_idx([1., 2., 2. + 1e-9]), [1, 1, 1]
+        )
+
+    def test_rounded_prefixsums(self):
+        tree = SumSegmentTree(1000)
+        priorities = np.random.uniform(size=999) ** 3
+        priorities[::7] = 0
+        tree[np.arange(999)] = priorities
+        prefixsums = np.linspace(0, tree.reduce(), 10000)
+        idxs = tree.find_prefixsum_idx(prefixsums)
+        self.assertTrue(np.all(priorities[idxs] > 0))
+        # Same as searching the cumulative sums.
+        expected = np.searchsorted(
+            np.cumsum(priorities), prefixsums[:-1], side='right'
+        )
+        np.testing.assert_array_equal(idxs[:-1], expected)
+        self.assertEqual(idxs[-1], np.flatnonzero(priorities)[-1])
+
+
+class TestMinSegmentTree(unittest.TestCase):
+    def test_reduce(self):
+        tree = MinSegmentTree(6)
+        tree[np.arange(6)] = [3., 2., 5., 4., 6., 7.]
+        self.assertEqual(tree.reduce(), 2.)
+        tree[[1]] = [8.]
+        self.assertEqual(tree.reduce(), 3.)
+        np.testing.assert_array_equal(tree[[0, 1]], [3., 8.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import multiprocessing as mp
+import unittest
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+from rlkit.data_management.shared_obs_dict_replay_buffer import (
+    SharedObsDictRelabelingBuffer,
+)
+
+
+class GoalEnv(object):
+    observation_space = Dict(dict(
+        observation=Box(-np.inf, np.inf, (3,)),
+        desired_goal=Box(-np.inf, np.inf, (2,)),
+        achieved_goal=Box(-np.inf, np.inf, (2,)),
+    ))
+    action_space = Box(-1, 1, (1,))
+
+    def compute_reward(self, achieved_goal, desired_goal, info):
+        return -np.abs(achieved_goal - desired_goal).sum(axis=-1)
+
+
+def make_path(value, path_len):
+    """
+    Path whose every field is `value`, so that a transition mixing two paths
+    is easy to spot.
+    """
+    def obs_dict():
+        return dict(
+            observation=np.full((path_len, 3), value),
+            desired_goal=np.full((path_len, 2), value),
+            achieved_goal=np.full((path_len, 2), value),
+        )
+    return dict(
+        observations=obs_dict(),
+        actions=np.full((path_len, 1), value),
+        rewards=np.zeros((path_len, 1)),
+        next_observations=obs_dict(),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+def add_paths(replay_buffer, first_value, num_paths):
+    for value in range(first_value, first_value + num_paths):
+        replay_buffer.add_path(make_path(value, 7))
+
+
+class TestSharedMemoryMode(unittest.TestCase):
+    def _make_buffer(self, **kwargs):
+        replay_buffer = SharedObsDictRelabelingBuffer(
+            50, GoalEnv(), use_shared_memory=True, **kwargs
+        )
+        self.addCleanup(replay_buffer.close)
+        return replay_buffer
+
+    def assert_consistent(self, batch):
+        values = batch['actions']
+        for key in ['observations', 'next_observations', 'resampled_goals']:
+            np.testing.assert_array_equal(
+                batch[key], np.repeat(values, batch[key].shape[1], 1)
+            )
+        np.testing.assert_array_equal(batch['rewards'], 0)
+
+    def _test_concurrent_writers(self, **kwargs):
+        replay_buffer = self._make_buffer(**kwargs)
+        add_paths(replay_buffer, 1, 1)
+        processes = [
+            mp.Process(target=add_paths, args=(replay_buffer, 1000 * i, 20))
+            for i in range(1, 4)
+        ]
+        for process in processes:
+            process.start()
+        # The parent keeps writing too, since _top is shared.
+        add_paths(replay_buffer, 5000, 20)
+        while any(process.is_alive() for process in processes):
+            self.assert_consistent(replay_buffer.random_batch(32))
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(replay_buffer.num_steps_can_sample(), 50)
+        self.assertFalse(np.any(replay_buffer._row_versions % 2))
+        self.assert_consistent(replay_buffer.random_batch(256))
+        return replay_buffer
+
+    def test_concurrent_writers(self):
+        replay_buffer = self._test_concurrent_writers()
+        self.assertEqual(replay_buffer._top, 81 * 7 % 50)
+
+    def test_concurrent_writers_deduplicate_obs(self):
+        replay_buffer = self._test_concurrent_writers(deduplicate_obs=True)
+        self.assertEqual(replay_buffer._top, 81 * 8 % 50)
+
+    def test_future_goals(self):
+        replay_buffer = self._make_buffer(fraction_goals_rollout_goals=0.)
+        add_paths(replay_buffer, 1, 10)
+        self.assert_consistent(replay_buffer.random_batch(256))
+
+    def test_torn_rows_are_resampled(self):
+        replay_buffer = self._make_buffer()
+        add_paths(replay_buffer, 1, 10)
+        original_get_batch = replay_buffer._get_batch
+
+        def get_batch_during_write(indices):
+            # Another writer starts on all rows while the batch is gathered.
+            replay_buffer._row_versions[:] += 2
+            replay_buffer._get_batch = original_get_batch
+            batch = original_get_batch(indices)
+            batch['actions'][:] = -1
+            return batch
+        replay_buffer._get_batch = get_batch_during_write
+        batch = replay_buffer.random_batch(32)
+        self.assertFalse(np.any(batch['actions'] == -1))
+        self.assert_consistent(batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
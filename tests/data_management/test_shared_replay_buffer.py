@@ -0,0 +1,115 @@
+import multiprocessing as mp
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from rlkit.data_management.shared_replay_buffer import (
+    SharedSimpleReplayBuffer,
+    commit_rows,
+    reserve_rows,
+)
+
+
+def make_path(value, path_len, observation_dim=3):
+    """
+    Path whose every field is `value`, so that a transition mixing two paths
+    is easy to spot.
+    """
+    return dict(
+        observations=np.full((path_len, observation_dim), value),
+        actions=np.full((path_len, 1), value),
+        rewards=np.full((path_len, 1), value),
+        next_observations=np.full((path_len, observation_dim), value),
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+def add_paths(replay_buffer, first_value, num_paths):
+    for value in range(first_value, first_value + num_paths):
+        replay_buffer.add_path(make_path(value, 7))
+
+
+class TestSharedSimpleReplayBuffer(unittest.TestCase):
+    def setUp(self):
+        self.replay_buffer = SharedSimpleReplayBuffer(
+            max_replay_buffer_size=50,
+            observation_dim=3,
+            action_dim=1,
+            env_info_sizes={},
+        )
+
+    def tearDown(self):
+        self.replay_buffer.close()
+
+    def assert_consistent(self, batch):
+        for key in ['observations', 'actions', 'next_observations']:
+            np.testing.assert_array_equal(
+                batch[key], np.repeat(batch['rewards'], batch[key].shape[1], 1)
+            )
+
+    def test_writes_from_other_processes(self):
+        processes = [
+            mp.Process(
+                target=add_paths, args=(self.replay_buffer, 1000 * i, 20)
+            )
+            for i in range(1, 4)
+        ]
+        for process in processes:
+            process.start()
+        while any(process.is_alive() for process in processes):
+            if self.replay_buffer.num_steps_can_sample() > 0:
+                self.assert_consistent(self.replay_buffer.random_batch(32))
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(self.replay_buffer.num_steps_can_sample(), 50)
+        self.assertEqual(self.replay_buffer._top, 3 * 20 * 7 % 50)
+        self.assertFalse(np.any(self.replay_buffer._row_versions % 2))
+        self.assert_consistent(self.replay_buffer.random_batch(256))
+
+    def test_overlapping_reservations(self):
+        lock = mp.Lock()
+        pointers = np.zeros(3, dtype=np.int64)
+        row_versions = np.zeros(10, dtype=np.int64)
+        top_a, version_a = reserve_rows(lock, pointers, row_versions, 8)
+        # Wraps around onto the rows that are still being written.
+        top_b, version_b = reserve_rows(lock, pointers, row_versions, 6)
+        self.assertEqual(top_b, 8)
+        commit_rows(lock, row_versions, top_a, 8, version_a)
+        np.testing.assert_array_equal(
+            row_versions % 2, [1, 1, 1, 1, 0, 0, 0, 0, 1, 1]
+        )
+        commit_rows(lock, row_versions, top_b, 6, version_b)
+        self.assertFalse(np.any(row_versions % 2))
+        self.assertEqual(pointers[1], 10)
+
+    def test_row_versions_are_not_buffer_data(self):
+        add_paths(self.replay_buffer, 1, 2)
+        stats = self.replay_buffer.get_diagnostics()
+        self.assertNotIn('allocated bytes/row_versions', stats)
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_dir = os.path.join(directory, 'buffer')
+            self.replay_buffer.save(snapshot_dir)
+            self.assertNotIn(
+                '_row_versions.npy', os.listdir(snapshot_dir)
+            )
+            other_buffer = SharedSimpleReplayBuffer(
+                max_replay_buffer_size=50,
+                observation_dim=3,
+                action_dim=1,
+                env_info_sizes={},
+            )
+            try:
+                other_buffer.load(snapshot_dir)
+                self.assertEqual(other_buffer.num_steps_can_sample(), 14)
+                self.assert_consistent(other_buffer.random_batch(32))
+            finally:
+                other_buffer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
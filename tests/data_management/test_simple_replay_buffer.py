@@ -0,0 +1,197 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box, Discrete
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.replay_buffer import ReplayBuffer
+
+
+class Env(object):
+    def __init__(self, action_space=None):
+        self.observation_space = Box(-np.inf, np.inf, (2,))
+        if action_space is None:
+            action_space = Box(-1, 1, (1,))
+        self.action_space = action_space
+
+
+def make_path(path_len, first_value=0, terminal=False, discrete=False):
+    """
+    Step t of the path has observation [v, v] and reward v, where
+    v = first_value + t.
+    """
+    values = np.arange(first_value, first_value + path_len, dtype=np.float64)
+    terminals = np.zeros((path_len, 1))
+    terminals[-1] = terminal
+    if discrete:
+        actions = np.arange(path_len) % 3
+    else:
+        actions = values[:, None]
+    return dict(
+        observations=np.repeat(values[:, None], 2, 1),
+        actions=actions,
+        rewards=values[:, None],
+        next_observations=np.repeat(values[:, None] + 1, 2, 1),
+        terminals=terminals,
+        agent_infos=[{}] * path_len,
+        env_infos=[dict(info=v) for v in values],
+    )
+
+
+def assert_same_contents(test, buffer1, buffer2):
+    test.assertEqual(buffer1._top, buffer2._top)
+    test.assertEqual(buffer1._size, buffer2._size)
+    for name in buffer1._array_names:
+        np.testing.assert_array_equal(
+            buffer1._get_array(name), buffer2._get_array(name), err_msg=name
+        )
+
+
+class TestAddPath(unittest.TestCase):
+    def _test_same_as_add_sample(self, env=None, discrete=False, **kwargs):
+        if env is None:
+            env = Env()
+        replay_buffers = [
+            EnvReplayBuffer(
+                13, env, env_info_sizes=dict(info=1), **kwargs
+            )
+            for _ in range(2)
+        ]
+        # The buffer wraps around in the middle of the third path.
+        for i, path_len in enumerate([4, 5, 6, 1, 7]):
+            path = make_path(
+                path_len, first_value=10 * i, terminal=i % 2 == 0,
+                discrete=discrete,
+            )
+            replay_buffers[0].add_path(path)
+            ReplayBuffer.add_path(replay_buffers[1], path)
+            assert_same_contents(self, *replay_buffers)
+        return replay_buffers
+
+    def test_same_as_add_sample(self):
+        self._test_same_as_add_sample()
+
+    def test_discrete_actions(self):
+        replay_buffer, _ = self._test_same_as_add_sample(
+            env=Env(Discrete(3)), discrete=True,
+        )
+        self.assertEqual(replay_buffer._actions.shape, (13, 3))
+
+    def test_action_indices(self):
+        replay_buffer, _ = self._test_same_as_add_sample(
+            env=Env(Discrete(3)), discrete=True, store_action_indices=True,
+        )
+        self.assertEqual(replay_buffer._actions.shape, (13, 1))
+        self.assertEqual(replay_buffer._actions.dtype, np.uint8)
+
+    def test_n_step_episode_ids(self):
+        self._test_same_as_add_sample(n_step=3, discount=0.5)
+
+
+class TestDeduplicateObs(unittest.TestCase):
+    def test_same_as_add_sample(self):
+        TestAddPath._test_same_as_add_sample(self, deduplicate_obs=True)
+
+    def test_same_batches(self):
+        replay_buffers = [
+            EnvReplayBuffer(13, Env(), deduplicate_obs=deduplicate_obs)
+            for deduplicate_obs in [False, True]
+        ]
+        for i in range(4):
+            for replay_buffer in replay_buffers:
+                replay_buffer.add_path(make_path(4, first_value=10 * i))
+        batch = replay_buffers[1].random_batch(200)
+        np.testing.assert_array_equal(
+            batch['next_observations'], batch['observations'] + 1
+        )
+        np.testing.assert_array_equal(
+            batch['rewards'][:, 0], batch['observations'][:, 0]
+        )
+        # Only the last episode end is left out, since it's in the extra row.
+        self.assertEqual(
+            set(batch['observations'][:, 0]),
+            set(replay_buffers[1]._observations[
+                replay_buffers[1]._valid.astype(bool), 0
+            ]),
+        )
+
+    def test_mirror_row_after_wrap_around(self):
+        replay_buffer = EnvReplayBuffer(5, Env(), deduplicate_obs=True)
+        replay_buffer.add_path(make_path(3))
+        replay_buffer.add_path(make_path(3, first_value=10))
+        np.testing.assert_array_equal(
+            replay_buffer._obs_storage[-1], replay_buffer._obs_storage[0]
+        )
+        # The transition in the last row has its next observation in row 0.
+        batch = replay_buffer._get_batch(np.array([4]))
+        np.testing.assert_array_equal(batch['observations'], [[10., 10.]])
+        np.testing.assert_array_equal(
+            batch['next_observations'], [[11., 11.]]
+        )
+
+
+class TestNStep(unittest.TestCase):
+    def _make_buffer(self, max_size=20, **kwargs):
+        return EnvReplayBuffer(
+            max_size, Env(), n_step=3, discount=0.5, **kwargs
+        )
+
+    def test_returns(self):
+        replay_buffer = self._make_buffer()
+        replay_buffer.add_path(make_path(5))
+        batch = replay_buffer._get_batch(np.arange(5))
+        # Steps 3 and 4 are cut short by the end of the episode.
+        np.testing.assert_allclose(batch['rewards'][:, 0], [
+            0 + 0.5 * 1 + 0.25 * 2,
+            1 + 0.5 * 2 + 0.25 * 3,
+            2 + 0.5 * 3 + 0.25 * 4,
+            3 + 0.5 * 4,
+            4,
+        ])
+        np.testing.assert_allclose(
+            batch['discounts'][:, 0], [0.125, 0.125, 0.125, 0.25, 0.5]
+        )
+        np.testing.assert_array_equal(
+            batch['next_observations'][:, 0], [3, 4, 5, 5, 5]
+        )
+        np.testing.assert_array_equal(batch['observations'][:, 0], range(5))
+
+    def test_terminal(self):
+        replay_buffer = self._make_buffer()
+        replay_buffer.add_path(make_path(3, terminal=True))
+        replay_buffer.add_path(make_path(3, first_value=10))
+        batch = replay_buffer._get_batch(np.array([1, 2]))
+        np.testing.assert_allclose(batch['rewards'][:, 0], [1 + 0.5 * 2, 2])
+        np.testing.assert_array_equal(batch['terminals'][:, 0], [1, 1])
+        np.testing.assert_allclose(batch['discounts'][:, 0], [0.25, 0.5])
+
+    def test_write_head(self):
+        replay_buffer = self._make_buffer(max_size=6)
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.add_path(make_path(4, first_value=10))
+        # Rows 0 and 1 were overwritten by the second path, so its last
+        # transition in row 1 stops at the write head in row 2.
+        batch = replay_buffer._get_batch(np.array([0, 1]))
+        np.testing.assert_allclose(
+            batch['rewards'][:, 0], [12 + 0.5 * 13, 13]
+        )
+        # The first path's rows 2 and 3 are still from its own episode.
+        batch = replay_buffer._get_batch(np.array([2]))
+        np.testing.assert_allclose(batch['rewards'][:, 0], [2 + 0.5 * 3])
+
+    def test_deduplicate_obs(self):
+        replay_buffer = self._make_buffer(deduplicate_obs=True)
+        replay_buffer.add_path(make_path(4))
+        replay_buffer.add_path(make_path(4, first_value=10))
+        batch = replay_buffer._get_batch(np.array([2, 3, 5]))
+        np.testing.assert_allclose(
+            batch['rewards'][:, 0],
+            [2 + 0.5 * 3, 3, 10 + 0.5 * 11 + 0.25 * 12],
+        )
+        np.testing.assert_array_equal(
+            batch['next_observations'][:, 0], [4, 4, 13]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.storage import (
+    AffineQuantizer,
+    get_action_index_dtypes,
+)
+
+
+class Env(object):
+    observation_space = Box(-2, 2, (3,))
+    action_space = Box(-1, 1, (1,))
+
+
+def make_path(path_len):
+    obs = np.random.uniform(-2, 2, (path_len + 1, 3))
+    return dict(
+        observations=obs[:-1],
+        actions=np.random.uniform(-1, 1, (path_len, 1)),
+        rewards=np.random.randn(path_len, 1),
+        next_observations=obs[1:],
+        terminals=np.zeros((path_len, 1)),
+        agent_infos=[{}] * path_len,
+        env_infos=[{}] * path_len,
+    )
+
+
+class TestAffineQuantizer(unittest.TestCase):
+    def test_round_trip(self):
+        quantizer = AffineQuantizer([-2., 0.], [2., 1.])
+        x = np.random.uniform([-2., 0.], [2., 1.], (100, 2))
+        q = quantizer.quantize(x)
+        self.assertEqual(q.dtype, np.uint8)
+        # At most half a step of the wider range.
+        np.testing.assert_allclose(quantizer.dequantize(q), x, atol=2 / 255)
+
+    def test_clips_out_of_bounds(self):
+        quantizer = AffineQuantizer([0.], [1.])
+        np.testing.assert_array_equal(
+            quantizer.quantize([[-1.], [2.]]), [[0], [255]]
+        )
+
+    def test_infinite_bounds_are_rejected(self):
+        with self.assertRaises(AssertionError):
+            AffineQuantizer([-np.inf], [np.inf])
+
+
+class TestStorageDtypes(unittest.TestCase):
+    def test_batches_are_float32(self):
+        replay_buffer = EnvReplayBuffer(20, Env(), dtypes=dict(
+            observations=np.uint8,
+            actions=np.float16,
+            rewards=np.float16,
+        ))
+        self.assertEqual(replay_buffer._observations.dtype, np.uint8)
+        self.assertEqual(replay_buffer._actions.dtype, np.float16)
+        path = make_path(10)
+        replay_buffer.add_path(path)
+        batch = replay_buffer._get_batch(np.arange(10))
+        for key in ['observations', 'actions', 'rewards', 'next_observations']:
+            self.assertEqual(batch[key].dtype, np.float32, key)
+        np.testing.assert_allclose(
+            batch['observations'], path['observations'], atol=2 / 255
+        )
+        np.testing.assert_allclose(
+            batch['next_observations'], path['next_observations'],
+            atol=2 / 255,
+        )
+        np.testing.assert_allclose(
+            batch['rewards'], path['rewards'], rtol=1e-3, atol=1e-3
+        )
+
+    def test_default_is_float32(self):
+        replay_buffer = EnvReplayBuffer(20, Env())
+        self.assertEqual(replay_buffer._observations.dtype, np.float32)
+        self.assertEqual(replay_buffer._rewards.dtype, np.float32)
+
+    def test_action_index_dtypes(self):
+        self.assertEqual(
+            get_action_index_dtypes(None, 256)['actions'], np.uint8
+        )
+        self.assertEqual(
+            get_action_index_dtypes(None, 257)['actions'], np.uint16
+        )
+        self.assertEqual(
+            get_action_index_dtypes(dict(actions=np.int64), 3)['actions'],
+            np.int64,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+
+from rlkit.data_management.weighted_sampler import WeightedSampler
+
+
+class TestWeightedSampler(unittest.TestCase):
+    def test_same_as_np_random_choice(self):
+        weights = np.random.uniform(size=100) ** 4
+        sampler = WeightedSampler(weights)
+        np.random.seed(0)
+        indices = sampler.sample(1000)
+        np.random.seed(0)
+        expected = np.random.choice(
+            len(weights), 1000, p=weights / weights.sum()
+        )
+        np.testing.assert_array_equal(indices, expected)
+
+    def test_zero_weights_are_never_sampled(self):
+        weights = np.array([0., 1., 0., 0., 2., 0., 0.])
+        indices = WeightedSampler(weights).sample(10000)
+        self.assertEqual(set(indices), {1, 4})
+        self.assertAlmostEqual(np.mean(indices == 4), 2 / 3, delta=0.03)
+
+    def test_indices_in_range(self):
+        np.random.seed(0)
+        weights = np.full(10 ** 5, 1e-3)
+        indices = WeightedSampler(weights).sample(10 ** 6)
+        self.assertTrue(np.all(indices < len(weights)))
+        self.assertEqual(len(WeightedSampler(weights)), len(weights))
+
+    def test_invalid_weights(self):
+        with self.assertRaises(AssertionError):
+            WeightedSampler([0., 0.])
+        with self.assertRaises(AssertionError):
+            WeightedSampler([1., -1.])
+
+
+if __name__ == '__main__':
+    unittest.main()
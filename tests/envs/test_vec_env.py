@@ -0,0 +1,140 @@
+import functools
+import unittest
+
+import numpy as np
+from gym.spaces import Box, Dict
+
+from rlkit.envs.vec_env import SubprocVecEnv, VecEnv
+
+
+class CounterEnv(object):
+    """
+    Observation is [seed, t, sum of actions]. Terminates after `seed + 2`
+    steps.
+    """
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.observation_space = Box(-np.inf, np.inf, (3,), dtype=np.float32)
+        self.action_space = Box(-1, 1, (2,), dtype=np.float32)
+
+    def reset(self):
+        self.t = 0
+        self.action_sum = 0.
+        return self._get_obs()
+
+    def step(self, action):
+        self.t += 1
+        self.action_sum += float(np.sum(action))
+        terminal = self.t == self.seed + 2
+        return self._get_obs(), self.seed - self.t, terminal, dict(t=self.t)
+
+    def _get_obs(self):
+        return np.array(
+            [self.seed, self.t, self.action_sum], dtype=np.float32
+        )
+
+
+class DictCounterEnv(CounterEnv):
+    def __init__(self, seed):
+        super().__init__(seed)
+        self.observation_space = Dict(dict(
+            observation=Box(-np.inf, np.inf, (3,), dtype=np.float32),
+            desired_goal=Box(-np.inf, np.inf, (1,), dtype=np.float32),
+        ))
+
+    def _get_obs(self):
+        return dict(
+            observation=super()._get_obs(),
+            desired_goal=np.array([self.seed], dtype=np.float32),
+        )
+
+
+class ExtraKeyEnv(DictCounterEnv):
+    def _get_obs(self):
+        return dict(super()._get_obs(), extra=np.zeros(1))
+
+
+def assert_obs_equal(obs1, obs2):
+    assert len(obs1) == len(obs2)
+    for ob1, ob2 in zip(obs1, obs2):
+        if isinstance(ob1, dict):
+            assert ob1.keys() == ob2.keys()
+            for key in ob1:
+                np.testing.assert_array_equal(ob1[key], ob2[key])
+        else:
+            np.testing.assert_array_equal(ob1, ob2)
+
+
+class TestSubprocVecEnv(unittest.TestCase):
+    def _test_matches_vec_env(self, env_class):
+        num_envs = 3
+        env_fns = [functools.partial(env_class, i) for i in range(num_envs)]
+        vec_env = VecEnv([env_fn() for env_fn in env_fns])
+        subproc_env = SubprocVecEnv(env_fns, context='fork')
+        try:
+            self.assertEqual(
+                subproc_env.observation_space, vec_env.observation_space
+            )
+            assert_obs_equal(subproc_env.reset(), vec_env.reset())
+            for step in range(6):
+                # Step a different subset every time.
+                env_idxs = [i for i in range(num_envs) if i != step % 3]
+                # Of the action space's dtype, which SubprocVecEnv casts to.
+                actions = np.random.uniform(
+                    -1, 1, (len(env_idxs), 2)
+                ).astype(np.float32)
+                results = vec_env.step(actions, env_idxs)
+                subproc_results = subproc_env.step(actions, env_idxs)
+                assert_obs_equal(subproc_results[0], results[0])
+                for value, expected in zip(
+                        subproc_results[1:3], results[1:3]
+                ):
+                    np.testing.assert_array_equal(value, expected)
+                self.assertEqual(subproc_results[3], results[3])
+                done_idxs = [
+                    i for i, terminal in zip(env_idxs, results[2])
+                    if terminal
+                ]
+                if done_idxs:
+                    assert_obs_equal(
+                        subproc_env.reset(done_idxs),
+                        vec_env.reset(done_idxs),
+                    )
+        finally:
+            subproc_env.close()
+
+    def test_matches_vec_env(self):
+        self._test_matches_vec_env(CounterEnv)
+
+    def test_dict_obs_matches_vec_env(self):
+        self._test_matches_vec_env(DictCounterEnv)
+
+    def test_set_attr_and_env_method(self):
+        env = SubprocVecEnv(
+            [functools.partial(CounterEnv, i) for i in range(2)],
+            context='fork',
+        )
+        try:
+            env.set_attr('seed', 5)
+            env.reset()
+            self.assertEqual(
+                [ob.tolist() for ob in env.env_method('_get_obs')],
+                [[5., 0., 0.], [5., 0., 0.]],
+            )
+        finally:
+            env.close()
+
+    def test_unknown_obs_key(self):
+        env = SubprocVecEnv(
+            [functools.partial(ExtraKeyEnv, 0)], context='fork'
+        )
+        try:
+            with self.assertRaises(RuntimeError):
+                env.reset()
+        finally:
+            env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
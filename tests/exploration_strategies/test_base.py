@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box
+
+from rlkit.exploration_strategies.base import (
+    ExplorationStrategy,
+    PolicyWrappedWithExplorationStrategy,
+)
+from rlkit.exploration_strategies.ou_strategy import OUStrategy
+from rlkit.policies.base import Policy
+
+
+class ZeroPolicy(Policy):
+    def get_action(self, observation):
+        return np.zeros(2), dict(observation=observation)
+
+
+class AddObservationStrategy(ExplorationStrategy):
+    def get_action(self, t, policy, observation, **kwargs):
+        action, agent_info = policy.get_action(observation)
+        return action + observation, agent_info
+
+
+class TestExplorationStrategy(unittest.TestCase):
+    def test_wrapped_policy_batches(self):
+        policy = PolicyWrappedWithExplorationStrategy(
+            AddObservationStrategy(), ZeroPolicy()
+        )
+        obs = np.arange(6.).reshape(3, 2)
+        np.testing.assert_array_equal(policy.get_actions(obs), obs)
+        actions, agent_infos = policy.get_actions_and_infos(obs)
+        np.testing.assert_array_equal(actions, obs)
+        self.assertEqual(len(agent_infos), 3)
+        np.testing.assert_array_equal(agent_infos[1]['observation'], obs[1])
+
+
+class TestOUStrategy(unittest.TestCase):
+    def setUp(self):
+        self.es = OUStrategy(
+            Box(-10, 10, (2,)), theta=0.5
+        )
+
+    def test_batch_rows_have_own_state(self):
+        np.random.seed(0)
+        actions = self.es.get_actions_from_raw_actions(np.zeros((3, 2)))
+        self.assertEqual(actions.shape, (3, 2))
+        self.assertEqual(self.es.batch_state.shape, (3, 2))
+        # A single state would have been evolved once per row.
+        np.random.seed(0)
+        expected = self.es.sigma * np.random.randn(3, 2)
+        np.testing.assert_allclose(actions, expected)
+        np.testing.assert_array_equal(self.es.state, np.zeros(2))
+
+    def test_batch_state_evolves_per_row(self):
+        self.es.get_actions_from_raw_actions(np.zeros((3, 2)))
+        state = self.es.batch_state.copy()
+        np.random.seed(1)
+        actions = self.es.get_actions_from_raw_actions(np.zeros((2, 2)))
+        np.random.seed(1)
+        expected = (
+            state[:2] + self.es.theta * (0 - state[:2])
+            + self.es.sigma * np.random.randn(2, 2)
+        )
+        np.testing.assert_allclose(actions, expected)
+        np.testing.assert_array_equal(self.es.batch_state[2], state[2])
+
+    def test_reset(self):
+        self.es.get_actions_from_raw_actions(np.zeros((3, 2)))
+        self.es.reset()
+        self.assertEqual(len(self.es.batch_state), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+from gym.spaces import Box
+
+from rlkit.policies.base import Policy
+from rlkit.samplers.data_collector.path_collector import (
+    VecMdpPathCollector,
+)
+
+
+class FixedLengthEnv(object):
+    """
+    Terminates after `path_length` steps. Observation i is [i].
+    """
+
+    def __init__(self, path_length):
+        self.path_length = path_length
+        self.t = 0
+        self.observation_space = Box(-np.inf, np.inf, (1,))
+        self.action_space = Box(-1, 1, (1,))
+
+    def reset(self):
+        self.t = 0
+        return np.array([float(self.t)])
+
+    def step(self, action):
+        self.t += 1
+        terminal = self.t == self.path_length
+        return np.array([float(self.t)]), 0., terminal, {}
+
+
+class ZeroPolicy(Policy):
+    def get_action(self, observation):
+        return np.zeros(1), {}
+
+
+class TestVecMdpPathCollector(unittest.TestCase):
+    def collect(self, path_lengths, max_path_length, num_steps, discard):
+        collector = VecMdpPathCollector(
+            [FixedLengthEnv(n) for n in path_lengths], ZeroPolicy()
+        )
+        paths = collector.collect_new_paths(
+            max_path_length, num_steps, discard
+        )
+        return paths, collector
+
+    def test_full_paths_fit_step_budget(self):
+        paths, collector = self.collect(
+            [10, 10, 10], max_path_length=10, num_steps=25, discard=True
+        )
+        self.assertEqual([len(p['actions']) for p in paths], [10, 10])
+        self.assertEqual(
+            collector.get_diagnostics()['num steps total'], 20
+        )
+
+    def test_terminated_paths(self):
+        paths, _ = self.collect(
+            [3, 3], max_path_length=10, num_steps=25, discard=True
+        )
+        # A path is only started while 10 steps are left for it.
+        self.assertEqual(len(paths), 6)
+        for path in paths:
+            np.testing.assert_array_equal(
+                path['observations'][:, 0], np.arange(3)
+            )
+            np.testing.assert_array_equal(
+                path['next_observations'][:, 0], np.arange(1, 4)
+            )
+            self.assertTrue(path['terminals'][-1, 0])
+
+    def test_keeps_incomplete_paths_within_budget(self):
+        paths, _ = self.collect(
+            [10, 10, 10], max_path_length=10, num_steps=25, discard=False
+        )
+        self.assertEqual(
+            sorted(len(p['actions']) for p in paths), [5, 10, 10]
+        )
+
+    def test_terminated_paths_return_unused_steps(self):
+        paths, _ = self.collect(
+            [2, 10], max_path_length=10, num_steps=20, discard=True
+        )
+        # The running path of the second environment may use up to 10
+        # steps, so no full path fits in the 8 steps that are left.
+        self.assertEqual(sorted(len(p['actions']) for p in paths), [2, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
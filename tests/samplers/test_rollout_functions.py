@@ -0,0 +1,125 @@
+import unittest
+
+import numpy as np
+
+from rlkit.samplers.rollout_functions import multitask_rollout, rollout
+
+
+class CountingEnv(object):
+    """
+    Observation i is [i, i], or a dict with that observation and a goal.
+    """
+
+    def __init__(self, dict_obs=False, terminal_step=None):
+        self.dict_obs = dict_obs
+        self.terminal_step = terminal_step
+        self.t = 0
+
+    def _get_obs(self):
+        obs = np.full(2, float(self.t))
+        if self.dict_obs:
+            return dict(observation=obs, desired_goal=np.ones(2))
+        return obs
+
+    def reset(self):
+        self.t = 0
+        return self._get_obs()
+
+    def step(self, action):
+        self.t += 1
+        terminal = self.t == self.terminal_step
+        return self._get_obs(), float(self.t), terminal, dict(t=self.t)
+
+
+class ConstantPolicy(object):
+    def reset(self):
+        pass
+
+    def get_action(self, obs):
+        return np.zeros(1, dtype=np.float32), {}
+
+
+class TestRollout(unittest.TestCase):
+    def test_path_values(self):
+        path = rollout(CountingEnv(), ConstantPolicy(), max_path_length=5)
+        np.testing.assert_array_equal(
+            path['observations'][:, 0], np.arange(5)
+        )
+        np.testing.assert_array_equal(
+            path['next_observations'][:, 0], np.arange(1, 6)
+        )
+        np.testing.assert_array_equal(path['rewards'][:, 0], np.arange(1, 6))
+        self.assertEqual(path['actions'].shape, (5, 1))
+        self.assertEqual(path['actions'].dtype, np.float32)
+        self.assertEqual(path['terminals'].shape, (5, 1))
+        self.assertEqual(len(path['env_infos']), 5)
+
+    def test_observations_do_not_share_memory(self):
+        path = rollout(CountingEnv(), ConstantPolicy(), max_path_length=5)
+        self.assertFalse(np.shares_memory(
+            path['observations'], path['next_observations']
+        ))
+        path['observations'] += 100
+        np.testing.assert_array_equal(
+            path['next_observations'][:, 0], np.arange(1, 6)
+        )
+
+    def test_early_terminal_trims_arrays(self):
+        path = rollout(
+            CountingEnv(terminal_step=3), ConstantPolicy(),
+            max_path_length=1000,
+        )
+        self.assertEqual(len(path['observations']), 3)
+        self.assertTrue(path['terminals'][-1, 0])
+        self.assertLessEqual(len(path['observations'].base), 3)
+
+    def test_infinite_max_path_length(self):
+        path = rollout(CountingEnv(terminal_step=100), ConstantPolicy())
+        np.testing.assert_array_equal(
+            path['observations'][:, 0], np.arange(100)
+        )
+
+
+class TestMultitaskRollout(unittest.TestCase):
+    def _rollout(self, **kwargs):
+        return multitask_rollout(
+            CountingEnv(dict_obs=True),
+            ConstantPolicy(),
+            max_path_length=4,
+            observation_key='observation',
+            desired_goal_key='desired_goal',
+            **kwargs
+        )
+
+    def test_observation_key(self):
+        path = self._rollout()
+        np.testing.assert_array_equal(
+            path['observations'][:, 0], np.arange(4)
+        )
+        np.testing.assert_array_equal(
+            path['next_observations'][:, 0], np.arange(1, 5)
+        )
+        self.assertEqual(path['goals'].shape, (4, 2))
+
+    def test_full_observations_are_a_list_of_dicts(self):
+        path = self._rollout()
+        self.assertIsInstance(path['full_observations'], list)
+        self.assertEqual(len(path['full_observations']), 4)
+        for t, obs in enumerate(path['full_observations']):
+            self.assertEqual(obs['observation'][0], t)
+
+    def test_dict_obs(self):
+        path = self._rollout(return_dict_obs=True)
+        obs = path['observations']
+        next_obs = path['next_observations']
+        np.testing.assert_array_equal(obs['observation'][:, 0], np.arange(4))
+        np.testing.assert_array_equal(
+            next_obs['observation'][:, 0], np.arange(1, 5)
+        )
+        self.assertFalse(np.shares_memory(
+            obs['observation'], next_obs['observation']
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from gym.spaces import Box, Discrete
+
+from rlkit.data_management.env_replay_buffer import EnvReplayBuffer
+from rlkit.data_management.replay_buffer import ReplayBuffer
+from rlkit.torch.data_management.torch_replay_buffer import (
+    TorchReplayBuffer,
+)
+
+
+class Env(object):
+    def __init__(self, action_space=None):
+        self.observation_space = Box(-np.inf, np.inf, (2,))
+        if action_space is None:
+            action_space = Box(-1, 1, (1,))
+        self.action_space = action_space
+
+
+def make_path(path_len, first_value=0, discrete=False):
+    values = np.arange(first_value, first_value + path_len, dtype=np.float64)
+    return dict(
+        observations=np.repeat(values[:, None], 2, 1),
+        actions=np.arange(path_len) % 3 if discrete else values[:, None],
+        rewards=values[:, None],
+        next_observations=np.repeat(values[:, None] + 1, 2, 1),
+        terminals=(np.arange(path_len) == path_len - 1)[:, None],
+        agent_infos=[{}] * path_len,
+        env_infos=[dict(info=v) for v in values],
+    )
+
+
+def add_paths(replay_buffer, add_path, discrete=False):
+    # The buffer wraps around in the middle of the third path.
+    for i, path_len in enumerate([4, 5, 6]):
+        add_path(
+            replay_buffer,
+            make_path(path_len, first_value=10 * i, discrete=discrete),
+        )
+
+
+class TestTorchReplayBuffer(unittest.TestCase):
+    def _make_buffer(self, env=None, **kwargs):
+        return TorchReplayBuffer(
+            13, env or Env(), env_info_sizes=dict(info=1), device='cpu',
+            **kwargs
+        )
+
+    def assert_same_contents(self, torch_buffer, np_buffer):
+        self.assertEqual(torch_buffer._top, np_buffer._top)
+        self.assertEqual(
+            torch_buffer.num_steps_can_sample(),
+            np_buffer.num_steps_can_sample(),
+        )
+        for name in torch_buffer._array_names:
+            np.testing.assert_array_equal(
+                torch_buffer._get_array(name).numpy(),
+                np_buffer._get_array(name),
+                err_msg=name,
+            )
+
+    def test_same_as_env_replay_buffer(self):
+        for env, discrete in [(Env(), False), (Env(Discrete(3)), True)]:
+            torch_buffer = self._make_buffer(env)
+            np_buffer = EnvReplayBuffer(13, env, env_info_sizes=dict(info=1))
+            add_paths(torch_buffer, TorchReplayBuffer.add_path, discrete)
+            add_paths(np_buffer, EnvReplayBuffer.add_path, discrete)
+            self.assert_same_contents(torch_buffer, np_buffer)
+
+    def test_add_path_same_as_add_sample(self):
+        torch_buffer = self._make_buffer()
+        np_buffer = EnvReplayBuffer(13, Env(), env_info_sizes=dict(info=1))
+        add_paths(torch_buffer, ReplayBuffer.add_path)
+        add_paths(np_buffer, EnvReplayBuffer.add_path)
+        self.assert_same_contents(torch_buffer, np_buffer)
+
+    def test_random_batch(self):
+        torch_buffer = self._make_buffer(Env(Discrete(3)))
+        add_paths(
+            torch_buffer, TorchReplayBuffer.add_path, discrete=True,
+        )
+        batch = torch_buffer.random_batch(50)
+        for value in batch.values():
+            self.assertIsInstance(value, torch.Tensor)
+            self.assertEqual(value.dtype, torch.float32)
+        self.assertEqual(batch['actions'].shape, (50, 3))
+        self.assertTrue(torch.equal(
+            batch['next_observations'], batch['observations'] + 1
+        ))
+        self.assertTrue(torch.equal(
+            batch['info'][:, 0], batch['observations'][:, 0]
+        ))
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        torch_buffer = self._make_buffer()
+        add_paths(torch_buffer, TorchReplayBuffer.add_path)
+        torch_buffer.save(directory + '/snapshot')
+        loaded_buffer = self._make_buffer()
+        loaded_buffer.load(directory + '/snapshot')
+        self.assertEqual(loaded_buffer._top, torch_buffer._top)
+        for name in torch_buffer._array_names:
+            self.assertTrue(torch.equal(
+                loaded_buffer._get_array(name), torch_buffer._get_array(name)
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import copy
+import unittest
+
+import numpy as np
+import torch
+from torch import nn
+
+from rlkit.torch.dqn.double_dqn import DoubleDQNTrainer
+from rlkit.torch.dqn.dqn import DQNTrainer, get_action_q_values
+
+
+def make_batch(batch_size=16, num_actions=3, action_indices=False):
+    actions = np.random.randint(0, num_actions, (batch_size, 1))
+    if not action_indices:
+        actions = np.eye(num_actions)[actions[:, 0]]
+    return dict(
+        observations=np.random.randn(batch_size, 4).astype(np.float32),
+        actions=actions.astype(np.uint8 if action_indices else np.float32),
+        rewards=np.random.randn(batch_size, 1).astype(np.float32),
+        terminals=np.random.randint(0, 2, (batch_size, 1)).astype(np.uint8),
+        next_observations=np.random.randn(batch_size, 4).astype(np.float32),
+    )
+
+
+class TestGetActionQValues(unittest.TestCase):
+    def test_indices_and_one_hot(self):
+        q_values = torch.randn(5, 3)
+        indices = torch.tensor([[0], [2], [1], [1], [0]], dtype=torch.uint8)
+        one_hot = torch.eye(3)[indices[:, 0].long()]
+        expected = q_values[torch.arange(5), indices[:, 0].long()][:, None]
+        self.assertTrue(torch.equal(
+            get_action_q_values(q_values, indices), expected
+        ))
+        self.assertTrue(torch.allclose(
+            get_action_q_values(q_values, one_hot), expected
+        ))
+
+
+class TestDQNTrainer(unittest.TestCase):
+    def _train(self, trainer_class, batch):
+        torch.manual_seed(0)
+        qf = nn.Linear(4, 3)
+        trainer = trainer_class(qf, copy.deepcopy(qf))
+        trainer.train(batch)
+        return qf, trainer
+
+    def _test_same_update(self, trainer_class):
+        np.random.seed(0)
+        batch = make_batch(action_indices=True)
+        one_hot_batch = dict(
+            batch, actions=np.eye(3, dtype=np.float32)[batch['actions'][:, 0]]
+        )
+        qf1, trainer1 = self._train(trainer_class, batch)
+        qf2, trainer2 = self._train(trainer_class, one_hot_batch)
+        self.assertAlmostEqual(
+            trainer1.get_diagnostics()['QF Loss'],
+            trainer2.get_diagnostics()['QF Loss'],
+            places=6,
+        )
+        for p1, p2 in zip(qf1.parameters(), qf2.parameters()):
+            self.assertTrue(torch.allclose(p1, p2))
+
+    def test_action_indices(self):
+        self._test_same_update(DQNTrainer)
+
+    def test_double_dqn_action_indices(self):
+        self._test_same_update(DoubleDQNTrainer)
+
+    def test_uniform_weights(self):
+        np.random.seed(0)
+        batch = make_batch()
+        weighted_batch = dict(batch, weights=np.ones((16, 1), np.float32))
+        _, trainer1 = self._train(DQNTrainer, batch)
+        _, trainer2 = self._train(DQNTrainer, weighted_batch)
+        self.assertAlmostEqual(
+            trainer1.get_diagnostics()['QF Loss'],
+            trainer2.get_diagnostics()['QF Loss'],
+            places=6,
+        )
+
+    def test_td_errors_are_reported(self):
+        np.random.seed(0)
+        batch = make_batch()
+        batch['indices'] = np.arange(16).reshape(-1, 1)
+        reported = []
+        torch.manual_seed(0)
+        qf = nn.Linear(4, 3)
+        trainer = DQNTrainer(qf, copy.deepcopy(qf))
+        trainer.set_td_error_callback(
+            lambda indices, td_errors: reported.append((indices, td_errors))
+        )
+        trainer.train(batch)
+        self.assertEqual(len(reported), 1)
+        indices, td_errors = reported[0]
+        np.testing.assert_array_equal(np.ravel(indices), np.arange(16))
+        self.assertEqual(np.size(td_errors), 16)
+
+
+if __name__ == '__main__':
+    unittest.main()